@@ -0,0 +1,46 @@
+"""Общий для всех воркеров кэш без вытеснения живых записей.
+
+Кэш по умолчанию (фрагменты постов, счётчики, состояния страниц) может
+вытеснять что угодно: ключи его записей содержат версии тегов, поэтому
+потеря записи — всего лишь промах. Версии тегов и вёдра ограничения
+частоты должны быть общими и не должны пропадать раньше срока, поэтому
+они живут в отдельном кэше SHARED_CACHE.
+"""
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+
+SHARED_CACHE = 'shared'
+
+
+def shared_cache():
+    return caches[SHARED_CACHE]
+
+
+class SharedFileBasedCache(FileBasedCache):
+    """Файловый кэш, который удаляет только просроченные записи.
+
+    FileBasedCache перед каждой записью перечисляет каталог и при
+    переполнении удаляет случайные записи. Здесь каталог просматривается не
+    чаще раза в SWEEP_INTERVAL секунд, а записи без срока живут, пока их не
+    перезапишут.
+    """
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        options = params.get('OPTIONS', {})
+        self._sweep_interval = int(options.get('SWEEP_INTERVAL', 300))
+        self._swept = time.monotonic()
+
+    def _cull(self):
+        now = time.monotonic()
+        if now - self._swept < self._sweep_interval:
+            return
+        self._swept = now
+        for fname in self._list_cache_files():
+            try:
+                with open(fname, 'rb') as f:
+                    self._is_expired(f)
+            except FileNotFoundError:
+                pass
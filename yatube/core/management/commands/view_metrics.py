@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+from django.urls import URLPattern, URLResolver, get_resolver
+
+from core import metrics
+
+PERCENTILES = (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))
+
+
+def view_names(resolver=None, namespace=''):
+    """Имена всех представлений проекта вместе с пространствами имён."""
+    resolver = resolver or get_resolver()
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            prefix = namespace
+            if pattern.namespace:
+                prefix = f'{namespace}{pattern.namespace}:'
+            yield from view_names(pattern, prefix)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield f'{namespace}{pattern.name}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает скользящие гистограммы метрик представлений: число '
+        'запросов к БД, время SQL и шаблонов, общее время и размер ответа'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--minutes', type=int, default=metrics.WINDOWS,
+            help='За сколько последних минут показывать метрики',
+        )
+        parser.add_argument(
+            '--view', action='append', dest='views',
+            help='Имя представления, например posts:index',
+        )
+        parser.add_argument(
+            '--histogram', action='store_true',
+            help='Выводить корзины гистограмм целиком',
+        )
+
+    def handle(self, *args, **options):
+        metrics.flush()
+        views = options['views'] or [*view_names(), 'unresolved']
+        minutes = min(options['minutes'], metrics.WINDOWS)
+        found = metrics.histograms(views, minutes)
+        if not found:
+            self.stdout.write(f'Нет данных за {minutes} мин.')
+            return
+        for view in sorted(found):
+            histograms = found[view]
+            requests = sum(histograms['queries'].values())
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{view}: {requests} запросов'))
+            for metric in metrics.BUCKETS:
+                counts = histograms.get(metric, {})
+                summary = ', '.join(
+                    f'{name} ≤ {metrics.percentile(metric, counts, value)}'
+                    for name, value in PERCENTILES)
+                self.stdout.write(f'  {metric}: {summary}')
+                if options['histogram']:
+                    for bound in [*map(str, metrics.BUCKETS[metric]),
+                                  metrics.OVERFLOW]:
+                        if counts.get(bound):
+                            self.stdout.write(
+                                f'    ≤ {bound}: {counts[bound]}')
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from core.warmup import warm_templates
+
+
+class Command(BaseCommand):
+    help = (
+        'Компилирует шаблоны проекта в кэш загрузчика и показывает время '
+        'компиляции каждого'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--apps', action='store_true',
+            help='Прогреть и шаблоны приложений (admin и других)',
+        )
+
+    def handle(self, *args, **options):
+        results = warm_templates(include_apps=options['apps'])
+        total = 0
+        for name, seconds, error in sorted(
+                results, key=lambda result: result[1], reverse=True):
+            total += seconds
+            line = f'{seconds * 1000:8.2f} мс  {name}'
+            if error:
+                self.stdout.write(self.style.ERROR(f'{line}: {error}'))
+            else:
+                self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS(
+            f'Шаблонов: {len(results)}, всего {total * 1000:.1f} мс'))
@@ -0,0 +1,239 @@
+"""Метрики представлений: запросы к БД, время SQL и шаблонов, размер ответа.
+
+ViewMetricsMiddleware собирает метрики запроса в RequestMetrics. Значения
+раскладываются по корзинам гистограмм и копятся в процессе, а раз в
+FLUSH_INTERVAL секунд фоновый поток добавляет их в таблицу ViewMetric
+атомарным UPSERT (count = count + excluded.count), поэтому счётчики
+воркеров не теряют прибавки друг друга. Гистограммы хранятся по минутным
+окнам и живут WINDOWS окон, поэтому команда view_metrics показывает
+скользящую картину по всем воркерам.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.models import F
+
+from .models import ViewMetric
+
+logger = logging.getLogger(__name__)
+
+WINDOW = 60
+WINDOWS = 60
+FLUSH_INTERVAL = 10
+# SQLite принимает не больше 999 параметров, в строке их пять.
+UPSERT_BATCH_SIZE = 150
+KEY_FIELDS = ('window', 'view', 'metric', 'bucket')
+UPSERT_SQL = (
+    'INSERT INTO {table} ({key}, {count}) VALUES {rows} '
+    'ON CONFLICT ({key}) '
+    'DO UPDATE SET {count} = {table}.{count} + excluded.{count}'
+)
+
+# Верхние границы корзин; последняя корзина — всё, что больше.
+BUCKETS = {
+    'queries': (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+    'sql_ms': (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+    'template_ms': (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+    'total_ms': (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000),
+    'size_kb': (1, 5, 10, 25, 50, 100, 250, 500, 1000),
+}
+OVERFLOW = 'inf'
+
+_local = threading.local()
+_buffer = Counter()
+_buffer_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+class RequestMetrics:
+    """Метрики одного запроса."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Обёртка connection.execute_wrapper.
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+
+
+def current():
+    """Метрики запроса, который обрабатывает текущий поток, или None."""
+    return getattr(_local, 'metrics', None)
+
+
+@contextmanager
+def collecting():
+    metrics = RequestMetrics()
+    _local.metrics = metrics
+    try:
+        yield metrics
+    finally:
+        _local.metrics = None
+
+
+@contextmanager
+def template_timing():
+    """Учитывает время отрисовки шаблона; вложенные шаблоны не суммируются."""
+    metrics = current()
+    if metrics is None:
+        yield
+        return
+    metrics.template_depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.template_depth -= 1
+        if not metrics.template_depth:
+            metrics.template_time += time.perf_counter() - start
+
+
+def bucket(metric, value):
+    for bound in BUCKETS[metric]:
+        if value <= bound:
+            return str(bound)
+    return OVERFLOW
+
+
+def window(now=None):
+    return int((now or time.time()) // WINDOW)
+
+
+def record(view, values, now=None):
+    """Добавляет значения метрик запроса к представлению view."""
+    global _last_flush
+    current_window = window(now)
+    with _buffer_lock:
+        for metric, value in values.items():
+            _buffer[
+                current_window, view, metric, bucket(metric, value)] += 1
+        due = time.monotonic() - _last_flush >= FLUSH_INTERVAL
+        if due:
+            _last_flush = time.monotonic()
+    # Тестовую базу в памяти нельзя делить между потоками; там счётчики
+    # переносятся только явным вызовом flush().
+    if due and not _in_memory_db():
+        threading.Thread(target=_flush_in_background, daemon=True).start()
+
+
+def _in_memory_db():
+    return connection.vendor == 'sqlite' and connection.is_in_memory_db()
+
+
+def _flush_in_background():
+    try:
+        flush()
+    finally:
+        connections.close_all()
+
+
+def _supports_upsert():
+    """ON CONFLICT ... DO UPDATE есть в PostgreSQL и в SQLite с 3.24."""
+    if connection.vendor == 'postgresql':
+        return True
+    return (
+        connection.vendor == 'sqlite'
+        and connection.Database.sqlite_version_info >= (3, 24)
+    )
+
+
+def _upsert(counts):
+    quote = connection.ops.quote_name
+    sql = UPSERT_SQL.format(
+        table=quote(ViewMetric._meta.db_table),
+        key=', '.join(map(quote, KEY_FIELDS)),
+        count=quote('count'),
+        rows=', '.join(['(%s, %s, %s, %s, %s)'] * len(counts)),
+    )
+    params = [
+        value
+        for (window_, view, metric, bound), count in counts.items()
+        for value in (window_, view, metric, bound, count)
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def _batches(counts):
+    items = list(counts.items())
+    for start in range(0, len(items), UPSERT_BATCH_SIZE):
+        yield dict(items[start:start + UPSERT_BATCH_SIZE])
+
+
+def _increment(key, count):
+    """Прибавка без UPSERT: UPDATE, а при отсутствии строки — INSERT."""
+    window_, view, metric, bound = key
+    rows = ViewMetric.objects.filter(
+        window=window_, view=view, metric=metric, bucket=bound)
+    if rows.update(count=F('count') + count):
+        return
+    try:
+        with transaction.atomic():
+            ViewMetric.objects.create(
+                window=window_, view=view, metric=metric, bucket=bound,
+                count=count)
+    except IntegrityError:
+        rows.update(count=F('count') + count)
+
+
+def flush(now=None):
+    """Переносит накопленные в процессе счётчики в таблицу ViewMetric."""
+    global _last_flush
+    with _buffer_lock:
+        counts = dict(_buffer)
+        _buffer.clear()
+        _last_flush = time.monotonic()
+    if not counts:
+        return
+    try:
+        if _supports_upsert():
+            for batch in _batches(counts):
+                _upsert(batch)
+        else:
+            for key, count in counts.items():
+                _increment(key, count)
+        ViewMetric.objects.filter(
+            window__lte=window(now) - WINDOWS).delete()
+    except Exception:
+        logger.exception('Не удалось сохранить метрики')
+
+
+def histograms(views, minutes=WINDOWS, now=None):
+    """Гистограммы метрик представлений за последние minutes окон.
+
+    Возвращает {view: {metric: {bucket: count}}}.
+    """
+    last = window(now)
+    rows = ViewMetric.objects.filter(
+        window__gt=last - minutes, window__lte=last, view__in=views,
+    ).values_list('view', 'metric', 'bucket', 'count')
+    result = {}
+    for view, metric, bound, count in rows:
+        counts = result.setdefault(view, {}).setdefault(metric, Counter())
+        counts[bound] += count
+    return result
+
+
+def percentile(metric, counts, fraction):
+    """Верхняя граница корзины, в которую попадает доля fraction запросов."""
+    total = sum(counts.values())
+    if not total:
+        return None
+    seen = 0
+    for bound in [*map(str, BUCKETS[metric]), OVERFLOW]:
+        seen += counts.get(bound, 0)
+        if seen >= total * fraction:
+            return bound
+    return OVERFLOW
@@ -0,0 +1,45 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ViewMetricsMiddleware:
+    """Записывает метрики запроса под именем разрешённого представления.
+
+    Превышение бюджета из settings.VIEW_QUERY_BUDGETS пишется в лог.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with metrics.collecting() as collected, ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(collected))
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        size = 0 if response.streaming else len(response.content)
+        metrics.record(view, {
+            'queries': collected.queries,
+            'sql_ms': collected.sql_time * 1000,
+            'template_ms': collected.template_time * 1000,
+            'total_ms': total * 1000,
+            'size_kb': size / 1024,
+        })
+        budget = getattr(settings, 'VIEW_QUERY_BUDGETS', {}).get(view)
+        if budget is not None and collected.queries > budget:
+            logger.warning(
+                'Представление %s выполнило %d запросов к БД при бюджете %d',
+                view, collected.queries, budget)
+        return response
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-17 05:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ViewMetric',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.PositiveIntegerField(db_index=True)),
+                ('view', models.CharField(max_length=200)),
+                ('metric', models.CharField(max_length=20)),
+                ('bucket', models.CharField(max_length=10)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'View metric',
+                'verbose_name_plural': 'View metrics',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='viewmetric',
+            constraint=models.UniqueConstraint(fields=('window', 'view', 'metric', 'bucket'), name='unique_view_metric'),
+        ),
+    ]
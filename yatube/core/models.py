@@ -0,0 +1,22 @@
+from django.db import models
+
+
+class ViewMetric(models.Model):
+    """Число запросов к представлению в корзине гистограммы за окно"""
+
+    window = models.PositiveIntegerField(db_index=True)
+    view = models.CharField(max_length=200)
+    metric = models.CharField(max_length=20)
+    bucket = models.CharField(max_length=10)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+
+        verbose_name = 'View metric'
+        verbose_name_plural = 'View metrics'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('window', 'view', 'metric', 'bucket'),
+                name='unique_view_metric',
+            ),
+        ]
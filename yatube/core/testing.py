@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """Проверка числа запросов к БД по бюджетам VIEW_QUERY_BUDGETS."""
+
+    def assertMaxQueries(self, url, budget=None, client=None, **extra):
+        """GET-запрос к url, который не должен превысить бюджет.
+
+        Без budget берётся бюджет представления, в которое разрешился url.
+        """
+        client = client or self.client
+        with CaptureQueriesContext(connection) as captured:
+            response = client.get(url, **extra)
+        view = response.resolver_match.view_name
+        if budget is None:
+            budget = settings.VIEW_QUERY_BUDGETS[view]
+        if len(captured) > budget:
+            queries = '\n'.join(
+                f'{number}. {query["sql"]}'
+                for number, query in enumerate(captured, start=1))
+            self.fail(
+                f'{view} ({url}) выполнило {len(captured)} запросов к БД '
+                f'при бюджете {budget}:\n{queries}')
+        return response
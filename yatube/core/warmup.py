@@ -0,0 +1,70 @@
+"""Прогрев кэша скомпилированных шаблонов при старте воркера.
+
+Вне режима DEBUG шаблоны загружаются через
+django.template.loaders.cached.Loader, поэтому однажды разобранный шаблон
+живёт в памяти процесса. warm_templates
+заранее компилирует все шаблоны из каталогов проекта, и первый запрос к
+свежему воркеру не тратит время на разбор base.html, шапки и включений.
+"""
+import logging
+import os
+import time
+
+from django.template import TemplateSyntaxError, engines
+from django.template.backends.django import DjangoTemplates
+from django.template.utils import get_app_template_dirs
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_EXTENSIONS = ('.html', '.txt')
+
+
+def template_names(directories):
+    """Имена шаблонов относительно каталогов, как их ищут загрузчики."""
+    names = set()
+    for directory in directories:
+        for root, dirs, files in os.walk(directory):
+            dirs[:] = [name for name in dirs if not name.startswith('.')]
+            for file_name in files:
+                if file_name.endswith(TEMPLATE_EXTENSIONS):
+                    path = os.path.join(root, file_name)
+                    names.add(os.path.relpath(path, directory).replace(
+                        os.sep, '/'))
+    return sorted(names)
+
+
+def warm_templates(include_apps=False):
+    """Компилирует шаблоны в кэш загрузчика.
+
+    Возвращает список (имя, секунды, ошибка) для каждого шаблона. Без
+    include_apps прогреваются только каталоги из TEMPLATES['DIRS'].
+    """
+    results = []
+    for backend in engines.all():
+        if not isinstance(backend, DjangoTemplates):
+            continue
+        directories = list(backend.engine.dirs)
+        if include_apps:
+            directories += get_app_template_dirs('templates')
+        for name in template_names(directories):
+            start = time.perf_counter()
+            error = None
+            try:
+                backend.engine.get_template(name)
+            except TemplateSyntaxError as exc:
+                error = str(exc)
+            results.append((name, time.perf_counter() - start, error))
+    return results
+
+
+def warm_on_startup():
+    """Прогрев из wsgi.py: ошибки шаблонов пишутся в лог, воркер живёт."""
+    start = time.perf_counter()
+    results = warm_templates()
+    for name, _, error in results:
+        if error:
+            logger.warning('Шаблон %s не скомпилирован: %s', name, error)
+    logger.info(
+        'Скомпилировано шаблонов: %d за %.3f с',
+        len(results), time.perf_counter() - start)
+    return results
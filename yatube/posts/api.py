@@ -0,0 +1,90 @@
+"""JSON-лента постов для клиентов, которым не нужен HTML.
+
+Отдаёт те же ленты, что index, group_posts и profile, с курсорной
+пагинацией, ETag и Last-Modified; из базы выбираются только нужные поля.
+"""
+from django.core.files.storage import default_storage
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_safe
+
+from . import constants
+from .conditions import conditional_page, feed_state
+from .models import Group, Post, User
+
+API_FIELDS = (
+    'id', 'text', 'pub_date', 'image', 'author__username', 'group__slug')
+
+
+def serialize_posts(ids):
+    """Посты с заданными id в том же порядке."""
+    rows = Post.objects.filter(pk__in=ids).values(*API_FIELDS)
+    by_id = {row['id']: row for row in rows}
+    return [
+        {
+            'id': row['id'],
+            'author': row['author__username'],
+            'group': row['group__slug'],
+            'text': row['text'],
+            'pub_date': row['pub_date'],
+            'image': default_storage.url(row['image']) if row['image']
+            else None,
+        }
+        for row in (by_id.get(pk) for pk in ids) if row is not None
+    ]
+
+
+def feed_response(request):
+    state = request.page_state
+    if state is None:
+        raise Http404
+    page = state.page
+    return JsonResponse({
+        'results': serialize_posts([row['id'] for row in page]),
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    })
+
+
+def index_state(request):
+    return feed_state(
+        request, Post.objects.all(),
+        extra=constants.FEED_API_VERSION, cursor=True)
+
+
+def group_state(request, slug):
+    if not Group.objects.filter(slug=slug).exists():
+        return None
+    return feed_state(
+        request, Post.objects.filter(group__slug=slug),
+        extra=constants.FEED_API_VERSION, cursor=True)
+
+
+def profile_state(request, username):
+    author_id = User.objects.filter(
+        username=username).values_list('pk', flat=True).first()
+    if author_id is None:
+        return None
+    return feed_state(
+        request, Post.objects.filter(author_id=author_id),
+        extra=constants.FEED_API_VERSION, cursor=True)
+
+
+@require_safe
+@conditional_page(index_state)
+def index(request):
+    """Лента всех постов."""
+    return feed_response(request)
+
+
+@require_safe
+@conditional_page(group_state)
+def group_posts(request, slug):
+    """Лента постов группы."""
+    return feed_response(request)
+
+
+@require_safe
+@conditional_page(profile_state)
+def profile(request, username):
+    """Лента постов автора."""
+    return feed_response(request)
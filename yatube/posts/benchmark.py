@@ -0,0 +1,205 @@
+"""Нагрузочные замеры представлений posts на сгенерированных данных.
+
+build_dataset наполняет базу пользователями, группами, постами,
+подписками и комментариями через bulk_create, а затем пересчитывает
+денормализованные данные, которые обычно ведут сигналы. run_benchmark
+запрашивает страницы тестовым клиентом и считает задержки и число
+запросов к БД. Результаты сохраняются в JSON и сравниваются с прошлыми
+командой benchmark_views --compare.
+"""
+import random
+import statistics
+import time
+from itertools import islice
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from faker import Faker
+
+from core.cache import shared_cache
+
+from . import search, stats, timeline
+from .models import Comment, Follow, Group, Post, User
+
+SCALES = {
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+}
+POSTS_PER_USER = 20
+POSTS_PER_GROUP = 2_000
+FOLLOWS_PER_USER = 10
+COMMENTS_PER_POST = 0.5
+TEXT_POOL_SIZE = 2_000
+BATCH_SIZE = 5_000
+VIEWS = ('index', 'group_posts', 'profile', 'post_detail', 'follow_index')
+
+
+def _bulk_create(model, objects, **kwargs):
+    objects = iter(objects)
+    created = 0
+    while True:
+        batch = list(islice(objects, BATCH_SIZE))
+        if not batch:
+            return created
+        model.objects.bulk_create(batch, **kwargs)
+        created += len(batch)
+
+
+def build_dataset(posts, seed=0, follows_per_user=FOLLOWS_PER_USER,
+                  comments_per_post=COMMENTS_PER_POST):
+    """Создаёт набор данных на posts постов и возвращает размеры таблиц."""
+    rng = random.Random(seed)
+    fake = Faker('ru_RU')
+    fake.seed_instance(seed)
+    texts = [fake.paragraph(nb_sentences=5) for _ in range(TEXT_POOL_SIZE)]
+
+    users = max(posts // POSTS_PER_USER, 2)
+    groups = max(posts // POSTS_PER_GROUP, 1)
+    # Пароль не нужен: в замерах используется force_login.
+    _bulk_create(User, (
+        User(username=f'bench{index}', first_name=fake.first_name(),
+             last_name=fake.last_name(), password='!')
+        for index in range(users)
+    ))
+    _bulk_create(Group, (
+        Group(title=fake.sentence(nb_words=3)[:200], slug=f'bench-{index}',
+              description=rng.choice(texts))
+        for index in range(groups)
+    ))
+    user_ids = list(User.objects.values_list('pk', flat=True))
+    group_ids = list(Group.objects.values_list('pk', flat=True))
+
+    _bulk_create(Post, (
+        Post(author_id=rng.choice(user_ids), text=rng.choice(texts),
+             group_id=rng.choice(group_ids) if rng.random() < 0.7 else None)
+        for _ in range(posts)
+    ))
+    follows_per_user = min(follows_per_user, len(user_ids) - 1)
+
+    def follows():
+        for user_id in user_ids:
+            authors = rng.sample(user_ids, follows_per_user + 1)
+            authors = [pk for pk in authors if pk != user_id]
+            for author_id in authors[:follows_per_user]:
+                yield Follow(user_id=user_id, author_id=author_id)
+
+    _bulk_create(Follow, follows())
+
+    post_ids = list(Post.objects.values_list('pk', flat=True))
+    _bulk_create(Comment, (
+        Comment(post_id=rng.choice(post_ids),
+                author_id=rng.choice(user_ids),
+                text=rng.choice(texts))
+        for _ in range(int(posts * comments_per_post))
+    ))
+
+    stats.recount()
+    stats.recount_groups()
+    stats.recount_comments()
+    timeline.rebuild_timelines()
+    search.rebuild()
+    return {
+        'users': User.objects.count(),
+        'groups': Group.objects.count(),
+        'posts': Post.objects.count(),
+        'follows': Follow.objects.count(),
+        'comments': Comment.objects.count(),
+    }
+
+
+def percentile(values, fraction):
+    """Перцентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    index = max(int(round(fraction * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def _targets(rng, requests):
+    """URL и пользователь для каждого запроса к каждому представлению."""
+    def sample(queryset, field):
+        values = list(queryset.order_by('?').values_list(
+            field, flat=True)[:requests])
+        return [rng.choice(values) for _ in range(requests)]
+
+    authors = sample(User.objects.filter(posts__isnull=False), 'username')
+    groups = sample(Group.objects.all(), 'slug')
+    posts = sample(Post.objects.filter(comments__isnull=False), 'pk')
+    reader_ids = sample(User.objects.filter(follower__isnull=False), 'pk')
+    readers = User.objects.in_bulk(reader_ids)
+    return {
+        'index': [(reverse('posts:index'), None)] * requests,
+        'group_posts': [
+            (reverse('posts:group_list', kwargs={'slug': slug}), None)
+            for slug in groups],
+        'profile': [
+            (reverse('posts:profile', kwargs={'username': username}), None)
+            for username in authors],
+        'post_detail': [
+            (reverse('posts:post_detail', kwargs={'post_id': pk}), None)
+            for pk in posts],
+        'follow_index': [
+            (reverse('posts:follow_index'), readers[pk])
+            for pk in reader_ids],
+    }
+
+
+def measure(requests, views=VIEWS, seed=0):
+    """Задержки и число запросов к БД для каждого представления."""
+    rng = random.Random(seed)
+    targets = _targets(rng, requests)
+    results = {}
+    for view in views:
+        cache.clear()
+        shared_cache().clear()
+        latencies, queries = [], []
+        for url, user in targets[view]:
+            client = Client()
+            if user is not None:
+                client.force_login(user)
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = client.get(url)
+                latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise RuntimeError(
+                    f'{url} ответил {response.status_code}')
+            queries.append(len(captured))
+        results[view] = {
+            'requests': len(latencies),
+            'p50_ms': round(percentile(latencies, 0.5), 3),
+            'p95_ms': round(percentile(latencies, 0.95), 3),
+            'queries_median': statistics.median_low(queries),
+            'queries_max': max(queries),
+        }
+    return results
+
+
+def compare(old, new, threshold):
+    """Строки сравнения двух прогонов и признак регрессии.
+
+    Регрессия — рост p95 больше чем в threshold раз или рост числа
+    запросов к БД.
+    """
+    lines, regressed = [], False
+    for scale, views in new['scales'].items():
+        old_views = old.get('scales', {}).get(scale, {}).get('views', {})
+        for view, result in views['views'].items():
+            before = old_views.get(view)
+            if before is None:
+                continue
+            ratio = result['p95_ms'] / before['p95_ms'] if (
+                before['p95_ms']) else 1
+            queries = result['queries_max'] - before['queries_max']
+            bad = ratio > threshold or queries > 0
+            regressed |= bad
+            lines.append((
+                bad,
+                f'{scale} {view}: p95 {before["p95_ms"]} → '
+                f'{result["p95_ms"]} мс (×{ratio:.2f}), запросов '
+                f'{before["queries_max"]} → {result["queries_max"]}',
+            ))
+    return lines, regressed
@@ -0,0 +1,50 @@
+"""Инвалидация кэша по тегам.
+
+У каждого тега («post:<id>», «author:<id>», «group:<slug>», «user:<id>»,
+«posts») в общем кэше хранится версия. Версии тегов входят в ключи
+закэшированных значений, поэтому сброс тега меняет ключи сразу во всех
+воркерах, которые работают с этим кэшем, без поиска и удаления записей.
+"""
+import hashlib
+import time
+
+from core.cache import shared_cache
+
+TAG_KEY = 'cache_tag:{}'
+
+
+def _tag_key(tag):
+    # В тегах бывают слаги не в ASCII, а ключи должны подходить любому
+    # бэкенду кэша.
+    return TAG_KEY.format(hashlib.md5(tag.encode()).hexdigest())
+
+
+def _new_version():
+    # Время, а не счётчик: вытесненная из кэша версия не может
+    # совпасть с прежней и оживить устаревшие записи.
+    return time.time_ns()
+
+
+def tag_versions(tags):
+    """Текущие версии тегов одним запросом к кэшу."""
+    keys = {_tag_key(tag): tag for tag in tags}
+    found = shared_cache().get_many(list(keys))
+    missing = {key: _new_version() for key in keys if key not in found}
+    if missing:
+        shared_cache().set_many(missing, None)
+        found.update(missing)
+    return {keys[key]: version for key, version in found.items()}
+
+
+def tagged_key(key, tags, versions=None):
+    """Ключ кэша, который меняется при сбросе любого из тегов."""
+    if versions is None:
+        versions = tag_versions(tags)
+    suffix = '.'.join(str(versions[tag]) for tag in tags)
+    return f'{key}:{suffix}'
+
+
+def invalidate_tags(*tags):
+    """Сбрасывает теги во всех воркерах."""
+    version = _new_version()
+    shared_cache().set_many({_tag_key(tag): version for tag in tags}, None)
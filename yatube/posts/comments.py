@@ -0,0 +1,78 @@
+"""Запись комментариев, рассчитанная на шквал комментариев к одному посту.
+
+Существование поста проверяется не загрузкой строки с текстом, а тем же
+запросом UPDATE, что прибавляет счётчик comments_count: обновилась
+строка — пост есть. Комментарии вставляются bulk_create в той же
+транзакции, а тег кэша поста сбрасывается после её фиксации. Новые комментарии
+попадают в поисковый индекс фоновой задачей после фиксации, так что
+запрос на запись индекс не ждёт.
+"""
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Max
+
+from . import constants, search, stats
+from .cache import invalidate_tags
+from .models import Comment, Post
+
+
+def create_comments(entries):
+    """Добавляет комментарии из пар (post_id, author_id, text).
+
+    Комментарии к несуществующим постам пропускаются. Возвращает
+    созданные комментарии.
+    """
+    entries = list(entries)
+    counts = Counter(post_id for post_id, _, _ in entries)
+    if not counts:
+        return []
+    with transaction.atomic():
+        updated = stats.bump_comments(counts)
+        if updated < len(counts):
+            existing = set(Post.objects.filter(
+                pk__in=counts).values_list('pk', flat=True))
+            entries = [entry for entry in entries if entry[0] in existing]
+            counts = Counter(post_id for post_id, _, _ in entries)
+        last_id = _last_comment_id()
+        comments = Comment.objects.bulk_create(
+            [
+                Comment(post_id=post_id, author_id=author_id, text=text)
+                for post_id, author_id, text in entries
+            ],
+            batch_size=constants.COMMENT_BATCH_SIZE,
+        )
+        if counts:
+            search.defer_index_comments(_created_ids(comments, last_id))
+            tags = [f'post:{post_id}' for post_id in counts]
+            # До фиксации другой запрос закэшировал бы фрагмент без новых
+            # комментариев под уже новой версией тега.
+            transaction.on_commit(lambda: invalidate_tags(*tags))
+    return comments
+
+
+def _last_comment_id():
+    """Граница для поиска id вставленных строк там, где bulk_create их не
+    возвращает.
+
+    На SQLite транзакция уже держит блокировку записи после UPDATE
+    счётчика, поэтому все строки с id больше границы — наши.
+    """
+    if connection.features.can_return_ids_from_bulk_insert:
+        return None
+    return Comment.objects.aggregate(last=Max('pk'))['last'] or 0
+
+
+def _created_ids(comments, last_id):
+    if last_id is None:
+        return [comment.pk for comment in comments]
+    return Comment.objects.filter(
+        pk__gt=last_id,
+        post_id__in={comment.post_id for comment in comments},
+    ).values_list('pk', flat=True)
+
+
+def create_comment(post_id, author, text):
+    """Комментарий к посту или None, если поста нет."""
+    comments = create_comments([(post_id, author.pk, text)])
+    return comments[0] if comments else None
@@ -0,0 +1,167 @@
+"""Условные ответы: ETag и Last-Modified без отрисовки страницы.
+
+Состояние страницы — ключи её строк (id и версия поста, дата) и версии
+тегов кэша, от которых зависит вывод. Они читаются одним индексным
+запросом и одним запросом к кэшу, поэтому неизменившаяся страница
+отдаётся ответом 304 без сериализации и шаблонов.
+"""
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.views.decorators.http import condition
+
+from . import constants
+from .cache import tag_versions
+from .models import Comment, Group, Post, User
+from .stats import get_group_stats, get_stats
+from .utils import paginate
+
+FEED_FIELDS = ('id', 'version', 'pub_date', 'author_id', 'group__slug')
+
+
+def tag_time(version):
+    """Момент сброса тега: версии тегов — время в наносекундах."""
+    return datetime.fromtimestamp(version / 10 ** 9, tz=timezone.utc)
+
+
+class PageState:
+    """Ключи страницы и вычисленные по ним ETag и Last-Modified."""
+
+    def __init__(self, request, keys, tags=(), times=(), extra=()):
+        versions = tag_versions(sorted(set(tags)))
+        digest = hashlib.sha256()
+        for part in (request.get_full_path(), keys,
+                     sorted(versions.items()), extra):
+            digest.update(repr(part).encode())
+        self.etag = digest.hexdigest()
+        times = list(times) + [tag_time(v) for v in versions.values()]
+        self.last_modified = max(times, default=None)
+
+
+def feed_state(request, posts, tags=(), extra=(), cursor=False, count=None):
+    """Состояние страницы ленты постов.
+
+    Страница выбирается так же, как в paginate. Правка поста меняет его
+    версию, переименование автора или группы — версии тегов «user:<id>» и
+    «group:<slug>», появление и удаление постов — набор ключей страницы.
+    """
+    page = paginate(
+        request, posts.values(*FEED_FIELDS), cursor=cursor, count=count)
+    tags = set(tags)
+    for row in page:
+        tags.add(f'post:{row["id"]}')
+        tags.add(f'user:{row["author_id"]}')
+        if row['group__slug']:
+            tags.add(f'group:{row["group__slug"]}')
+    state = PageState(
+        request,
+        [(row['id'], row['version']) for row in page],
+        tags,
+        [row['pub_date'] for row in page],
+        extra,
+    )
+    state.page = page
+    return state
+
+
+def conditional_page(state_func):
+    """Декоратор: отвечает 304, если состояние страницы не изменилось.
+
+    state_func(request, *args, **kwargs) возвращает PageState или None,
+    если объекта нет (тогда представление само отвечает 404). Состояние
+    сохраняется в request.page_state, чтобы представление не читало
+    ключи страницы и сам объект страницы повторно.
+    """
+    def get_state(request, *args, **kwargs):
+        if not hasattr(request, 'page_state'):
+            request.page_state = state_func(request, *args, **kwargs)
+        return request.page_state
+
+    def etag(request, *args, **kwargs):
+        state = get_state(request, *args, **kwargs)
+        return state.etag if state else None
+
+    def last_modified(request, *args, **kwargs):
+        state = get_state(request, *args, **kwargs)
+        return state.last_modified if state else None
+
+    def decorator(view):
+        return wraps(view)(condition(etag, last_modified)(view))
+    return decorator
+
+
+def viewer_key(request):
+    """Части HTML-страницы, которые зависят от посетителя.
+
+    Кроме пользователя учитывается CSRF-cookie: отданная из кэша браузера
+    форма должна содержать токен, который примет CsrfViewMiddleware.
+    """
+    return (
+        request.user.pk,
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME),
+    )
+
+
+def group_page_state(request, slug):
+    group = Group.objects.select_related('stats').filter(slug=slug).first()
+    if group is None:
+        return None
+    state = feed_state(
+        request, Post.objects.filter(group=group),
+        tags=[f'group:{slug}'], extra=viewer_key(request),
+        count=get_group_stats(group).posts_count)
+    state.group = group
+    return state
+
+
+def profile_page_state(request, username):
+    author = User.objects.select_related('stats').filter(
+        username=username).first()
+    if author is None:
+        return None
+    # Счётчики и кнопка подписки зависят от тегов автора, рекомендации —
+    # от подписок посетителя.
+    tags = [f'author:{author.pk}', f'user:{author.pk}']
+    if request.user.is_authenticated:
+        tags.append(f'author:{request.user.pk}')
+    state = feed_state(
+        request, Post.objects.filter(author=author),
+        tags=tags,
+        extra=viewer_key(request),
+        count=get_stats(author).posts_count)
+    state.author = author
+    return state
+
+
+def post_page_state(request, post_id):
+    post = Post.objects.filter(pk=post_id).values(
+        'version', 'pub_date', 'author_id', 'group__slug').first()
+    if post is None:
+        return None
+    comments = paginate(
+        request,
+        Comment.objects.filter(post_id=post_id).values(
+            'id', 'created', 'author_id'),
+        cursor=True,
+        per_page=constants.MAX_COMMENTS_ON_PAGE,
+        ordering=constants.COMMENT_ORDERING,
+    )
+    # Тег поста сбрасывается и при изменении комментариев, тег автора —
+    # при изменении числа его постов.
+    tags = {
+        f'post:{post_id}',
+        f'author:{post["author_id"]}',
+        f'user:{post["author_id"]}',
+    }
+    tags.update(f'user:{comment["author_id"]}' for comment in comments)
+    if post['group__slug']:
+        tags.add(f'group:{post["group__slug"]}')
+    return PageState(
+        request,
+        (post['version'], [comment['id'] for comment in comments]),
+        tags,
+        [post['pub_date']] + [comment['created'] for comment in comments],
+        viewer_key(request),
+    )
@@ -1,2 +1,46 @@
 MAX_POSTS_ON_PAGE = 10
 N_SYMBOLS_TO_SHOW = 15
+CURSOR_ORDERING = ('-pub_date', '-id')
+TIMELINE_FANOUT_LIMIT = 5000
+TIMELINE_BATCH_SIZE = 1000
+TIMELINE_BACKFILL_LIMIT = 50
+POST_FRAGMENT_TIMEOUT = 60 * 60 * 24
+MAX_COMMENTS_ON_PAGE = 20
+COMMENT_ORDERING = ('-created', '-id')
+BACKGROUND_WORKERS = 2
+POST_THUMBNAIL_GEOMETRY = '960x339'
+POST_THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+POST_IMAGE_WIDTHS = (480, 960)
+POST_IMAGE_RATIO = (960, 339)
+POST_IMAGE_QUALITY = {'JPEG': 85, 'WEBP': 80}
+POST_IMAGE_SIZES = '(max-width: 960px) 100vw, 960px'
+MAX_IMAGE_UPLOAD_SIZE = 10 * 1024 * 1024
+MAX_IMAGE_SIDE = 8000
+MAX_IMAGE_PIXELS = 40_000_000
+IMAGE_HEADER_SNIFF_SIZE = 256 * 1024
+ALLOWED_IMAGE_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+SEARCH_TABLE = 'posts_search'
+SEARCH_COMMENTS_TABLE = 'posts_search_comments'
+SEARCH_CONFIG = 'russian'
+SEARCH_WEIGHTS = (2.0, 1.0)
+MAX_SEARCH_TERMS = 8
+FEED_API_VERSION = 1
+NOTIFICATION_BATCH_SIZE = 1000
+NOTIFICATION_EVENTS_PER_DRAIN = 100
+MAX_NOTIFICATIONS_ON_PAGE = 20
+PAGE_RANGE_ON_EACH_SIDE = 2
+PAGE_RANGE_ON_ENDS = 1
+ESTIMATED_COUNT_THRESHOLD = 100_000
+COUNT_CACHE_TIMEOUT = 60 * 5
+FOLLOW_BATCH_SIZE = 500
+MAX_FOLLOW_BATCH = 1000
+FOLLOW_GRAPH_TTL = 60 * 5
+FOLLOW_GRAPH_COMPACT_SIZE = 10_000
+FOLLOW_GRAPH_FANOUT = 200
+FOLLOW_GRAPH_POPULAR = 50
+MAX_FOLLOW_SUGGESTIONS = 5
+MAX_FOLLOWS_ON_PAGE = 50
+COMMENT_BURST = 5
+COMMENT_REFILL_SECONDS = 10
+COMMENT_BATCH_SIZE = 500
+NOTIFICATION_CLAIM_TIMEOUT = 15 * 60
@@ -0,0 +1,115 @@
+"""Подписки на авторов одним запросом к базе.
+
+Подписка вставляется запросом INSERT ... SELECT ... ON CONFLICT DO
+NOTHING: автор ищется по имени прямо в запросе, а уникальное ограничение
+unique_follow отсекает повторные и одновременные клики без
+предварительной проверки exists(). Отписка — DELETE ... RETURNING.
+Запрос возвращает только реально созданные или удалённые строки, и для
+них вручную отправляются post_save и post_delete, чтобы счётчики, ленты
+и теги кэша обновились так же, как при Follow.save() и delete().
+"""
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+
+from . import constants
+from .models import Follow, User
+
+INSERT_SQL = (
+    'INSERT INTO {follow} (user_id, author_id) '
+    'SELECT %s, id FROM {user} WHERE username IN ({names}) AND id <> %s '
+    'ON CONFLICT (user_id, author_id) DO NOTHING '
+    'RETURNING id, author_id'
+)
+DELETE_SQL = (
+    'DELETE FROM {follow} WHERE user_id = %s AND author_id IN '
+    '(SELECT id FROM {user} WHERE username IN ({names})) '
+    'RETURNING id, author_id'
+)
+
+
+def supports_returning():
+    """ON CONFLICT и RETURNING есть в PostgreSQL и в SQLite с 3.35."""
+    if connection.vendor == 'postgresql':
+        return True
+    return (
+        connection.vendor == 'sqlite'
+        and connection.Database.sqlite_version_info >= (3, 35)
+    )
+
+
+def _chunks(usernames):
+    usernames = list(dict.fromkeys(usernames))
+    for start in range(0, len(usernames), constants.FOLLOW_BATCH_SIZE):
+        yield usernames[start:start + constants.FOLLOW_BATCH_SIZE]
+
+
+def _execute(template, params, names):
+    sql = template.format(
+        follow=connection.ops.quote_name(Follow._meta.db_table),
+        user=connection.ops.quote_name(User._meta.db_table),
+        names=', '.join(['%s'] * len(names)),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _orm_follow(user, usernames):
+    # СУБД без RETURNING: обычный путь через ORM, сигналы отправляет
+    # сам Django, а от дубликатов защищает то же ограничение.
+    created = []
+    authors = User.objects.filter(username__in=usernames).exclude(pk=user.pk)
+    for author_id in authors.values_list('pk', flat=True):
+        instance, is_new = Follow.objects.get_or_create(
+            user=user, author_id=author_id)
+        if is_new:
+            created.append(instance)
+    return created
+
+
+def _orm_unfollow(user, usernames):
+    follows = list(Follow.objects.filter(
+        user=user, author__username__in=usernames))
+    for instance in follows:
+        instance.delete()
+    return follows
+
+
+def follow(user, usernames):
+    """Подписывает пользователя на авторов; возвращает новые подписки.
+
+    Несуществующие имена, сам пользователь и уже оформленные подписки
+    пропускаются.
+    """
+    created = []
+    with transaction.atomic():
+        if not supports_returning():
+            return _orm_follow(user, usernames)
+        for names in _chunks(usernames):
+            params = [user.pk, *names, user.pk]
+            for pk, author_id in _execute(INSERT_SQL, params, names):
+                instance = Follow(pk=pk, user=user, author_id=author_id)
+                # Экземпляр создан в обход save(), Django о нём не знает.
+                instance._state.adding = False
+                instance._state.db = connection.alias
+                post_save.send(
+                    sender=Follow, instance=instance, created=True,
+                    update_fields=None, raw=False, using=connection.alias)
+                created.append(instance)
+    return created
+
+
+def unfollow(user, usernames):
+    """Отписывает пользователя от авторов; возвращает удалённые подписки."""
+    deleted = []
+    with transaction.atomic():
+        if not supports_returning():
+            return _orm_unfollow(user, usernames)
+        for names in _chunks(usernames):
+            params = [user.pk, *names]
+            for pk, author_id in _execute(DELETE_SQL, params, names):
+                instance = Follow(pk=pk, user=user, author_id=author_id)
+                post_delete.send(
+                    sender=Follow, instance=instance, using=connection.alias)
+                deleted.append(instance)
+    return deleted
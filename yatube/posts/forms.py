@@ -1,6 +1,8 @@
 from django import forms
 
 from .models import Post, Comment
+from .uploadhandlers import image_header_error, image_size_error
+from . import constants
 
 
 class PostForm(forms.ModelForm):
@@ -20,6 +22,31 @@ class PostForm(forms.ModelForm):
             'group': 'id_group',
         }
 
+    def clean_image(self):
+        image_file = self.cleaned_data['image']
+        image = getattr(image_file, 'image', None)
+        if image is None:
+            # Картинка не менялась или не загружалась.
+            return image_file
+        # Загрузки мимо ImageUploadHandler проверяются здесь же.
+        if image_file.size > constants.MAX_IMAGE_UPLOAD_SIZE:
+            raise forms.ValidationError(
+                image_size_error(), code='file_too_large')
+        error = image_header_error(image.format, *image.size)
+        if error:
+            raise forms.ValidationError(error, code='invalid_image')
+        return image_file
+
+    def clean(self):
+        cleaned_data = super().clean()
+        error = getattr(self.files.get('image'), 'upload_error', None)
+        if error:
+            # Обработчик оборвал запись файла, поэтому ImageField выдал
+            # общую ошибку; показываем настоящую причину.
+            self.errors.pop('image', None)
+            self.add_error('image', error)
+        return cleaned_data
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
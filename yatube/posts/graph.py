@@ -0,0 +1,319 @@
+"""Граф подписок в памяти процесса для рекомендаций «на кого подписаться».
+
+Рёбра Follow хранятся в сжатом виде (CSR) в массивах array('q'):
+отсортированные id подписчиков, смещения их строк и идущие подряд
+отсортированные id авторов. Проверка подписки — двоичный поиск в строке,
+друзья друзей — обход нескольких строк, без запросов к базе.
+
+Подписки, оформленные после загрузки, сигналы Follow после коммита
+складывают в небольшие словари поверх массивов; значения в них —
+frozenset, которые заменяются целиком, поэтому читатели обходятся без
+блокировки. При накоплении FOLLOW_GRAPH_COMPACT_SIZE изменений массивы
+пересобираются. Изменения из других воркеров подхватываются полной
+перезагрузкой: раз в FOLLOW_GRAPH_TTL секунд граф сверяет свою версию с
+версией тега FOLLOWS_TAG, который сбрасывается после коммита каждой
+подписки и отписки, и перечитывает таблицу, только если она изменилась.
+И сборка, и перезагрузка идут в фоновом пуле: запросы тем временем
+читают прежний снимок, а изменения, пришедшие во время сборки,
+записываются в журнал и применяются к новому снимку перед подменой.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from . import constants, relations, tasks
+from .cache import invalidate_tags, tag_versions
+from .models import Follow, User
+
+FOLLOWS_TAG = 'follows'
+
+
+def _build(edges):
+    """CSR из рёбер, отсортированных по (user_id, author_id)."""
+    users = array('q')
+    offsets = array('q', [0])
+    targets = array('q')
+    current = None
+    for user_id, author_id in edges:
+        if user_id != current:
+            if current is not None:
+                offsets.append(len(targets))
+            users.append(user_id)
+            current = user_id
+        targets.append(author_id)
+    if current is not None:
+        offsets.append(len(targets))
+    return users, offsets, targets
+
+
+def _most_followed(csr):
+    counts = Counter(csr[2])
+    return [
+        author_id for author_id, _ in
+        counts.most_common(constants.FOLLOW_GRAPH_POPULAR)
+    ]
+
+
+def _row(csr, user_id):
+    users, offsets, _ = csr
+    index = bisect_left(users, user_id)
+    if index < len(users) and users[index] == user_id:
+        return offsets[index], offsets[index + 1]
+    return 0, 0
+
+
+def _in_csr(csr, user_id, author_id):
+    start, end = _row(csr, user_id)
+    index = bisect_left(csr[2], author_id, start, end)
+    return index < end and csr[2][index] == author_id
+
+
+def _following(state, user_id):
+    csr, added, removed = state
+    start, end = _row(csr, user_id)
+    excluded = removed.get(user_id, ())
+    authors = [
+        author_id for author_id in csr[2][start:end]
+        if author_id not in excluded
+    ]
+    authors.extend(added.get(user_id, ()))
+    return authors
+
+
+def _edges(state):
+    """Рёбра снимка с изменениями, отсортированные для _build."""
+    csr, added, _ = state
+    for user_id in sorted(set(csr[0]) | set(added)):
+        for author_id in sorted(_following(state, user_id)):
+            yield user_id, author_id
+
+
+class FollowGraph:
+    """Снимок подписок и изменения, внесённые после его сборки.
+
+    Снимок — кортеж (csr, added, removed), который подменяется одним
+    присваиванием.
+    """
+
+    def __init__(self, edges=()):
+        self._state = (_build(edges), {}, {})
+        self._popular = _most_followed(self._state[0])
+        self._changes = 0
+        self._journal = None
+        self._lock = threading.Lock()
+        self.loaded_at = None
+        self.version = None
+
+    def follows(self, user_id, author_id):
+        """Подписан ли user_id на author_id."""
+        csr, added, removed = self._state
+        if author_id in added.get(user_id, ()):
+            return True
+        if author_id in removed.get(user_id, ()):
+            return False
+        return _in_csr(csr, user_id, author_id)
+
+    def is_mutual(self, first_id, second_id):
+        """Подписаны ли пользователи друг на друга."""
+        return (self.follows(first_id, second_id)
+                and self.follows(second_id, first_id))
+
+    def following(self, user_id):
+        """id авторов, на которых подписан пользователь."""
+        return _following(self._state, user_id)
+
+    def add(self, user_id, author_id):
+        self._change(user_id, author_id, True)
+
+    def remove(self, user_id, author_id):
+        self._change(user_id, author_id, False)
+
+    def _change(self, user_id, author_id, follows):
+        with self._lock:
+            self._apply(user_id, author_id, follows)
+            if self._journal is not None:
+                self._journal.append((user_id, author_id, follows))
+            self._changes += 1
+            compact = (
+                self._changes >= constants.FOLLOW_GRAPH_COMPACT_SIZE
+                and self._journal is None)
+            if compact:
+                self._journal = []
+        if compact:
+            tasks.submit(self.rebuild)
+
+    def _apply(self, user_id, author_id, follows):
+        csr, added, removed = self._state
+        present, absent = (added, removed) if follows else (removed, added)
+        if author_id in absent.get(user_id, ()):
+            absent[user_id] = absent[user_id] - {author_id}
+        if _in_csr(csr, user_id, author_id) != follows:
+            present[user_id] = (
+                present.get(user_id, frozenset()) | {author_id})
+
+    def begin_rebuild(self):
+        """Включает журнал изменений; False, если сборка уже идёт."""
+        with self._lock:
+            if self._journal is not None:
+                return False
+            self._journal = []
+            return True
+
+    def rebuild(self, edges=None, version=None):
+        """Собирает массивы из edges или из текущего снимка и подменяет их.
+
+        Вызывается после begin_rebuild; изменения из журнала применяются к
+        новому снимку под блокировкой. version — версия тега FOLLOWS_TAG,
+        с которой прочитана таблица Follow.
+        """
+        try:
+            if edges is None:
+                with self._lock:
+                    csr, added, removed = self._state
+                    state = (csr, dict(added), dict(removed))
+                edges = _edges(state)
+            csr = _build(edges)
+            popular = _most_followed(csr)
+        except Exception:
+            with self._lock:
+                self._journal = None
+            raise
+        with self._lock:
+            self._state = (csr, {}, {})
+            self._popular = popular
+            for change in self._journal:
+                self._apply(*change)
+            self._changes = len(self._journal)
+            self._journal = None
+            if version is not None:
+                self.loaded_at = time.monotonic()
+                self.version = version
+
+    def expired(self):
+        return self.loaded_at is None or (
+            time.monotonic() - self.loaded_at > constants.FOLLOW_GRAPH_TTL)
+
+    def confirm(self, version):
+        """Продлевает TTL, если таблица не менялась с загрузки графа."""
+        if version != self.version:
+            return False
+        self.loaded_at = time.monotonic()
+        return True
+
+    def suggestions(self, user_id=None, seeds=(),
+                    limit=constants.MAX_FOLLOW_SUGGESTIONS):
+        """Авторы, на которых подписаны авторы из подписок пользователя.
+
+        seeds добавляет источники рекомендаций, например автора открытого
+        профиля. Кандидаты упорядочены по числу общих связей, нехватка
+        добирается самыми популярными авторами.
+        """
+        state = self._state
+        following = _following(state, user_id) if user_id else []
+        excluded = set(following) | set(seeds) | {user_id}
+        scores = Counter()
+        sources = list(seeds) + following
+        for source in islice(sources, constants.FOLLOW_GRAPH_FANOUT):
+            for candidate in islice(
+                    _following(state, source), constants.FOLLOW_GRAPH_FANOUT):
+                if candidate not in excluded:
+                    scores[candidate] += 1
+        ranked = sorted(scores, key=lambda author_id: (
+            -scores[author_id], author_id))[:limit]
+        for author_id in self._popular:
+            if len(ranked) >= limit:
+                break
+            if author_id not in excluded and author_id not in ranked:
+                ranked.append(author_id)
+        return ranked
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def load(graph, version):
+    """Перечитывает граф из таблицы Follow одним потоковым запросом."""
+    edges = Follow.objects.order_by('user_id', 'author_id').values_list(
+        'user_id', 'author_id')
+    graph.rebuild(edges.iterator(), version)
+
+
+def get_graph():
+    """Граф процесса.
+
+    Загрузка и перезагрузка по TTL идут в фоне; до конца первой загрузки
+    граф пуст. По истечении TTL читается только версия тега FOLLOWS_TAG,
+    таблица перечитывается, если версия сменилась.
+    """
+    global _graph
+    graph = _graph
+    if graph is None:
+        with _graph_lock:
+            if _graph is None:
+                _graph = FollowGraph()
+            graph = _graph
+    if graph.expired():
+        version = tag_versions([FOLLOWS_TAG])[FOLLOWS_TAG]
+        if not graph.confirm(version) and graph.begin_rebuild():
+            tasks.submit(load, graph, version)
+    return graph
+
+
+def reset():
+    """Сбрасывает граф процесса, следующее обращение загрузит его заново."""
+    global _graph
+    _graph = None
+
+
+def _on_commit(change, user_id, author_id):
+    # Тег сбрасывается после коммита: воркер, прочитавший новую версию,
+    # должен увидеть и новую строку Follow.
+    def apply():
+        invalidate_tags(FOLLOWS_TAG)
+        graph = _graph
+        if graph is not None:
+            change(graph, user_id, author_id)
+    transaction.on_commit(apply)
+
+
+def edge_added(user_id, author_id):
+    _on_commit(FollowGraph.add, user_id, author_id)
+
+
+def edge_removed(user_id, author_id):
+    _on_commit(FollowGraph.remove, user_id, author_id)
+
+
+def suggested_authors(user=None, seed=None,
+                      limit=constants.MAX_FOLLOW_SUGGESTIONS, request=None):
+    """Пользователи для блока «на кого подписаться».
+
+    Подписки посетителя на них читаются тем же запросом и запоминаются в
+    request для кнопок подписки. Авторы, подписку на которых граф ещё не
+    увидел (она оформлена в другом воркере), отбрасываются.
+    """
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    seeds = [seed.pk] if seed is not None else []
+    ids = get_graph().suggestions(user_id, seeds, limit)
+    if not ids:
+        return []
+    users = User.objects.select_related('stats')
+    if user_id:
+        users = users.annotate(followed=Exists(Follow.objects.filter(
+            user_id=user_id, author=OuterRef('pk'))))
+    users = users.in_bulk(ids)
+    if user_id:
+        relations.remember(
+            user, {pk: found.followed for pk, found in users.items()},
+            request)
+    return [
+        users[pk] for pk in ids
+        if pk in users and not getattr(users[pk], 'followed', False)
+    ]
@@ -0,0 +1,112 @@
+"""Адаптивные варианты картинок постов.
+
+Из Post.image за одно декодирование готовятся кадрированные варианты
+нескольких ширин в JPEG и WebP. Имена вариантов вычисляются из имени
+картинки, поэтому отдельная таблица для них не нужна. Запасная миниатюра
+sorl строится из того же декодированного изображения: движок Engine
+берёт его у decoded() вместо повторного чтения исходника.
+"""
+import os
+import threading
+from contextlib import contextmanager
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, features
+from sorl.thumbnail.engines import pil_engine
+
+from . import constants
+
+FORMATS = {'JPEG': 'jpg', 'WEBP': 'webp'}
+
+_decoded = threading.local()
+
+
+class Engine(pil_engine.Engine):
+    """Движок sorl, который не декодирует картинку, открытую в decoded()."""
+
+    def get_image(self, source):
+        image = getattr(_decoded, 'images', {}).get(source.name)
+        if image is not None:
+            return image
+        return super().get_image(source)
+
+
+@contextmanager
+def decoded(image_field):
+    """Открывает картинку один раз для вариантов и миниатюры sorl."""
+    images = _decoded.__dict__.setdefault('images', {})
+    image_field.open('rb')
+    try:
+        with Image.open(image_field) as source:
+            images[image_field.name] = source
+            try:
+                yield source
+            finally:
+                del images[image_field.name]
+    finally:
+        image_field.close()
+
+
+def output_formats():
+    """JPEG есть всегда, WebP — если Pillow собран с libwebp."""
+    if features.check('webp'):
+        return ('WEBP', 'JPEG')
+    return ('JPEG',)
+
+
+def variant_name(image_name, width, image_format):
+    stem = os.path.splitext(image_name)[0]
+    return f'variants/{stem}-{width}w.{FORMATS[image_format]}'
+
+
+def variant_height(width):
+    ratio_width, ratio_height = constants.POST_IMAGE_RATIO
+    return round(width * ratio_height / ratio_width)
+
+
+def _crop_to_ratio(image):
+    ratio_width, ratio_height = constants.POST_IMAGE_RATIO
+    width, height = image.size
+    if width * ratio_height > height * ratio_width:
+        new_width = height * ratio_width // ratio_height
+        left = (width - new_width) // 2
+        return image.crop((left, 0, left + new_width, height))
+    new_height = width * ratio_height // ratio_width
+    top = (height - new_height) // 2
+    return image.crop((0, top, width, top + new_height))
+
+
+def generate_variants(image_field, source, storage=default_storage):
+    """Готовит все варианты картинки из декодированного source."""
+    cropped = _crop_to_ratio(source.convert('RGB'))
+    names = []
+    for width in constants.POST_IMAGE_WIDTHS:
+        resized = cropped.resize(
+            (width, variant_height(width)), Image.LANCZOS)
+        for image_format in output_formats():
+            buffer = BytesIO()
+            resized.save(
+                buffer, image_format,
+                quality=constants.POST_IMAGE_QUALITY[image_format])
+            name = variant_name(image_field.name, width, image_format)
+            storage.delete(name)
+            names.append(
+                storage.save(name, ContentFile(buffer.getvalue())))
+    return names
+
+
+def variant_urls(image_name, storage=default_storage):
+    """Ссылки на готовые варианты по форматам или None, если их нет."""
+    largest = max(constants.POST_IMAGE_WIDTHS)
+    if not storage.exists(variant_name(image_name, largest, 'JPEG')):
+        return None
+    return {
+        image_format: [
+            (storage.url(variant_name(image_name, width, image_format)),
+             width)
+            for width in sorted(constants.POST_IMAGE_WIDTHS)
+        ]
+        for image_format in output_formats()
+    }
@@ -0,0 +1,137 @@
+import json
+import subprocess
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.runner import DiscoverRunner
+from django.test.utils import (
+    override_settings, setup_test_environment, teardown_test_environment)
+from django.utils import timezone
+
+from core.cache import SHARED_CACHE
+from posts import benchmark
+
+# Замеры не должны ни читать, ни засорять общий кэш проекта.
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark',
+    },
+    SHARED_CACHE: {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark-shared',
+    },
+}
+
+
+def current_commit():
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержки и число запросов к БД для index, group_posts, '
+        'profile, post_detail и follow_index на сгенерированных данных. '
+        'Данные создаются во временной тестовой базе и удаляются после '
+        'замера.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', action='append', dest='scales',
+            choices=sorted(benchmark.SCALES),
+            help='Размер набора данных; можно указать несколько раз',
+        )
+        parser.add_argument(
+            '--posts', type=int, action='append', default=[],
+            help='Произвольный размер набора данных в постах',
+        )
+        parser.add_argument(
+            '--requests', type=int, default=30,
+            help='Запросов к каждому представлению',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--output', default='benchmark.json',
+            help='Файл для результатов в JSON',
+        )
+        parser.add_argument(
+            '--compare', help='JSON прошлого прогона для сравнения',
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=1.2,
+            help='Допустимый рост p95 при сравнении, во сколько раз',
+        )
+
+    def handle(self, *args, **options):
+        scales = {
+            name: benchmark.SCALES[name] for name in options['scales'] or []
+        }
+        scales.update({str(posts): posts for posts in options['posts']})
+        if not scales:
+            scales = {'10k': benchmark.SCALES['10k']}
+        previous = None
+        if options['compare']:
+            with open(options['compare']) as file:
+                previous = json.load(file)
+
+        results = {
+            'commit': current_commit(),
+            'created': timezone.now().isoformat(),
+            'requests': options['requests'],
+            'scales': {},
+        }
+        setup_test_environment()
+        try:
+            for name, posts in scales.items():
+                results['scales'][name] = self.run_scale(posts, options)
+                results['database'] = connection.vendor
+        finally:
+            teardown_test_environment()
+
+        with open(options['output'], 'w') as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f'Результаты сохранены в {options["output"]}'))
+
+        if previous is not None:
+            lines, regressed = benchmark.compare(
+                previous, results, options['threshold'])
+            for bad, line in lines:
+                self.stdout.write(
+                    self.style.ERROR(line) if bad else line)
+            if regressed:
+                raise CommandError('Производительность ухудшилась')
+
+    def run_scale(self, posts, options):
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = runner.setup_databases()
+        try:
+            with override_settings(CACHES=BENCHMARK_CACHES):
+                start = time.perf_counter()
+                dataset = benchmark.build_dataset(posts, options['seed'])
+                build_time = time.perf_counter() - start
+                self.stdout.write(
+                    f'{posts} постов: данные готовы за {build_time:.1f} с')
+                views = benchmark.measure(
+                    options['requests'], seed=options['seed'])
+        finally:
+            runner.teardown_databases(old_config)
+        for view, result in views.items():
+            self.stdout.write(
+                f'  {view}: p50 {result["p50_ms"]} мс, '
+                f'p95 {result["p95_ms"]} мс, '
+                f'запросов {result["queries_median"]}–'
+                f'{result["queries_max"]}')
+        return {
+            'dataset': dataset,
+            'build_seconds': round(build_time, 1),
+            'views': views,
+        }
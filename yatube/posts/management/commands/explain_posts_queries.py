@@ -0,0 +1,103 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts import constants
+from posts.models import Comment, Follow, Group, Post, User
+from posts.timeline import timeline_posts
+
+# Postgres: «Seq Scan on posts_post»; SQLite: «SCAN posts_post» без индекса.
+SEQ_SCAN_PATTERNS = (
+    re.compile(r'Seq Scan on (\w+)'),
+    re.compile(r'\bSCAN (?:TABLE )?(\w+)\b(?! USING (?:COVERING )?INDEX)'),
+)
+# SQLite: «SCAN posts_post USING INDEX ...» — перебор индекса целиком,
+# а не поиск диапазона (SEARCH).
+INDEX_SCAN_PATTERN = re.compile(
+    r'\bSCAN (?:TABLE )?(\w+) USING (?:COVERING )?INDEX')
+# SQLite: «USE TEMP B-TREE FOR ORDER BY»; Postgres: узел Sort.
+TEMP_SORT_PATTERNS = (
+    re.compile(r'USE TEMP B-TREE FOR ([\w ]+)'),
+    re.compile(r'^\s*(?:->\s*)?(?:Incremental )?(Sort)\b(?! Key| Method)'),
+)
+
+
+def find_seq_scans(plan):
+    """Таблицы, которые план читает полным перебором."""
+    tables = []
+    for line in plan.splitlines():
+        for pattern in SEQ_SCAN_PATTERNS:
+            match = pattern.search(line)
+            if match:
+                tables.append(match.group(1))
+    return tables
+
+
+def find_plan_issues(plan):
+    """Полный перебор таблиц и индексов и сортировки вне индекса."""
+    issues = [f'полный перебор {table}' for table in find_seq_scans(plan)]
+    for line in plan.splitlines():
+        match = INDEX_SCAN_PATTERN.search(line)
+        if match:
+            issues.append(f'перебор индекса {match.group(1)}')
+        for pattern in TEMP_SORT_PATTERNS:
+            match = pattern.search(line)
+            if match:
+                issues.append(f'временная сортировка ({match.group(1)})')
+    return issues
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет EXPLAIN для запросов страниц приложения posts и '
+        'отмечает полный перебор таблиц и индексов и сортировку во '
+        'временной структуре. На маленьких таблицах СУБД может выбирать '
+        'их сознательно, проверяйте на реальных данных.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--strict', action='store_true',
+            help='Завершиться с ошибкой, если в планах есть замечания',
+        )
+
+    def view_queries(self):
+        """Запросы, которые выполняют представления posts."""
+        queries = {
+            'index': Post.objects.select_related('group', 'author'),
+        }
+        group = Group.objects.first()
+        if group:
+            queries['group_posts'] = group.posts.select_related('author')
+        author = User.objects.filter(posts__isnull=False).first()
+        if author:
+            queries['profile'] = author.posts.select_related('group')
+        follow = Follow.objects.select_related('user').first()
+        if follow:
+            queries['follow_index'] = timeline_posts(
+                follow.user).select_related('author', 'group')
+            queries['profile_following'] = Follow.objects.filter(
+                user_id=follow.user_id, author_id=follow.author_id)
+        post = Post.objects.first()
+        if post:
+            queries['post_detail_comments'] = Comment.objects.filter(
+                post=post).select_related('author').order_by(
+                    *constants.COMMENT_ORDERING)
+        return queries
+
+    def handle(self, *args, **options):
+        flagged = {}
+        for name, queryset in self.view_queries().items():
+            plan = queryset[:constants.MAX_POSTS_ON_PAGE].explain()
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(plan)
+            issues = find_plan_issues(plan)
+            if issues:
+                flagged[name] = issues
+                self.stdout.write(self.style.WARNING(
+                    f'Замечания: {", ".join(issues)}'))
+        self.stdout.write(f'СУБД: {connection.vendor}')
+        if flagged and options['strict']:
+            raise CommandError(
+                'Замечания к планам запросов: ' + ', '.join(flagged))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.transfer import export_content
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает пользователей, группы, посты, комментарии и подписки '
+        'в файлы JSON Lines'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Каталог для файлов')
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Сколько моделей выгружать одновременно',
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        counts = export_content(options['directory'], options['workers'])
+        for name, count in counts.items():
+            self.stdout.write(f'{name}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Выгружено за {time.perf_counter() - start:.1f} с'))
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.transfer import import_content
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает пользователей, группы, посты, комментарии и подписки '
+        'из файлов JSON Lines, выгруженных командой export_content'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Каталог с файлами')
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Сколько независимых моделей загружать одновременно',
+        )
+        parser.add_argument(
+            '--ignore-conflicts', action='store_true',
+            help='Пропускать строки, которые уже есть в базе',
+        )
+        parser.add_argument(
+            '--skip-derived', action='store_true',
+            help='Не пересчитывать счётчики, ленты и поисковый индекс',
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        counts = import_content(
+            options['directory'],
+            workers=options['workers'],
+            ignore_conflicts=options['ignore_conflicts'],
+            derived=not options['skip_derived'],
+        )
+        for name, count in counts.items():
+            self.stdout.write(f'{name}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено за {time.perf_counter() - start:.1f} с'))
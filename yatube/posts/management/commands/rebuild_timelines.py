@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.timeline import rebuild_timelines
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает ленты подписок всех пользователей из Follow и Post'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            created = rebuild_timelines()
+        self.stdout.write(
+            self.style.SUCCESS(f'Записей в лентах: {created}'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import User
+from posts.stats import recount
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов и подписок авторов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Имена пользователей; по умолчанию пересчитываются все',
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+        updated = recount(users)
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересчитано авторов: {updated}'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Group
+from posts.stats import recount_groups
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает число постов и дату последнего поста групп'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'slugs', nargs='*',
+            help='Слаги групп; по умолчанию пересчитываются все',
+        )
+
+    def handle(self, *args, **options):
+        groups = Group.objects.all()
+        if options['slugs']:
+            groups = groups.filter(slug__in=options['slugs'])
+        updated = recount_groups(groups)
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересчитано групп: {updated}'))
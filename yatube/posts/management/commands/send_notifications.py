@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from posts import notifications
+from posts.models import NotificationEvent
+
+
+class Command(BaseCommand):
+    help = 'Раскладывает подписчикам уведомления из очереди событий'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retry-failed', action='store_true',
+            help='Вернуть в очередь события, которые завершились ошибкой',
+        )
+
+    def handle(self, *args, **options):
+        retried = notifications.reclaim_stale()
+        if retried:
+            self.stdout.write(f'Возвращено зависших событий: {retried}')
+        if options['retry_failed']:
+            retried += NotificationEvent.objects.filter(
+                status=NotificationEvent.FAILED,
+            ).update(status=NotificationEvent.PENDING, error='')
+        processed = notifications.drain()
+        if retried:
+            # Повторная раскладка могла увеличить счётчики дважды.
+            notifications.recount()
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано событий: {processed}'))
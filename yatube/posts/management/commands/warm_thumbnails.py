@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts import constants
+from posts.thumbnails import enqueue_missing, process_pending
+
+
+class Command(BaseCommand):
+    help = 'Готовит миниатюры картинок существующих постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=constants.BACKGROUND_WORKERS,
+            help='Количество параллельных потоков',
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать миниатюры и для уже обработанных постов',
+        )
+
+    def handle(self, *args, **options):
+        queued = enqueue_missing(force=options['force'])
+        results = process_pending(workers=options['workers'])
+        done = sum(1 for result in results if result)
+        self.stdout.write(self.style.SUCCESS(
+            f'Новых задач: {queued}, обработано: {len(results)}, '
+            f'успешно: {done}'))
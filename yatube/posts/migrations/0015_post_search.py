@@ -0,0 +1,74 @@
+import sqlite3
+from contextlib import closing
+
+from django.db import migrations
+
+# Схема индекса на момент миграции: один документ на пост с текстом и
+# комментариями. Код posts.search с тех пор менялся, поэтому SQL здесь
+# записан целиком.
+SQLITE_INSTALL = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS posts_search '
+    "USING fts5(text, comments, tokenize='unicode61')",
+    'DELETE FROM posts_search',
+    'INSERT INTO posts_search (rowid, text, comments) '
+    'SELECT p.id, p.text, COALESCE(('
+    "SELECT group_concat(c.text, ' ') "
+    'FROM posts_comment c WHERE c.post_id = p.id), '
+    "'') FROM posts_post p",
+)
+
+POSTGRES_INSTALL = (
+    'CREATE TABLE IF NOT EXISTS posts_search ('
+    'post_id integer PRIMARY KEY REFERENCES posts_post '
+    'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+    'document tsvector NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS posts_search_gin '
+    'ON posts_search USING gin (document)',
+    'TRUNCATE posts_search',
+    'INSERT INTO posts_search (post_id, document) '
+    "SELECT p.id, setweight(to_tsvector('russian', p.text), 'A') || "
+    "setweight(to_tsvector('russian', COALESCE(string_agg(c.text, ' '), "
+    "'')), 'B') "
+    'FROM posts_post p '
+    'LEFT JOIN posts_comment c ON c.post_id = p.id GROUP BY p.id',
+)
+
+
+def fts5_available():
+    with closing(sqlite3.connect(':memory:')) as conn:
+        try:
+            conn.execute('CREATE VIRTUAL TABLE probe USING fts5(text)')
+        except sqlite3.OperationalError:
+            return False
+    return True
+
+
+def install_statements(connection):
+    if connection.vendor == 'postgresql':
+        return POSTGRES_INSTALL
+    if connection.vendor == 'sqlite' and fts5_available():
+        return SQLITE_INSTALL
+    return ()
+
+
+def install_search(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for statement in install_statements(schema_editor.connection):
+            cursor.execute(statement)
+
+
+def uninstall_search(apps, schema_editor):
+    if install_statements(schema_editor.connection):
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_thumbnailjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search, uninstall_search),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_group_stats(apps, schema_editor):
+    """Считает сводку для уже существующих групп."""
+    Group = apps.get_model('posts', 'Group')
+    GroupStats = apps.get_model('posts', 'GroupStats')
+    groups = Group.objects.annotate(
+        posts_total=models.Count('posts'),
+        last_post=models.Max('posts__pub_date'),
+    ).values_list('pk', 'posts_total', 'last_post')
+    GroupStats.objects.bulk_create(
+        GroupStats(group_id=pk, posts_count=total, last_post_date=last)
+        for pk, total, last in groups.iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_notifications'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupStats',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='posts.Group')),
+                ('posts_count', models.PositiveIntegerField(default=0)),
+                ('last_post_date', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Group stats',
+                'verbose_name_plural': 'Group stats',
+            },
+        ),
+        migrations.RunPython(fill_group_stats, migrations.RunPython.noop),
+    ]
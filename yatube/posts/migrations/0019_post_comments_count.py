@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-17 05:00
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_comments_count(apps, schema_editor):
+    """Считает комментарии уже существующих постов."""
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    counts = (
+        Comment.objects.filter(post=models.OuterRef('pk'))
+        .order_by().values('post').annotate(total=models.Count('pk'))
+        .values('total')
+    )
+    Post.objects.update(comments_count=Coalesce(
+        models.Subquery(counts), models.Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_follow_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_comments_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-17 05:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_post_comments_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationevent',
+            name='claimed',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
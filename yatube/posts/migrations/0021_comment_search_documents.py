@@ -0,0 +1,92 @@
+import sqlite3
+from contextlib import closing
+
+from django.db import migrations
+
+# Комментарии становятся отдельными документами индекса, документ поста
+# содержит только его текст.
+SQLITE_FORWARD = (
+    'DROP TABLE IF EXISTS posts_search',
+    'CREATE VIRTUAL TABLE posts_search '
+    "USING fts5(text, tokenize='unicode61')",
+    'CREATE VIRTUAL TABLE IF NOT EXISTS posts_search_comments '
+    "USING fts5(text, post_id UNINDEXED, tokenize='unicode61')",
+    'DELETE FROM posts_search_comments',
+    'INSERT INTO posts_search (rowid, text) SELECT id, text FROM posts_post',
+    'INSERT INTO posts_search_comments (rowid, text, post_id) '
+    'SELECT id, text, post_id FROM posts_comment',
+)
+
+SQLITE_BACKWARD = (
+    'DROP TABLE IF EXISTS posts_search_comments',
+    'DROP TABLE IF EXISTS posts_search',
+    'CREATE VIRTUAL TABLE posts_search '
+    "USING fts5(text, comments, tokenize='unicode61')",
+    'INSERT INTO posts_search (rowid, text, comments) '
+    'SELECT p.id, p.text, COALESCE(('
+    "SELECT group_concat(c.text, ' ') "
+    'FROM posts_comment c WHERE c.post_id = p.id), '
+    "'') FROM posts_post p",
+)
+
+POSTGRES_FORWARD = (
+    'CREATE TABLE IF NOT EXISTS posts_search_comments ('
+    'comment_id integer PRIMARY KEY REFERENCES posts_comment '
+    'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+    'post_id integer NOT NULL, document tsvector NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS posts_search_comments_gin '
+    'ON posts_search_comments USING gin (document)',
+    'TRUNCATE posts_search, posts_search_comments',
+    'INSERT INTO posts_search (post_id, document) '
+    "SELECT id, setweight(to_tsvector('russian', text), 'A') "
+    'FROM posts_post',
+    'INSERT INTO posts_search_comments (comment_id, post_id, document) '
+    "SELECT id, post_id, setweight(to_tsvector('russian', text), 'B') "
+    'FROM posts_comment',
+)
+
+POSTGRES_BACKWARD = (
+    'DROP TABLE IF EXISTS posts_search_comments',
+    'TRUNCATE posts_search',
+    'INSERT INTO posts_search (post_id, document) '
+    "SELECT p.id, setweight(to_tsvector('russian', p.text), 'A') || "
+    "setweight(to_tsvector('russian', COALESCE(string_agg(c.text, ' '), "
+    "'')), 'B') "
+    'FROM posts_post p '
+    'LEFT JOIN posts_comment c ON c.post_id = p.id GROUP BY p.id',
+)
+
+
+def fts5_available():
+    with closing(sqlite3.connect(':memory:')) as conn:
+        try:
+            conn.execute('CREATE VIRTUAL TABLE probe USING fts5(text)')
+        except sqlite3.OperationalError:
+            return False
+    return True
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        connection = schema_editor.connection
+        if connection.vendor == 'sqlite' and not fts5_available():
+            return
+        with connection.cursor() as cursor:
+            for statement in statements.get(connection.vendor, ()):
+                cursor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_notificationevent_claimed'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            run({'sqlite': SQLITE_BACKWARD,
+                 'postgresql': POSTGRES_BACKWARD}),
+        ),
+    ]
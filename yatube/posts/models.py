@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 
 from posts.constants import N_SYMBOLS_TO_SHOW
@@ -29,16 +29,58 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True,
     )
+    version = models.PositiveIntegerField(default=1, editable=False)
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
 
         ordering = ('-pub_date',)
         verbose_name = 'Post'
         verbose_name_plural = 'Posts'
+        indexes = [
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='post_pub_date_idx',
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:N_SYMBOLS_TO_SHOW]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Группа и картинка на момент загрузки нужны, чтобы при их смене
+        # обновить данные старой группы и подготовить новые миниатюры.
+        instance.loaded_group_id = instance.__dict__.get('group_id')
+        instance.loaded_image = instance.__dict__.get('image')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Новая версия делает недействительными закэшированные фрагменты.
+        if self.pk:
+            self.version += 1
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # Счётчик комментариев меняется только F-выражениями, поэтому
+            # правка поста не затирает его прочитанным ранее значением.
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'comments_count'
+            ]
+        # post_save отправляется внутри save(), поэтому пост и то, что пишут
+        # его обработчики (событие уведомлений, счётчики), фиксируются
+        # вместе.
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
 
 class Comment(models.Model):
     """Модель коментариев к постам"""
@@ -61,6 +103,12 @@ class Comment(models.Model):
         ordering = ('-created',)
         verbose_name = 'Comment'
         verbose_name_plural = 'Comments'
+        indexes = [
+            models.Index(
+                fields=('post', '-created', '-id'),
+                name='comment_post_created_idx',
+            ),
+        ]
 
 
 class Group(models.Model):
@@ -97,7 +145,211 @@ class Follow(models.Model):
 
         verbose_name = 'Follow'
         verbose_name_plural = 'Follows'
+        indexes = [
+            models.Index(
+                fields=('author', '-id'),
+                name='follow_author_id_idx',
+            ),
+            models.Index(
+                fields=('user', '-id'),
+                name='follow_user_id_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_follow',
+            ),
+            models.CheckConstraint(
+                check=~models.Q(user=models.F('author')),
+                name='prevent_self_follow',
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Запись в заранее собранной ленте подписок пользователя"""
+
+    user = models.ForeignKey(
+        User,
+        related_name='timeline',
+        on_delete=models.CASCADE,
+    )
+    post = models.ForeignKey(
+        'Post',
+        related_name='timeline_entries',
+        on_delete=models.CASCADE,
+    )
+
+    class Meta:
+
+        verbose_name = 'Timeline entry'
+        verbose_name_plural = 'Timeline entries'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_timeline_entry',
+            ),
+        ]
+
+
+class AuthorStats(models.Model):
+    """Счётчики постов, подписчиков и подписок автора"""
+
+    author = models.OneToOneField(
+        User,
+        primary_key=True,
+        related_name='stats',
+        on_delete=models.CASCADE,
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+
+        verbose_name = 'Author stats'
+        verbose_name_plural = 'Author stats'
+
+
+class GroupStats(models.Model):
+    """Число постов группы и дата последнего из них"""
+
+    group = models.OneToOneField(
+        'Group',
+        primary_key=True,
+        related_name='stats',
+        on_delete=models.CASCADE,
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    last_post_date = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+
+        verbose_name = 'Group stats'
+        verbose_name_plural = 'Group stats'
+
+
+class ThumbnailJob(models.Model):
+    """Задача на подготовку миниатюры картинки поста"""
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    post = models.ForeignKey(
+        'Post',
+        related_name='thumbnail_jobs',
+        on_delete=models.CASCADE,
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+        db_index=True,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+
+        ordering = ('created',)
+        verbose_name = 'Thumbnail job'
+        verbose_name_plural = 'Thumbnail jobs'
+
+
+class NotificationEvent(models.Model):
+    """Событие о новом посте в исходящей очереди уведомлений"""
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    post = models.ForeignKey(
+        'Post',
+        related_name='notification_events',
+        on_delete=models.CASCADE,
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+        db_index=True,
+    )
+    worker = models.CharField(max_length=32, blank=True)
+    claimed = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+
+        ordering = ('id',)
+        verbose_name = 'Notification event'
+        verbose_name_plural = 'Notification events'
+
+
+class Notification(models.Model):
+    """Уведомление подписчика о новом посте автора"""
+
+    user = models.ForeignKey(
+        User,
+        related_name='notifications',
+        on_delete=models.CASCADE,
+    )
+    post = models.ForeignKey(
+        'Post',
+        related_name='notifications',
+        on_delete=models.CASCADE,
+    )
+    is_read = models.BooleanField(default=False)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+
+        verbose_name = 'Notification'
+        verbose_name_plural = 'Notifications'
+        indexes = [
+            models.Index(
+                fields=('user', '-id'),
+                name='notification_user_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_notification',
+            ),
+        ]
+
+
+class UnreadCounter(models.Model):
+    """Число непрочитанных уведомлений пользователя"""
+
+    user = models.OneToOneField(
+        User,
+        primary_key=True,
+        related_name='unread_counter',
+        on_delete=models.CASCADE,
+    )
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
 
-        # constraints = [
-        #     models.CheckConstraint(check=models.Q())
-        # ]
+        verbose_name = 'Unread counter'
+        verbose_name_plural = 'Unread counters'
@@ -0,0 +1,170 @@
+"""Уведомления подписчиков о новых постах.
+
+Событие о посте пишется в таблицу NotificationEvent из post_save. Post.save()
+выполняется в транзакции вместе с обработчиками сигнала, поэтому событие
+фиксируется ровно вместе с постом и не теряется при падении процесса.
+После фиксации (on_commit) пул потоков забирает события пачками и
+раскладывает уведомления подписчикам и увеличивает счётчики непрочитанного
+только тем, кому уведомление действительно вставлено: повторный разбор
+события не завышает счётчики. Необработанные события и события, зависшие в
+работе у упавшего воркера, дообрабатывает команда send_notifications.
+"""
+import uuid
+from itertools import islice
+
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import constants, tasks
+from .follows import supports_returning
+from .models import (
+    Follow, Notification, NotificationEvent, UnreadCounter)
+
+INSERT_SQL = (
+    'INSERT INTO {notification} (user_id, post_id, is_read, created) '
+    'VALUES {rows} '
+    'ON CONFLICT (user_id, post_id) DO NOTHING '
+    'RETURNING user_id'
+)
+
+
+def enqueue(post):
+    """Ставит событие о новом посте и запускает разбор после фиксации."""
+    NotificationEvent.objects.create(post=post)
+    tasks.submit_on_commit(drain)
+
+
+def claim(limit=constants.NOTIFICATION_EVENTS_PER_DRAIN):
+    """Забирает пачку событий так, чтобы их не взял другой поток."""
+    worker = uuid.uuid4().hex
+    pending = NotificationEvent.objects.filter(
+        status=NotificationEvent.PENDING).values_list('pk', flat=True)
+    NotificationEvent.objects.filter(
+        pk__in=list(pending[:limit]),
+        status=NotificationEvent.PENDING,
+    ).update(
+        status=NotificationEvent.RUNNING, worker=worker,
+        claimed=timezone.now())
+    return list(NotificationEvent.objects.filter(
+        worker=worker, status=NotificationEvent.RUNNING,
+    ).select_related('post'))
+
+
+def reclaim_stale(timeout=constants.NOTIFICATION_CLAIM_TIMEOUT):
+    """Возвращает в очередь события, зависшие в работе дольше timeout.
+
+    Такое событие осталось от упавшего воркера. Возвращает число событий.
+    """
+    return NotificationEvent.objects.filter(
+        status=NotificationEvent.RUNNING,
+        claimed__lt=timezone.now() - timedelta(seconds=timeout),
+    ).update(status=NotificationEvent.PENDING, worker='', claimed=None)
+
+
+def _insert(post, user_ids):
+    """Вставляет уведомления и возвращает id получивших их подписчиков."""
+    if supports_returning():
+        created = connection.ops.adapt_datetimefield_value(timezone.now())
+        sql = INSERT_SQL.format(
+            notification=connection.ops.quote_name(
+                Notification._meta.db_table),
+            rows=', '.join(['(%s, %s, %s, %s)'] * len(user_ids)),
+        )
+        params = [
+            value for user_id in user_ids
+            for value in (user_id, post.pk, False, created)
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [user_id for user_id, in cursor.fetchall()]
+    # Без RETURNING уже разосланные уведомления отсекаются заранее; всё
+    # выполняется в транзакции deliver.
+    existing = set(Notification.objects.filter(
+        post_id=post.pk, user_id__in=user_ids,
+    ).values_list('user_id', flat=True))
+    user_ids = [user_id for user_id in user_ids if user_id not in existing]
+    Notification.objects.bulk_create(
+        (Notification(user_id=user_id, post_id=post.pk)
+         for user_id in user_ids),
+        ignore_conflicts=True,
+    )
+    return user_ids
+
+
+def deliver(post):
+    """Раскладывает уведомления о посте подписчикам автора.
+
+    Возвращает число новых уведомлений.
+    """
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    followers = followers.iterator()
+    delivered = 0
+    while True:
+        user_ids = list(islice(followers, constants.NOTIFICATION_BATCH_SIZE))
+        if not user_ids:
+            return delivered
+        with transaction.atomic():
+            user_ids = _insert(post, user_ids)
+            if user_ids:
+                UnreadCounter.objects.bulk_create(
+                    (UnreadCounter(user_id=user_id) for user_id in user_ids),
+                    ignore_conflicts=True,
+                )
+                UnreadCounter.objects.filter(user_id__in=user_ids).update(
+                    count=F('count') + 1)
+        delivered += len(user_ids)
+
+
+def drain(limit=constants.NOTIFICATION_EVENTS_PER_DRAIN):
+    """Обрабатывает события пачками, пока очередь не опустеет."""
+    processed = 0
+    while True:
+        events = claim(limit)
+        if not events:
+            return processed
+        for event in events:
+            try:
+                deliver(event.post)
+            except Exception as error:
+                event.status = NotificationEvent.FAILED
+                event.error = str(error)
+            else:
+                event.status = NotificationEvent.DONE
+            event.save(update_fields=('status', 'error'))
+            processed += 1
+
+
+def unread_count(user):
+    return UnreadCounter.objects.filter(user=user).values_list(
+        'count', flat=True).first() or 0
+
+
+def mark_read(user):
+    """Отмечает все уведомления прочитанными и уменьшает счётчик."""
+    with transaction.atomic():
+        read = Notification.objects.filter(user=user, is_read=False).update(
+            is_read=True)
+        # Вычитание, а не обнуление: уведомления, пришедшие после UPDATE,
+        # остаются непрочитанными.
+        UnreadCounter.objects.filter(user=user).update(
+            count=Greatest(F('count') - read, Value(0)))
+
+
+def recount(users=None):
+    """Пересчитывает счётчики по таблице уведомлений."""
+    notifications = Notification.objects.filter(is_read=False)
+    if users is not None:
+        notifications = notifications.filter(user__in=users)
+        UnreadCounter.objects.filter(user__in=users).update(count=0)
+    else:
+        UnreadCounter.objects.update(count=0)
+    counts = notifications.order_by().values('user').annotate(
+        total=Count('pk')).values_list('user', 'total')
+    for user_id, total in counts.iterator():
+        UnreadCounter.objects.update_or_create(
+            user_id=user_id, defaults={'count': total})
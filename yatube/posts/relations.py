@@ -0,0 +1,54 @@
+"""Пакетные проверки подписок для страниц со списками авторов.
+
+Вместо exists() на каждого автора следующие проверки собираются в один
+запрос author_id IN (...). Ответы запоминаются в объекте запроса, поэтому
+шаблонные теги, спрашивающие про тех же авторов повторно, в базу не идут.
+"""
+from .models import Follow
+
+MEMO_ATTR = '_following_memo'
+
+
+def _memo(request):
+    if request is None:
+        return {}
+    memo = getattr(request, MEMO_ATTR, None)
+    if memo is None:
+        memo = {}
+        setattr(request, MEMO_ATTR, memo)
+    return memo
+
+
+def following_ids(user, author_ids, request=None):
+    """Множество тех author_ids, на которых подписан user, одним запросом."""
+    if user is None or not user.is_authenticated:
+        return set()
+    memo = _memo(request)
+    author_ids = set(author_ids)
+    unknown = {
+        author_id for author_id in author_ids
+        if (user.pk, author_id) not in memo
+    }
+    if unknown:
+        found = set(Follow.objects.filter(
+            user=user, author_id__in=unknown,
+        ).values_list('author_id', flat=True))
+        for author_id in unknown:
+            memo[(user.pk, author_id)] = author_id in found
+    return {
+        author_id for author_id in author_ids if memo[(user.pk, author_id)]
+    }
+
+
+def remember(user, answers, request):
+    """Запоминает уже известные ответы {author_id: подписан ли}."""
+    if request is None or user is None or not user.is_authenticated:
+        return
+    memo = _memo(request)
+    for author_id, followed in answers.items():
+        memo[(user.pk, author_id)] = followed
+
+
+def is_following(user, author_id, request=None):
+    """Подписан ли user на автора; учитывает уже запрошенные ответы."""
+    return author_id in following_ids(user, [author_id], request)
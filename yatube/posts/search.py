@@ -0,0 +1,394 @@
+"""Полнотекстовый поиск по постам и комментариям.
+
+Текст поста и каждый комментарий — отдельные документы обратного
+индекса, поэтому новый комментарий индексируется сам по себе, не трогая
+документы поста и других комментариев. На SQLite индекс — виртуальные
+таблицы FTS5, на PostgreSQL — таблицы со столбцом tsvector и
+GIN-индексом. Остальные СУБД ищут через icontains. Пост находится, если
+запросу отвечает его текст или один из комментариев; лучший из их
+score становится score поста. Команда rebuild_search_index строит индекс
+заново.
+
+Результаты упорядочены по (score, -id), где меньший score лучше, и
+листаются по ключу этой пары, без OFFSET.
+"""
+import re
+import sqlite3
+import threading
+from contextlib import closing
+from functools import lru_cache
+
+from django.db import connection, transaction
+from django.db.models import FloatField, Q
+
+from . import constants, tasks
+from .models import Comment, Post
+from .utils import CursorPage, CursorPaginator
+
+
+def search_terms(query):
+    """Слова запроса без синтаксиса поисковых движков."""
+    return re.findall(r'\w+', query.lower())[:constants.MAX_SEARCH_TERMS]
+
+
+class SearchBackend:
+    """Поиск без индекса: для СУБД, которые не поддерживаются."""
+
+    def install(self, cursor):
+        pass
+
+    def uninstall(self, cursor):
+        pass
+
+    def index_posts(self, cursor, post_ids):
+        pass
+
+    def remove_posts(self, cursor, post_ids):
+        pass
+
+    def index_comments(self, cursor, comment_ids):
+        pass
+
+    def remove_comments(self, cursor, comment_ids):
+        pass
+
+    def rebuild(self, cursor):
+        pass
+
+    def ranked_ids(self, terms, keyset=None, backwards=False, limit=None):
+        condition = Q()
+        for term in terms:
+            condition &= (
+                Q(text__icontains=term)
+                | Q(pk__in=Comment.objects.filter(
+                    text__icontains=term).values('post')))
+        posts = Post.objects.filter(condition)
+        if keyset is not None:
+            lookup = 'pk__gt' if backwards else 'pk__lt'
+            posts = posts.filter(**{lookup: keyset[1]})
+        posts = posts.order_by('pk' if backwards else '-pk')
+        return [(pk, 0.0) for pk in posts.values_list('pk', flat=True)[:limit]]
+
+
+class SqliteSearchBackend(SearchBackend):
+    """Виртуальные таблицы FTS5, rowid документа равен id поста или
+    комментария."""
+
+    def install(self, cursor):
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {constants.SEARCH_TABLE} '
+            "USING fts5(text, tokenize='unicode61')")
+        cursor.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS '
+            f'{constants.SEARCH_COMMENTS_TABLE} '
+            "USING fts5(text, post_id UNINDEXED, tokenize='unicode61')")
+
+    def uninstall(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {constants.SEARCH_TABLE}')
+        cursor.execute(
+            f'DROP TABLE IF EXISTS {constants.SEARCH_COMMENTS_TABLE}')
+
+    def _replace(self, cursor, table, select, ids):
+        placeholders = ', '.join(['%s'] * len(ids))
+        self._delete(cursor, table, ids)
+        cursor.execute(
+            f'INSERT INTO {table} {select} WHERE id IN ({placeholders})', ids)
+
+    def _delete(self, cursor, table, ids):
+        placeholders = ', '.join(['%s'] * len(ids))
+        cursor.execute(
+            f'DELETE FROM {table} WHERE rowid IN ({placeholders})', ids)
+
+    def _posts_sql(self):
+        return (
+            f'(rowid, text) SELECT id, text FROM {Post._meta.db_table}')
+
+    def _comments_sql(self):
+        return (
+            '(rowid, text, post_id) SELECT id, text, post_id '
+            f'FROM {Comment._meta.db_table}')
+
+    def index_posts(self, cursor, post_ids):
+        self._replace(
+            cursor, constants.SEARCH_TABLE, self._posts_sql(), post_ids)
+
+    def remove_posts(self, cursor, post_ids):
+        self._delete(cursor, constants.SEARCH_TABLE, post_ids)
+
+    def index_comments(self, cursor, comment_ids):
+        self._replace(
+            cursor, constants.SEARCH_COMMENTS_TABLE, self._comments_sql(),
+            comment_ids)
+
+    def remove_comments(self, cursor, comment_ids):
+        self._delete(cursor, constants.SEARCH_COMMENTS_TABLE, comment_ids)
+
+    def rebuild(self, cursor):
+        for table, select in (
+                (constants.SEARCH_TABLE, self._posts_sql()),
+                (constants.SEARCH_COMMENTS_TABLE, self._comments_sql())):
+            cursor.execute(f'DELETE FROM {table}')
+            cursor.execute(f'INSERT INTO {table} {select}')
+
+    def ranked_ids(self, terms, keyset=None, backwards=False, limit=None):
+        # У каждой таблицы один индексируемый столбец, поэтому вес столбца
+        # из SEARCH_WEIGHTS просто умножается на bm25.
+        text_weight, comments_weight = constants.SEARCH_WEIGHTS
+        match = ' '.join(f'"{term}"*' for term in terms)
+        table = constants.SEARCH_TABLE
+        comments = constants.SEARCH_COMMENTS_TABLE
+        sql, params = _keyset_sql(
+            f'SELECT rowid AS post_id, bm25({table}) * {text_weight} '
+            f'AS score FROM {table} WHERE {table} MATCH %s '
+            f'UNION ALL SELECT post_id, bm25({comments}) * {comments_weight} '
+            f'FROM {comments} WHERE {comments} MATCH %s',
+            [match, match], keyset, backwards, limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+
+class PostgresSearchBackend(SearchBackend):
+    """Таблицы с tsvector и GIN-индексом, строки удаляются вместе с постом
+    или комментарием."""
+
+    def install(self, cursor):
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {constants.SEARCH_TABLE} ('
+            f'post_id integer PRIMARY KEY REFERENCES {Post._meta.db_table} '
+            'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            'document tsvector NOT NULL)')
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {constants.SEARCH_COMMENTS_TABLE} ('
+            'comment_id integer PRIMARY KEY '
+            f'REFERENCES {Comment._meta.db_table} '
+            'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            'post_id integer NOT NULL, document tsvector NOT NULL)')
+        for table in (
+                constants.SEARCH_TABLE, constants.SEARCH_COMMENTS_TABLE):
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {table}_gin '
+                f'ON {table} USING gin (document)')
+
+    def uninstall(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {constants.SEARCH_TABLE}')
+        cursor.execute(
+            f'DROP TABLE IF EXISTS {constants.SEARCH_COMMENTS_TABLE}')
+
+    def _posts_sql(self, where=''):
+        return (
+            f'INSERT INTO {constants.SEARCH_TABLE} (post_id, document) '
+            "SELECT id, setweight(to_tsvector(%s, text), 'A') "
+            f'FROM {Post._meta.db_table} {where} '
+            'ON CONFLICT (post_id) DO UPDATE SET document = EXCLUDED.document'
+        )
+
+    def _comments_sql(self, where=''):
+        return (
+            f'INSERT INTO {constants.SEARCH_COMMENTS_TABLE} '
+            '(comment_id, post_id, document) '
+            "SELECT id, post_id, setweight(to_tsvector(%s, text), 'B') "
+            f'FROM {Comment._meta.db_table} {where} '
+            'ON CONFLICT (comment_id) DO UPDATE '
+            'SET document = EXCLUDED.document'
+        )
+
+    def index_posts(self, cursor, post_ids):
+        cursor.execute(
+            self._posts_sql('WHERE id = ANY(%s)'),
+            [constants.SEARCH_CONFIG, list(post_ids)])
+
+    def remove_posts(self, cursor, post_ids):
+        cursor.execute(
+            f'DELETE FROM {constants.SEARCH_TABLE} WHERE post_id = ANY(%s)',
+            [list(post_ids)])
+
+    def index_comments(self, cursor, comment_ids):
+        cursor.execute(
+            self._comments_sql('WHERE id = ANY(%s)'),
+            [constants.SEARCH_CONFIG, list(comment_ids)])
+
+    def remove_comments(self, cursor, comment_ids):
+        cursor.execute(
+            f'DELETE FROM {constants.SEARCH_COMMENTS_TABLE} '
+            'WHERE comment_id = ANY(%s)', [list(comment_ids)])
+
+    def rebuild(self, cursor):
+        cursor.execute(
+            f'TRUNCATE {constants.SEARCH_TABLE}, '
+            f'{constants.SEARCH_COMMENTS_TABLE}')
+        cursor.execute(self._posts_sql(), [constants.SEARCH_CONFIG])
+        cursor.execute(self._comments_sql(), [constants.SEARCH_CONFIG])
+
+    def ranked_ids(self, terms, keyset=None, backwards=False, limit=None):
+        # ts_rank тем больше, чем лучше совпадение, поэтому берётся со знаком
+        # минус; float8 нужен, чтобы курсор сравнивался без потери точности.
+        tsquery = ' & '.join(f"'{term}':*" for term in terms)
+        matches = ' UNION ALL '.join(
+            'SELECT post_id, (-ts_rank(document, query))::float8 AS score '
+            f'FROM {table}, to_tsquery(%s, %s) query WHERE document @@ query'
+            for table in (
+                constants.SEARCH_TABLE, constants.SEARCH_COMMENTS_TABLE))
+        sql, params = _keyset_sql(
+            matches, [constants.SEARCH_CONFIG, tsquery] * 2,
+            keyset, backwards, limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+
+def _keyset_sql(matches, params, keyset, backwards, limit):
+    """Сводит совпадения (post_id, score) к лучшему score поста и добавляет
+    условие по курсору, сортировку и LIMIT."""
+    sql = (
+        'SELECT post_id, score FROM (SELECT post_id, MIN(score) AS score '
+        f'FROM ({matches}) matches GROUP BY post_id) ranked')
+    params = list(params)
+    if keyset is not None:
+        score_op, pk_op = ('<', '>') if backwards else ('>', '<')
+        sql += (
+            f' WHERE (score {score_op} %s OR '
+            f'(score = %s AND post_id {pk_op} %s))')
+        params += [keyset[0], keyset[0], keyset[1]]
+    order = ('DESC', 'ASC') if backwards else ('ASC', 'DESC')
+    sql += f' ORDER BY score {order[0]}, post_id {order[1]}'
+    if limit is not None:
+        sql += ' LIMIT %s'
+        params.append(limit)
+    return sql, params
+
+
+@lru_cache(maxsize=None)
+def fts5_available():
+    """Собран ли SQLite с FTS5; проверяется один раз на процесс."""
+    with closing(sqlite3.connect(':memory:')) as conn:
+        try:
+            conn.execute('CREATE VIRTUAL TABLE probe USING fts5(text)')
+        except sqlite3.OperationalError:
+            return False
+    return True
+
+
+def get_backend(conn=None):
+    """Бэкенд поиска для СУБД из settings.DATABASES."""
+    conn = conn or connection
+    if conn.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    if conn.vendor == 'sqlite' and fts5_available():
+        return SqliteSearchBackend()
+    return SearchBackend()
+
+
+def index_posts(post_ids):
+    """Пересобирает документы постов после правки текста."""
+    post_ids = list(post_ids)
+    if post_ids:
+        with connection.cursor() as cursor:
+            get_backend().index_posts(cursor, post_ids)
+
+
+def remove_posts(post_ids):
+    post_ids = list(post_ids)
+    if post_ids:
+        with connection.cursor() as cursor:
+            get_backend().remove_posts(cursor, post_ids)
+
+
+def index_comments(comment_ids):
+    """Индексирует новые или изменённые комментарии."""
+    comment_ids = list(comment_ids)
+    if comment_ids:
+        with connection.cursor() as cursor:
+            get_backend().index_comments(cursor, comment_ids)
+
+
+_pending_comments = set()
+_pending_lock = threading.Lock()
+
+
+def defer_index_comments(comment_ids):
+    """Индексирует комментарии в фоне после фиксации транзакции.
+
+    Комментарии, накопившиеся, пока задача ждёт в пуле, индексируются одним
+    запросом. Очередь живёт в памяти процесса: потерянное при остановке
+    воркера восстанавливает rebuild_search_index.
+    """
+    comment_ids = list(comment_ids)
+    if comment_ids:
+        transaction.on_commit(lambda: _enqueue_comments(comment_ids))
+
+
+def _enqueue_comments(comment_ids):
+    with _pending_lock:
+        idle = not _pending_comments
+        _pending_comments.update(comment_ids)
+    if idle:
+        tasks.submit_on_commit(index_pending_comments)
+
+
+def index_pending_comments():
+    with _pending_lock:
+        comment_ids = list(_pending_comments)
+        _pending_comments.clear()
+    index_comments(comment_ids)
+
+
+def remove_comments(comment_ids):
+    comment_ids = list(comment_ids)
+    if comment_ids:
+        with connection.cursor() as cursor:
+            get_backend().remove_comments(cursor, comment_ids)
+
+
+def rebuild():
+    """Создаёт индекс, если его нет, и строит заново по всем постам."""
+    backend = get_backend()
+    with connection.cursor() as cursor:
+        backend.install(cursor)
+        backend.rebuild(cursor)
+    return type(backend).__name__
+
+
+class SearchPaginator(CursorPaginator):
+    """Курсорная пагинация результатов поиска по паре (score, -id)."""
+
+    def __init__(self, terms, per_page, backend=None):
+        super().__init__(
+            Post.objects.none(), per_page, ordering=('search_score', '-id'))
+        self.terms = terms
+        self.backend = backend or get_backend()
+
+    def _load(self, rows):
+        posts = Post.objects.select_related('author', 'group').in_bulk(
+            [pk for pk, score in rows])
+        found = []
+        for pk, score in rows:
+            post = posts.get(pk)
+            if post is not None:
+                post.search_score = score
+                found.append(post)
+        return found
+
+    def ordering_fields(self):
+        return [FloatField(), Post._meta.pk]
+
+    def get_cursor_page(self, after=None, before=None, query=None):
+        keyset = self.decode(before or after)
+        backwards = keyset is not None and bool(before)
+        if not self.terms:
+            return CursorPage([], self, False, False, query)
+        rows = self.backend.ranked_ids(
+            self.terms, keyset, backwards, self.per_page + 1)
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            return CursorPage(self._load(rows[::-1]), self, True, more, query)
+        return CursorPage(
+            self._load(rows), self, more, keyset is not None, query)
+
+
+def search_page(query, after=None, before=None, params=None,
+                per_page=constants.MAX_POSTS_ON_PAGE):
+    """Страница постов, найденных по запросу query."""
+    paginator = SearchPaginator(search_terms(query), per_page)
+    return paginator.get_cursor_page(after, before, params)
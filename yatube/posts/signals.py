@@ -0,0 +1,107 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import graph, notifications, search, stats, thumbnails, timeline
+from .cache import invalidate_tags
+from .models import Comment, Follow, Group, GroupStats, Post, User
+
+
+def post_tags(post):
+    """Теги, которые зависят от поста: сам пост, автор, лента и группы."""
+    tags = {f'post:{post.pk}', f'author:{post.author_id}', 'posts'}
+    group_ids = {post.group_id, getattr(post, 'loaded_group_id', None)}
+    group_ids.discard(None)
+    if group_ids:
+        slugs = Group.objects.filter(
+            pk__in=group_ids).values_list('slug', flat=True)
+        tags.update(f'group:{slug}' for slug in slugs)
+    return tags
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    """Обновляет счётчики, ленты, уведомления, миниатюры, поиск и теги кэша."""
+    if not raw:
+        update_group_stats(instance, created)
+    if created and not raw:
+        stats.bump(instance.author_id, 'posts_count', 1)
+        timeline.fan_out_post(instance)
+        notifications.enqueue(instance)
+    if not raw and instance.image and (
+            instance.image.name != getattr(instance, 'loaded_image', None)):
+        thumbnails.enqueue(instance)
+    search.index_posts([instance.pk])
+    invalidate_tags(*post_tags(instance))
+    instance.loaded_group_id = instance.group_id
+    instance.loaded_image = instance.image.name
+
+
+def update_group_stats(post, created):
+    """Сводка групп при создании поста и переносе в другую группу."""
+    previous = None if created else getattr(post, 'loaded_group_id', None)
+    if previous == post.group_id:
+        return
+    if previous:
+        stats.group_post_removed(previous, post.pub_date)
+    if post.group_id:
+        stats.group_post_added(post.group_id, post.pub_date)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    stats.bump(instance.author_id, 'posts_count', -1)
+    if instance.group_id:
+        stats.group_post_removed(instance.group_id, instance.pub_date)
+    search.remove_posts([instance.pk])
+    invalidate_tags(*post_tags(instance))
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.bump(instance.author_id, 'followers_count', 1)
+        stats.bump(instance.user_id, 'following_count', 1)
+        timeline.add_author(instance.user_id, instance.author_id)
+        graph.edge_added(instance.user_id, instance.author_id)
+    invalidate_tags(
+        f'author:{instance.author_id}', f'author:{instance.user_id}')
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    stats.bump(instance.author_id, 'followers_count', -1)
+    stats.bump(instance.user_id, 'following_count', -1)
+    timeline.remove_author(instance.user_id, instance.author_id)
+    graph.edge_removed(instance.user_id, instance.author_id)
+    invalidate_tags(
+        f'author:{instance.author_id}', f'author:{instance.user_id}')
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    # Комментарии из posts.comments создаются bulk_create без сигналов и
+    # учитываются там же.
+    if created and not raw:
+        stats.bump_comments({instance.post_id: 1})
+    search.index_comments([instance.pk])
+    invalidate_tags(f'post:{instance.post_id}')
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    stats.bump_comments({instance.post_id: -1})
+    search.remove_comments([instance.pk])
+    invalidate_tags(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        GroupStats.objects.get_or_create(group=instance)
+    invalidate_tags(f'group:{instance.slug}')
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, **kwargs):
+    invalidate_tags(f'user:{instance.pk}')
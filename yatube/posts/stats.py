@@ -0,0 +1,199 @@
+"""Денормализованные счётчики авторов и групп.
+
+Счётчики меняются F-выражениями из сигналов Post и Follow, поэтому
+страница профиля и каталог групп не выполняют COUNT и GROUP BY. Команды
+recount_author_stats и recount_group_stats пересчитывают их заново, если
+значения разошлись с таблицами. Здесь же считается общее число постов
+для пагинации главной страницы.
+"""
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import (
+    Case, Count, DateTimeField, F, OuterRef, Q, Subquery, Value, When)
+from django.db.models.functions import Coalesce, Greatest
+
+from . import constants
+from .cache import tagged_key
+from .models import (
+    AuthorStats, Comment, Follow, Group, GroupStats, Post, User)
+
+
+def _count_subquery(queryset, field):
+    counts = (
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by().values(field).annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def recount(users=None):
+    """Пересчитывает счётчики для переданных пользователей (или всех)."""
+    users = User.objects.all() if users is None else users
+    counted = users.annotate(
+        posts_total=_count_subquery(Post.objects.all(), 'author'),
+        followers_total=_count_subquery(Follow.objects.all(), 'author'),
+        following_total=_count_subquery(Follow.objects.all(), 'user'),
+    ).values_list('pk', 'posts_total', 'followers_total', 'following_total')
+    updated = 0
+    for pk, posts, followers, following in counted.iterator():
+        AuthorStats.objects.update_or_create(
+            author_id=pk,
+            defaults={
+                'posts_count': posts,
+                'followers_count': followers,
+                'following_count': following,
+            },
+        )
+        updated += 1
+    return updated
+
+
+def recount_comments(posts=None):
+    """Пересчитывает счётчики комментариев переданных постов (или всех)."""
+    posts = Post.objects.all() if posts is None else posts
+    return posts.update(
+        comments_count=_count_subquery(Comment.objects.all(), 'post'))
+
+
+def bump_comments(counts):
+    """Атомарно прибавляет к счётчикам комментариев {post_id: delta}.
+
+    Возвращает число обновлённых постов; посты с одинаковой прибавкой
+    обновляются одним запросом.
+    """
+    by_delta = {}
+    for post_id, delta in counts.items():
+        by_delta.setdefault(delta, []).append(post_id)
+    updated = 0
+    for delta, post_ids in by_delta.items():
+        if delta < 0:
+            # Счётчик беззнаковый: не уходим ниже нуля при расхождении.
+            change = Greatest(F('comments_count') + delta, 0)
+        else:
+            change = F('comments_count') + delta
+        updated += Post.objects.filter(pk__in=sorted(post_ids)).update(
+            comments_count=change)
+    return updated
+
+
+def get_stats(author):
+    """Счётчики автора; отсутствующая строка создаётся пересчётом.
+
+    Автора лучше загружать с select_related('stats'), тогда счётчики не
+    требуют отдельного запроса.
+    """
+    try:
+        return author.stats
+    except AuthorStats.DoesNotExist:
+        recount(User.objects.filter(pk=author.pk))
+        return AuthorStats.objects.get(author=author)
+
+
+def get_group_stats(group):
+    """Сводка группы; отсутствующая строка создаётся пересчётом.
+
+    Группу лучше загружать с select_related('stats'), тогда сводка не
+    требует отдельного запроса.
+    """
+    try:
+        return group.stats
+    except GroupStats.DoesNotExist:
+        recount_groups(Group.objects.filter(pk=group.pk))
+        return GroupStats.objects.get(group=group)
+
+
+def estimated_count(model):
+    """Оценка числа строк таблицы из статистики PostgreSQL.
+
+    Возвращает None на других СУБД и на небольших таблицах, где точный
+    COUNT обходится дёшево.
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] < constants.ESTIMATED_COUNT_THRESHOLD:
+        return None
+    return row[0]
+
+
+def total_posts():
+    """Число постов для пагинации главной страницы.
+
+    Значение кэшируется до изменения любого поста (тег «posts»). На
+    больших таблицах вместо COUNT берётся оценка планировщика: номер
+    последней страницы может немного отличаться от точного, зато запрос
+    не читает всю таблицу.
+    """
+    key = tagged_key('posts_total', ['posts'])
+    count = cache.get(key)
+    if count is None:
+        count = estimated_count(Post)
+        if count is None:
+            count = Post.objects.count()
+        cache.set(key, count, constants.COUNT_CACHE_TIMEOUT)
+    return count
+
+
+def bump(user_id, field, delta):
+    """Атомарно меняет счётчик пользователя на delta."""
+    # Счётчики беззнаковые: после расхождения (bulk_create, update) уход
+    # ниже нуля сорвал бы удаление поста или подписки.
+    updated = AuthorStats.objects.filter(author_id=user_id).update(
+        **{field: Greatest(F(field) + delta, 0)})
+    if not updated and delta > 0:
+        # Строки ещё нет: считаем её целиком, новое значение уже в таблице.
+        recount(User.objects.filter(pk=user_id))
+
+
+def _last_post_subquery(group_ref):
+    return Subquery(
+        Post.objects.filter(group=group_ref)
+        .order_by('-pub_date').values('pub_date')[:1])
+
+
+def recount_groups(groups=None):
+    """Пересчитывает сводку для переданных групп (или всех)."""
+    groups = Group.objects.all() if groups is None else groups
+    counted = groups.annotate(
+        posts_total=_count_subquery(Post.objects.all(), 'group'),
+        last_post=_last_post_subquery(OuterRef('pk')),
+    ).values_list('pk', 'posts_total', 'last_post')
+    updated = 0
+    for pk, posts, last_post in counted.iterator():
+        GroupStats.objects.update_or_create(
+            group_id=pk,
+            defaults={'posts_count': posts, 'last_post_date': last_post},
+        )
+        updated += 1
+    return updated
+
+
+def group_post_added(group_id, pub_date):
+    """Учитывает новый пост группы."""
+    newer = Q(last_post_date__isnull=True) | Q(last_post_date__lt=pub_date)
+    updated = GroupStats.objects.filter(group_id=group_id).update(
+        posts_count=F('posts_count') + 1,
+        last_post_date=Case(
+            When(newer, then=Value(pub_date, output_field=DateTimeField())),
+            default=F('last_post_date'),
+        ),
+    )
+    if not updated:
+        recount_groups(Group.objects.filter(pk=group_id))
+
+
+def group_post_removed(group_id, pub_date):
+    """Учитывает удалённый или перенесённый в другую группу пост."""
+    GroupStats.objects.filter(group_id=group_id).update(
+        posts_count=Greatest(F('posts_count') - 1, 0))
+    # Дата пересчитывается, только если ушёл последний пост; запрос идёт
+    # по индексу (group, -pub_date).
+    GroupStats.objects.filter(
+        group_id=group_id, last_post_date__lte=pub_date,
+    ).update(last_post_date=_last_post_subquery(group_id))
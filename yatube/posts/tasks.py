@@ -0,0 +1,62 @@
+"""Фоновое выполнение задач в пуле потоков воркера.
+
+Очередью служат таблицы задач в базе, поэтому отдельный брокер не нужен:
+пул лишь ускоряет обработку, а всё, что не успело выполниться, можно
+дообработать командой.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, connections, transaction
+
+from . import constants
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=constants.BACKGROUND_WORKERS,
+            thread_name_prefix='posts-tasks',
+        )
+    return _executor
+
+
+def run_task(func, *args):
+    """Выполняет задачу и закрывает соединения потока с базой."""
+    try:
+        return func(*args)
+    except Exception:
+        logger.exception('Фоновая задача %s завершилась ошибкой', func)
+    finally:
+        connections.close_all()
+
+
+def run_inline():
+    """Базу SQLite в памяти (тестовую) нельзя делить между потоками."""
+    return connection.vendor == 'sqlite' and connection.is_in_memory_db()
+
+
+def submit(func, *args):
+    """Ставит задачу в пул сразу, не дожидаясь транзакции."""
+    if run_inline():
+        func(*args)
+        return
+    get_executor().submit(run_task, func, *args)
+
+
+def submit_on_commit(func, *args):
+    """Ставит задачу в пул после фиксации текущей транзакции."""
+    transaction.on_commit(lambda: submit(func, *args))
+
+
+def run_parallel(func, items, workers):
+    """Обрабатывает items в отдельном пуле и ждёт завершения."""
+    if run_inline():
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda item: run_task(func, item), items))
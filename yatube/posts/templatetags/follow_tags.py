@@ -0,0 +1,47 @@
+from django import template
+
+from posts.relations import following_ids, is_following as _is_following
+
+register = template.Library()
+
+
+def _author_id(author):
+    return getattr(author, 'pk', author)
+
+
+@register.simple_tag(takes_context=True)
+def prefetch_following(context, authors):
+    """Запоминает подписки посетителя на авторов списка одним запросом.
+
+    Ставится перед циклом, после него is_following и follow_button
+    обходятся без запросов к базе.
+    """
+    request = context.get('request')
+    if request is not None:
+        following_ids(
+            request.user, [_author_id(author) for author in authors], request)
+    return ''
+
+
+@register.simple_tag(takes_context=True)
+def is_following(context, author):
+    request = context.get('request')
+    if request is None:
+        return False
+    return _is_following(request.user, _author_id(author), request)
+
+
+@register.inclusion_tag('posts/includes/follow_button.html',
+                        takes_context=True)
+def follow_button(context, author, size='btn-sm'):
+    """Кнопка подписки или отписки для автора из списка."""
+    request = context.get('request')
+    user = getattr(request, 'user', None)
+    show = (
+        user is not None and user.is_authenticated and user.pk != author.pk)
+    return {
+        'author': author,
+        'show': show,
+        'following': show and _is_following(user, author.pk, request),
+        'size': size,
+    }
@@ -0,0 +1,11 @@
+from django import template
+
+from posts.utils import elided_page_range
+
+register = template.Library()
+
+
+@register.simple_tag
+def page_range(page_obj):
+    """Сокращённый список номеров страниц; None — пропуск."""
+    return elided_page_range(page_obj.number, page_obj.paginator.num_pages)
@@ -0,0 +1,60 @@
+from django import template
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts import constants
+from posts.cache import tag_versions, tagged_key
+
+register = template.Library()
+
+POST_TEMPLATE = 'posts/includes/post.html'
+
+
+def fragment_tags(post):
+    return (f'post:{post.pk}', f'user:{post.author_id}')
+
+
+def fragment_key(post, group=None, versions=None):
+    """Ключ закэшированного фрагмента поста.
+
+    Версия меняется при каждом сохранении поста, а теги поста и автора
+    сбрасываются сигналами, поэтому устаревший фрагмент просто перестаёт
+    запрашиваться. Дата публикации защищает от совпадения ключей, если
+    база повторно выдаст id удалённого поста.
+    """
+    group_slug = post.group.slug if post.group_id and not group else ''
+    key = (
+        f'post_fragment:{post.pk}:{post.version}:'
+        f'{post.pub_date.timestamp()}:{group_slug}'
+    )
+    return tagged_key(key, fragment_tags(post), versions)
+
+
+@register.simple_tag(takes_context=True)
+def post_fragments(context, posts):
+    """Отрисованные фрагменты posts/includes/post.html для списка постов.
+
+    Версии тегов и фрагменты всей страницы читаются из кэша двумя
+    запросами, отрисовываются только отсутствующие фрагменты.
+    """
+    group = context.get('group')
+    posts = list(posts)
+    versions = tag_versions(
+        tag for post in posts for tag in fragment_tags(post))
+    fragments = {
+        fragment_key(post, group, versions): post for post in posts
+    }
+    cached = cache.get_many(list(fragments))
+    missing = {}
+    parts = []
+    for key, post in fragments.items():
+        html = cached.get(key)
+        if html is None:
+            html = render_to_string(
+                POST_TEMPLATE, {'post': post, 'group': group})
+            missing[key] = html
+        parts.append(mark_safe(html))
+    if missing:
+        cache.set_many(missing, constants.POST_FRAGMENT_TIMEOUT)
+    return parts
@@ -0,0 +1,69 @@
+import logging
+
+from django import template
+from django.utils.html import format_html, format_html_join
+from sorl.thumbnail import get_thumbnail
+
+from posts import constants
+from posts.images import variant_height, variant_urls
+
+logger = logging.getLogger(__name__)
+
+register = template.Library()
+
+MIME_TYPES = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg'}
+
+
+def _srcset(urls):
+    return format_html_join(', ', '{} {}w', urls)
+
+
+def _fallback(image, css_class):
+    """Одна миниатюра sorl, пока варианты ещё не подготовлены.
+
+    Задача ThumbnailJob готовит её заранее, поэтому обычно это лишь
+    чтение из хранилища ключей sorl; строится она здесь, только если
+    страницу открыли раньше, чем задача выполнилась.
+    """
+    try:
+        thumbnail = get_thumbnail(
+            image,
+            constants.POST_THUMBNAIL_GEOMETRY,
+            **constants.POST_THUMBNAIL_OPTIONS,
+        )
+    except Exception:
+        logger.exception('Не удалось подготовить миниатюру %s', image)
+        return ''
+    return format_html(
+        '<img class="{}" src="{}">', css_class, thumbnail.url)
+
+
+@register.simple_tag
+def responsive_image(image, sizes=constants.POST_IMAGE_SIZES,
+                     css_class='card-img my-2'):
+    """Картинка поста с srcset из вариантов разной ширины и формата."""
+    if not image:
+        return ''
+    urls = variant_urls(image.name)
+    if urls is None:
+        return _fallback(image, css_class)
+    width = max(constants.POST_IMAGE_WIDTHS)
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        (
+            (MIME_TYPES[image_format], _srcset(format_urls), sizes)
+            for image_format, format_urls in urls.items()
+            if image_format != 'JPEG'
+        ),
+    )
+    return format_html(
+        '<picture>{}<img class="{}" src="{}" srcset="{}" sizes="{}" '
+        'width="{}" height="{}" loading="lazy" alt=""></picture>',
+        sources,
+        css_class,
+        urls['JPEG'][-1][0],
+        _srcset(urls['JPEG']),
+        sizes,
+        width,
+        variant_height(width),
+    )
@@ -0,0 +1,89 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from posts import constants
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class FeedApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='ApiAuthor')
+        cls.group = Group.objects.create(
+            title='Группа', slug='api_group', description='Описание')
+        for index in range(constants.MAX_POSTS_ON_PAGE + 2):
+            Post.objects.create(
+                author=cls.user, group=cls.group, text=f'Пост {index}')
+
+    def test_feeds(self):
+        """Ленты отдают компактный JSON с курсором"""
+        urls = (
+            reverse('posts:api_index'),
+            reverse('posts:api_group', kwargs={'slug': self.group.slug}),
+            reverse('posts:api_profile',
+                    kwargs={'username': self.user.username}),
+        )
+        newest = Post.objects.first()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                data = response.json()
+                self.assertEqual(
+                    len(data['results']), constants.MAX_POSTS_ON_PAGE)
+                self.assertEqual(data['results'][0], {
+                    'id': newest.pk,
+                    'author': self.user.username,
+                    'group': self.group.slug,
+                    'text': newest.text,
+                    'pub_date': data['results'][0]['pub_date'],
+                    'image': None,
+                })
+                self.assertIsNone(data['previous'])
+                rest = self.client.get(url, {'after': data['next']}).json()
+                self.assertEqual(len(rest['results']), 2)
+                self.assertTrue(response.has_header('Last-Modified'))
+                self.assertTrue(response['ETag'].startswith('"'))
+
+    def test_missing_objects(self):
+        for url in (
+            reverse('posts:api_group', kwargs={'slug': 'missing'}),
+            reverse('posts:api_profile', kwargs={'username': 'missing'}),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_not_modified(self):
+        """Неизменившаяся страница отдаётся 304 без выборки постов"""
+        url = reverse('posts:api_index')
+        response = self.client.get(url)
+        with self.assertNumQueries(1):
+            cached = self.client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b'')
+        cached = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_etag_changes(self):
+        """ETag меняется при правке поста, новом посте и на другой странице"""
+        url = reverse('posts:api_index')
+        etag = self.client.get(url)['ETag']
+        post = Post.objects.first()
+        post.text = 'Исправленный текст'
+        post.save()
+        edited = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(edited.status_code, 200)
+        self.assertEqual(edited.json()['results'][0]['text'], post.text)
+        Post.objects.create(author=self.user, text='Новый пост')
+        self.assertNotEqual(self.client.get(url)['ETag'], edited['ETag'])
+        next_page = self.client.get(
+            url, {'after': edited.json()['next']})
+        self.assertNotEqual(next_page['ETag'], edited['ETag'])
+
+    def test_read_only(self):
+        response = self.client.post(reverse('posts:api_index'))
+        self.assertEqual(response.status_code, 405)
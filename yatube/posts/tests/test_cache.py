@@ -0,0 +1,93 @@
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from core.cache import SharedFileBasedCache
+from posts.cache import invalidate_tags, tagged_key
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class TagInvalidationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.group = Group.objects.create(
+            title='Test',
+            slug='test_group',
+            description='Test group',
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый текст',
+            author=cls.user,
+            group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_invalidate_changes_key(self):
+        """Сброс тега меняет ключ, а чужие теги не трогает"""
+        key = tagged_key('value', ('group:test_group',))
+        other = tagged_key('value', ('group:other',))
+        self.assertEqual(key, tagged_key('value', ('group:test_group',)))
+        invalidate_tags('group:test_group')
+        self.assertNotEqual(
+            key, tagged_key('value', ('group:test_group',)))
+        self.assertEqual(other, tagged_key('value', ('group:other',)))
+
+    def test_signals_invalidate_tags(self):
+        """Сигналы моделей сбрасывают соответствующие теги"""
+        cases = {
+            f'post:{self.post.pk}': lambda: Comment.objects.create(
+                post=self.post, author=self.user, text='Комментарий'),
+            'group:test_group': lambda: Post.objects.create(
+                text='Ещё пост', author=self.user, group=self.group),
+            f'user:{self.user.pk}': self.user.save,
+        }
+        for tag, change in cases.items():
+            with self.subTest(tag=tag):
+                key = tagged_key('value', (tag,))
+                change()
+                self.assertNotEqual(key, tagged_key('value', (tag,)))
+
+    def test_author_rename_refreshes_fragment(self):
+        """Смена имени автора обновляет закэшированный фрагмент поста"""
+        self.client.get(reverse('posts:index'))
+        self.user.first_name = 'Новое'
+        self.user.last_name = 'Имя'
+        self.user.save()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новое Имя')
+
+
+class SharedCacheTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = SharedFileBasedCache(
+            directory.name,
+            {'OPTIONS': {'MAX_ENTRIES': 5, 'SWEEP_INTERVAL': 0}},
+        )
+
+    def test_live_entries_are_not_culled(self):
+        """Переполнение не вытесняет записи без срока, например версии тегов"""
+        for number in range(20):
+            self.cache.set(f'tag:{number}', number, None)
+        self.assertEqual(
+            len(self.cache.get_many([f'tag:{n}' for n in range(20)])), 20)
+
+    def test_sweep_removes_expired(self):
+        """При очистке удаляются только просроченные записи"""
+        self.cache.set('live', 1, None)
+        with mock.patch('time.time', return_value=0):
+            self.cache.set('expired', 1, 10)
+        self.cache.set('other', 1, None)
+        self.assertEqual(len(self.cache._list_cache_files()), 2)
+        self.assertEqual(self.cache.get('live'), 1)
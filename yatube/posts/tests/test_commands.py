@@ -0,0 +1,235 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.db.models import QuerySet
+from django.template import engines
+from django.test import TestCase
+
+from core.warmup import warm_templates
+
+from posts import benchmark
+from posts.management.commands.explain_posts_queries import (
+    find_plan_issues, find_seq_scans)
+from posts.models import (
+    AuthorStats, Comment, Follow, Group, Post, TimelineEntry)
+from posts.search import search_page
+
+User = get_user_model()
+
+
+class RebuildTimelinesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.author = User.objects.create_user(username='TestAuthor')
+        Follow.objects.create(user=cls.user, author=cls.author)
+        cls.post = Post.objects.create(text='Тестовый пост',
+                                       author=cls.author)
+
+    def test_rebuild_timelines(self):
+        """Команда восстанавливает ленты подписок"""
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=self.post).exists())
+        self.assertEqual(TimelineEntry.objects.count(), 1)
+
+
+class RecountAuthorStatsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.author = User.objects.create_user(username='TestAuthor')
+        Follow.objects.create(user=cls.user, author=cls.author)
+        Post.objects.create(text='Тестовый пост', author=cls.author)
+
+    def test_recount_repairs_drift(self):
+        """Команда исправляет разошедшиеся счётчики"""
+        AuthorStats.objects.update(posts_count=100, followers_count=100)
+        call_command('recount_author_stats', stdout=StringIO())
+        stats = AuthorStats.objects.get(author=self.author)
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(stats.followers_count, 1)
+        self.assertEqual(
+            AuthorStats.objects.get(author=self.user).following_count, 1)
+
+
+class ExplainPostsQueriesTests(TestCase):
+    def test_find_seq_scans(self):
+        """Полный перебор распознаётся в планах Postgres и SQLite"""
+        plans = {
+            'Seq Scan on posts_post  (cost=0.00..1.01)': ['posts_post'],
+            'SCAN posts_post': ['posts_post'],
+            'SCAN posts_post USING INDEX post_pub_date_idx': [],
+            'SEARCH posts_post USING INDEX post_group_pub_date_idx': [],
+            'Index Scan using post_pub_date_idx on posts_post': [],
+        }
+        for plan, tables in plans.items():
+            with self.subTest(plan=plan):
+                self.assertEqual(find_seq_scans(plan), tables)
+
+    def test_find_plan_issues(self):
+        """Перебор индекса и временная сортировка тоже отмечаются"""
+        plans = {
+            'SCAN posts_post': ['полный перебор posts_post'],
+            'SCAN posts_post USING INDEX post_pub_date_idx': [
+                'перебор индекса posts_post'],
+            'SCAN posts_comment USING COVERING INDEX comment_idx': [
+                'перебор индекса posts_comment'],
+            'SEARCH posts_post USING INDEX post_group_pub_date_idx '
+            '(group_id=?)\nUSE TEMP B-TREE FOR RIGHT PART OF ORDER BY': [
+                'временная сортировка (RIGHT PART OF ORDER BY)'],
+            'Limit  (cost=8.17..8.18)\n  ->  Sort  (cost=8.17..8.18)\n'
+            '        Sort Key: pub_date DESC': ['временная сортировка (Sort)'],
+            'SEARCH posts_post USING INDEX post_group_pub_date_idx': [],
+            'Index Scan using post_pub_date_idx on posts_post': [],
+        }
+        for plan, issues in plans.items():
+            with self.subTest(plan=plan):
+                self.assertEqual(find_plan_issues(plan), issues)
+
+    def test_command_explains_views(self):
+        """Команда выводит планы запросов страниц"""
+        user = User.objects.create_user(username='TestUser')
+        post = Post.objects.create(text='Тестовый пост', author=user)
+        Comment.objects.create(post=post, author=user, text='Комментарий')
+        out = StringIO()
+        call_command('explain_posts_queries', stdout=out)
+        self.assertIn('index', out.getvalue())
+        self.assertIn('profile', out.getvalue())
+        # Индексы с -id отдают посты и комментарии уже отсортированными.
+        self.assertNotIn('временная сортировка', out.getvalue())
+
+
+class BenchmarkTests(TestCase):
+    def test_dataset_and_measure(self):
+        """Набор данных строится целиком, замеры идут по всем страницам"""
+        dataset = benchmark.build_dataset(200, follows_per_user=3)
+        self.assertEqual(dataset['posts'], 200)
+        self.assertEqual(dataset['follows'], dataset['users'] * 3)
+        self.assertEqual(
+            AuthorStats.objects.count(), dataset['users'])
+        self.assertTrue(TimelineEntry.objects.exists())
+        results = benchmark.measure(3)
+        self.assertEqual(set(results), set(benchmark.VIEWS))
+        for view, result in results.items():
+            with self.subTest(view=view):
+                self.assertEqual(result['requests'], 3)
+                self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+                self.assertGreater(result['queries_max'], 0)
+
+    def test_compare(self):
+        """Сравнение отмечает рост p95 и числа запросов"""
+        def run(p95, queries):
+            return {'scales': {'10k': {'views': {'index': {
+                'p95_ms': p95, 'queries_max': queries}}}}}
+
+        lines, regressed = benchmark.compare(run(10, 2), run(11, 2), 1.2)
+        self.assertFalse(regressed)
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(benchmark.compare(run(10, 2), run(20, 2), 1.2)[1])
+        self.assertTrue(benchmark.compare(run(10, 2), run(10, 3), 1.2)[1])
+        self.assertEqual(benchmark.percentile([3, 1, 2, 4], 0.5), 2)
+
+
+class ContentTransferTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def create_content(self):
+        author = User.objects.create_user(username='Author')
+        reader = User.objects.create_user(username='Reader')
+        group = Group.objects.create(title='Группа', slug='group')
+        posts = [
+            Post.objects.create(author=author, group=group,
+                                text=f'Пост номер {index}')
+            for index in range(3)
+        ]
+        Follow.objects.create(user=reader, author=author)
+        Comment.objects.create(post=posts[0], author=reader, text='Ответ')
+        return posts
+
+    def test_export_and_import(self):
+        """Выгруженный контент загружается обратно вместе с датами"""
+        posts = self.create_content()
+        call_command('export_content', self.directory, stdout=StringIO())
+        with open(os.path.join(self.directory, 'posts.jsonl')) as file:
+            self.assertEqual(len(file.readlines()), len(posts))
+        User.objects.all().delete()
+        Group.objects.all().delete()
+
+        call_command('import_content', self.directory, stdout=StringIO())
+        self.assertEqual(
+            list(Post.objects.order_by('pk').values_list(
+                'pk', 'pub_date', 'text')),
+            [(post.pk, post.pub_date, post.text) for post in posts])
+        self.assertEqual(Comment.objects.get().text, 'Ответ')
+        stats = AuthorStats.objects.get(author__username='Author')
+        self.assertEqual(
+            (stats.posts_count, stats.followers_count), (len(posts), 1))
+        self.assertEqual(TimelineEntry.objects.count(), len(posts))
+        self.assertEqual(len(search_page('номер')), len(posts))
+        author = User.objects.get(username='Author')
+        new_post = Post.objects.create(author=author, text='Новый')
+        self.assertGreater(new_post.pk, posts[-1].pk)
+
+    def test_import_keeps_auto_now_add(self):
+        """Загрузка не отключает auto_now_add у полей модели"""
+        self.create_content()
+        call_command('export_content', self.directory, stdout=StringIO())
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        flags = []
+        bulk_create = QuerySet.bulk_create
+
+        def record(queryset, *args, **kwargs):
+            flags.append(Post._meta.get_field('pub_date').auto_now_add)
+            return bulk_create(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'bulk_create', record):
+            call_command('import_content', self.directory, stdout=StringIO())
+        self.assertTrue(flags)
+        self.assertTrue(all(flags))
+
+    def test_broken_reference(self):
+        """Ссылка на несуществующую строку останавливает загрузку"""
+        with open(os.path.join(self.directory, 'posts.jsonl'), 'w') as file:
+            file.write(json.dumps({
+                'id': 1, 'text': 'Пост', 'author_id': 404,
+                'pub_date': '2022-01-01T00:00:00+00:00',
+            }) + '\n')
+        with self.assertRaises(IntegrityError):
+            call_command(
+                'import_content', self.directory, stdout=StringIO())
+        self.assertFalse(Post.objects.exists())
+
+
+class WarmTemplatesTests(TestCase):
+    def test_templates_compiled_into_cache(self):
+        """Прогрев кладёт шаблоны проекта в кэш загрузчика"""
+        engine = engines.all()[0].engine
+        cached_loader = engine.template_loaders[0]
+        cached_loader.reset()
+        results = warm_templates()
+        names = {name for name, _, _ in results}
+        self.assertIn('posts/index.html', names)
+        self.assertIn('includes/header.html', names)
+        self.assertFalse([name for name, _, error in results if error])
+        self.assertIn('posts/index.html', cached_loader.get_template_cache)
+
+    def test_command_reports_timings(self):
+        """Команда выводит время компиляции каждого шаблона"""
+        out = StringIO()
+        call_command('warm_templates', stdout=out)
+        self.assertIn('posts/post_detail.html', out.getvalue())
+        self.assertIn('мс', out.getvalue())
@@ -0,0 +1,139 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import Client, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.cache import shared_cache
+from posts import constants
+from posts.comments import create_comment, create_comments
+from posts.models import Comment, Post
+from posts.search import search_page
+from posts.throttling import consume
+
+User = get_user_model()
+
+
+class CommentCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.post = Post.objects.create(text='Тестовый пост', author=cls.user)
+        cls.other = Post.objects.create(text='Другой пост', author=cls.user)
+
+    def test_create_comments_batch(self):
+        """Пакет комментариев учитывается в счётчиках, чужие посты пропущены"""
+        created = create_comments([
+            (self.post.pk, self.user.pk, 'Первый'),
+            (self.post.pk, self.user.pk, 'Второй'),
+            (self.other.pk, self.user.pk, 'Третий'),
+            (0, self.user.pk, 'К несуществующему посту'),
+        ])
+        self.assertEqual(len(created), 3)
+        self.assertEqual(Comment.objects.count(), 3)
+        self.assertEqual(
+            Post.objects.get(pk=self.post.pk).comments_count, 2)
+        self.assertEqual(
+            Post.objects.get(pk=self.other.pk).comments_count, 1)
+
+    def test_signals_keep_counter(self):
+        """Комментарии, созданные и удалённые через ORM, тоже учитываются"""
+        comment = Comment.objects.create(
+            post=self.post, author=self.user, text='Комментарий')
+        self.assertEqual(Post.objects.get(pk=self.post.pk).comments_count, 1)
+        comment.delete()
+        self.assertEqual(Post.objects.get(pk=self.post.pk).comments_count, 0)
+
+    def test_post_save_keeps_counter(self):
+        """Правка поста не затирает счётчик устаревшим значением"""
+        post = Post.objects.get(pk=self.post.pk)
+        create_comments([(post.pk, self.user.pk, 'Комментарий')])
+        post.text = 'Новый текст'
+        post.save()
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.text, 'Новый текст')
+        self.assertEqual(post.comments_count, 1)
+
+
+class CommentSearchIndexTests(TransactionTestCase):
+    def test_indexed_after_commit(self):
+        """Комментарии индексируются после фиксации, а не в транзакции"""
+        user = User.objects.create_user(username='TestUser')
+        post = Post.objects.create(text='Тестовый пост', author=user)
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                create_comment(post.pk, user, 'Ёжик в тумане')
+                create_comments([(post.pk, user.pk, 'Ёжик у реки')])
+                self.assertEqual(list(search_page('ёжик')), [])
+                written = len(queries)
+        indexed = [
+            index >= written for index, query in enumerate(queries)
+            if query['sql'].startswith(('INSERT', 'DELETE'))
+            and constants.SEARCH_COMMENTS_TABLE in query['sql']]
+        self.assertTrue(indexed)
+        self.assertTrue(all(indexed))
+        self.assertEqual(list(search_page('ёжик')), [post])
+        self.assertEqual(len(search_page('реки')), 1)
+
+    def test_tag_invalidated_after_commit(self):
+        """Тег поста сбрасывается после фиксации транзакции"""
+        user = User.objects.create_user(username='TestUser')
+        post = Post.objects.create(text='Тестовый пост', author=user)
+        with mock.patch('posts.comments.invalidate_tags') as invalidate:
+            with transaction.atomic():
+                create_comment(post.pk, user, 'Комментарий')
+                invalidate.assert_not_called()
+        invalidate.assert_called_once_with(f'post:{post.pk}')
+
+
+class CommentThrottlingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.post = Post.objects.create(text='Тестовый пост', author=cls.user)
+
+    def setUp(self):
+        shared_cache().clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_token_bucket(self):
+        """Ведро пропускает capacity действий и затем просит подождать"""
+        with mock.patch('posts.throttling.time.time', return_value=100):
+            self.assertEqual(consume('test', 1, 2, 10), 0)
+            self.assertEqual(consume('test', 1, 2, 10), 0)
+            self.assertEqual(consume('test', 1, 2, 10), 10)
+        with mock.patch('posts.throttling.time.time', return_value=110):
+            self.assertEqual(consume('test', 1, 2, 10), 0)
+
+    @mock.patch('posts.constants.COMMENT_BURST', 1)
+    def test_comment_storm_throttled(self):
+        """Слишком частые комментарии отклоняются с кодом 429"""
+        url = reverse('posts:add_comment', kwargs={'post_id': self.post.pk})
+        self.client.post(url, {'text': 'Первый'})
+        response = self.client.post(url, {'text': 'Второй'})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(Comment.objects.count(), 1)
+
+    def test_comment_to_missing_post(self):
+        """Комментарий к несуществующему посту даёт 404"""
+        response = self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': 0}),
+            {'text': 'Комментарий'})
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Comment.objects.exists())
+
+    @mock.patch('posts.constants.COMMENT_BURST', 1)
+    def test_missing_post_does_not_consume_tokens(self):
+        """Комментарий к несуществующему посту не тратит токены"""
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': 0}),
+            {'text': 'Комментарий'})
+        response = self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Комментарий'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Comment.objects.count(), 1)
@@ -1,11 +1,16 @@
 import shutil
+import struct
 import tempfile
+import zlib
+from io import BytesIO
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase, Client, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from posts.forms import PostForm
 from posts.models import Post, Group, Comment
@@ -155,3 +160,106 @@ class PostsFormsTests(TestCase):
             data=form_data,
         )
         self.assertIsNone(Comment.objects.first())
+
+
+def make_png(size=(40, 20)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def png_chunk(kind, data):
+    return (struct.pack('>I', len(data)) + kind + data
+            + struct.pack('>I', zlib.crc32(kind + data)))
+
+
+def make_png_header(width, height):
+    """Только заголовок PNG: разрешение без самих пикселей."""
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2,
+                                         0, 0, 0))
+        + png_chunk(b'IDAT', zlib.compress(b'\x00' * 64))
+    )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def upload(self, content, name='image.png'):
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={
+                'text': 'Пост с картинкой',
+                'image': SimpleUploadedFile(name, content, 'image/png'),
+            },
+        )
+
+    def test_valid_image_is_saved(self):
+        """Картинка проходит через потоковый обработчик загрузки"""
+        self.upload(make_png())
+        post = Post.objects.get(author=self.user)
+        self.assertEqual(post.image.name, 'posts/image.png')
+        self.assertEqual(post.image.width, 40)
+
+    def test_rejected_uploads(self):
+        """Неподходящие файлы отклоняются с понятной ошибкой"""
+        cases = {
+            'not_image': (
+                b'not an image' * 100, {'IMAGE_HEADER_SNIFF_SIZE': 100},
+                'не является картинкой'),
+            'too_large': (
+                make_png(), {'MAX_IMAGE_UPLOAD_SIZE': 10}, 'больше'),
+            'too_wide': (
+                make_png(), {'MAX_IMAGE_SIDE': 30}, 'разрешение'),
+            'format': (
+                make_png(), {'ALLOWED_IMAGE_FORMATS': ('JPEG',)},
+                'только картинки'),
+        }
+        for name, (content, limits, message) in cases.items():
+            with self.subTest(case=name):
+                patches = [
+                    mock.patch(f'posts.constants.{key}', value)
+                    for key, value in limits.items()
+                ]
+                for patch in patches:
+                    patch.start()
+                try:
+                    response = self.upload(content)
+                finally:
+                    for patch in patches:
+                        patch.stop()
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(message, str(response.context['form'].errors))
+                self.assertFalse(Post.objects.filter(author=self.user))
+
+    def test_decompression_bomb_header_rejected(self):
+        """Заголовок больше предела Pillow даёт ошибку формы, а не 500"""
+        response = self.upload(make_png_header(20000, 20000))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('разрешение', str(response.context['form'].errors))
+        self.assertFalse(Post.objects.filter(author=self.user))
+
+    def test_form_checks_files_not_streamed_by_handler(self):
+        """Форма проверяет разрешение и без обработчика загрузки"""
+        with mock.patch('posts.constants.MAX_IMAGE_SIDE', 30):
+            form = PostForm(
+                data={'text': 'Текст'},
+                files={'image': SimpleUploadedFile(
+                    'image.png', make_png(), 'image/png')},
+            )
+            self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
@@ -0,0 +1,157 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from posts import constants, graph
+from posts.cache import tag_versions
+from posts.graph import FollowGraph
+from posts.models import Follow
+
+User = get_user_model()
+
+
+class FollowGraphTests(TestCase):
+    def setUp(self):
+        # 1 → 2, 3; 2 → 4, 5; 3 → 4; 5 → 1
+        self.graph = FollowGraph([(1, 2), (1, 3), (2, 4), (2, 5), (3, 4),
+                                  (5, 1)])
+
+    def test_follows_and_mutual(self):
+        """Проверка подписки и взаимной подписки по массивам"""
+        self.assertTrue(self.graph.follows(1, 3))
+        self.assertFalse(self.graph.follows(3, 1))
+        self.assertFalse(self.graph.follows(7, 1))
+        self.assertFalse(self.graph.is_mutual(1, 2))
+        self.graph.add(2, 1)
+        self.assertTrue(self.graph.is_mutual(1, 2))
+
+    def test_suggestions(self):
+        """Друзья друзей упорядочены по числу общих связей"""
+        self.assertEqual(self.graph.suggestions(1), [4, 5])
+        self.assertEqual(self.graph.suggestions(4), [2, 3, 5, 1])
+        self.assertEqual(self.graph.suggestions(1, seeds=[5]), [4])
+
+    def test_incremental_changes_and_compact(self):
+        """Изменения поверх массивов совпадают с пересобранным графом"""
+        self.graph.add(3, 5)
+        self.graph.remove(1, 2)
+        self.graph.add(1, 2)
+        self.graph.remove(2, 4)
+        self.graph.add(6, 1)
+        expected = [(1, 2), (1, 3), (2, 5), (3, 4), (3, 5), (5, 1), (6, 1)]
+        self.assertEqual(list(graph._edges(self.graph._state)), expected)
+        # Седьмое изменение собирает массивы заново.
+        with mock.patch.object(constants, 'FOLLOW_GRAPH_COMPACT_SIZE', 7):
+            self.graph.add(6, 2)
+            self.graph.remove(6, 2)
+        self.assertEqual(self.graph._state[1:], ({}, {}))
+        self.assertEqual(list(graph._edges(self.graph._state)), expected)
+        self.assertEqual(self.graph.following(3), [4, 5])
+        self.assertFalse(self.graph.follows(2, 4))
+
+    def test_changes_during_rebuild(self):
+        """Изменения, пришедшие во время сборки, переносятся в новый снимок"""
+        self.assertTrue(self.graph.begin_rebuild())
+        self.assertFalse(self.graph.begin_rebuild())
+        self.graph.add(3, 5)
+        self.graph.remove(1, 2)
+        self.graph.rebuild([(1, 2), (2, 4)])
+        self.assertEqual(self.graph.following(1), [])
+        self.assertEqual(self.graph.following(3), [5])
+        self.assertTrue(self.graph.follows(2, 4))
+        self.assertTrue(self.graph.begin_rebuild())
+
+    def test_failed_rebuild_keeps_snapshot(self):
+        """Ошибка сборки оставляет прежний снимок и снимает журнал"""
+        def broken():
+            yield 1, 2
+            raise RuntimeError
+        self.graph.begin_rebuild()
+        with self.assertRaises(RuntimeError):
+            self.graph.rebuild(broken())
+        self.assertTrue(self.graph.follows(1, 3))
+        self.assertTrue(self.graph.begin_rebuild())
+
+
+class FollowGraphSignalsTests(TransactionTestCase):
+    def setUp(self):
+        graph.reset()
+        self.user = User.objects.create_user(username='TestUser')
+        self.author = User.objects.create_user(username='TestAuthor')
+
+    def tearDown(self):
+        graph.reset()
+
+    def test_load_in_background(self):
+        """Запрос не ждёт загрузки графа, она ставится в фоновый пул"""
+        Follow.objects.create(user=self.user, author=self.author)
+        with mock.patch('posts.tasks.submit') as submit:
+            loaded = graph.get_graph()
+            graph.get_graph()
+        version = tag_versions([graph.FOLLOWS_TAG])[graph.FOLLOWS_TAG]
+        submit.assert_called_once_with(graph.load, loaded, version)
+        self.assertFalse(loaded.follows(self.user.pk, self.author.pk))
+        graph.load(loaded, version)
+        self.assertTrue(loaded.follows(self.user.pk, self.author.pk))
+        self.assertFalse(loaded.expired())
+
+    def test_reload_only_after_follow_changes(self):
+        """После TTL граф перечитывается, только если подписки менялись"""
+        loaded = graph.get_graph()
+        expired = time.monotonic() - constants.FOLLOW_GRAPH_TTL - 1
+        loaded.loaded_at = expired
+        with mock.patch('posts.tasks.submit') as submit:
+            self.assertIs(graph.get_graph(), loaded)
+        submit.assert_not_called()
+        self.assertFalse(loaded.expired())
+
+        Follow.objects.create(user=self.user, author=self.author)
+        loaded.loaded_at = expired
+        with mock.patch('posts.tasks.submit') as submit:
+            graph.get_graph()
+        submit.assert_called_once()
+
+    def test_graph_follows_follow_table(self):
+        """Граф процесса обновляется после коммита подписки и отписки"""
+        loaded = graph.get_graph()
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertTrue(loaded.follows(self.user.pk, self.author.pk))
+        Follow.objects.filter(user=self.user).delete()
+        self.assertFalse(loaded.follows(self.user.pk, self.author.pk))
+
+
+class SuggestionsViewsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.friend = User.objects.create_user(username='Friend')
+        cls.suggested = User.objects.create_user(username='Suggested')
+        Follow.objects.create(user=cls.user, author=cls.friend)
+        Follow.objects.create(user=cls.friend, author=cls.suggested)
+        Follow.objects.create(user=cls.friend, author=cls.user)
+
+    def setUp(self):
+        graph.reset()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        graph.reset()
+
+    def test_follow_index_suggestions(self):
+        """Лента подписок предлагает авторов из подписок друзей"""
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['suggestions'], [self.suggested])
+        self.assertContains(response, 'На кого подписаться')
+
+    def test_profile_mutual_follow(self):
+        """Профиль отмечает взаимную подписку"""
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'Friend'}))
+        self.assertTrue(response.context['follows_you'])
+        self.assertContains(response, 'Взаимная подписка')
+        self.assertEqual(response.context['suggestions'], [self.suggested])
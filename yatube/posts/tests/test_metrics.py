@@ -0,0 +1,180 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from core import metrics
+from core.models import ViewMetric
+from core.testing import QueryBudgetMixin
+from posts import graph, thumbnails
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        Post.objects.bulk_create(
+            Post(author=cls.author, group=cls.group, text=f'Пост {index}')
+            for index in range(15)
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Последний пост')
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.reader, text='Комментарий')
+            for _ in range(5)
+        )
+        # Несколько подписок с постами и подписки авторов между собой,
+        # чтобы на страницах были и лента из разных авторов, и рекомендации.
+        cls.authors = [cls.author] + [
+            User.objects.create_user(username=f'Author{index}')
+            for index in range(3)
+        ]
+        Post.objects.bulk_create(
+            Post(author=author, text=f'Пост автора {author.username}')
+            for author in cls.authors[1:]
+        )
+        for author in cls.authors:
+            Follow.objects.create(user=cls.reader, author=author)
+        for author in cls.authors[1:]:
+            suggested = User.objects.create_user(
+                username=f'Suggested{author.pk}')
+            Follow.objects.create(user=author, author=suggested)
+            Follow.objects.create(user=author, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        # Граф подписок в работе грузится фоновой задачей, а не запросом.
+        graph.reset()
+        graph.get_graph()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_views_fit_query_budgets(self):
+        """Представления укладываются в бюджеты запросов к БД"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:group_index'),
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:profile', kwargs={'username': self.reader}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:follow_index'),
+            reverse('posts:profile_followers',
+                    kwargs={'username': self.author}),
+            reverse('posts:profile_following',
+                    kwargs={'username': self.reader}),
+            reverse('posts:post_search') + '?q=пост',
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            reverse('posts:api_index'),
+            reverse('posts:api_group', kwargs={'slug': self.group.slug}),
+            reverse('posts:api_profile', kwargs={'username': self.author}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                cache.clear()
+                self.assertMaxQueries(url, client=self.authorized_client)
+
+    def tearDown(self):
+        graph.reset()
+
+    def test_follow_index_with_suggestions(self):
+        """Лента нескольких авторов с рекомендациями укладывается в бюджет"""
+        response = self.assertMaxQueries(
+            reverse('posts:follow_index'), client=self.authorized_client)
+        authors = {post.author for post in response.context['page_obj']}
+        self.assertEqual(authors, set(self.authors))
+        self.assertEqual(len(response.context['suggestions']), 3)
+
+    def test_profile_after_post_create(self):
+        """Профиль сразу после публикации картинки укладывается в бюджет"""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        buffer = BytesIO()
+        Image.new('RGB', (40, 20), 'red').save(buffer, 'PNG')
+        image = SimpleUploadedFile('image.png', buffer.getvalue(), 'image/png')
+        with override_settings(MEDIA_ROOT=media_root):
+            self.authorized_client.post(
+                reverse('posts:post_create'),
+                {'text': 'Новый пост', 'image': image})
+            # В TestCase on_commit не срабатывает; на сайте задача
+            # миниатюр выполняется сразу после фиксации публикации.
+            thumbnails.process_pending()
+            response = self.assertMaxQueries(
+                reverse('posts:profile', kwargs={'username': self.reader}),
+                client=self.authorized_client)
+        self.assertContains(response, 'Новый пост')
+
+    def test_budget_overrun_fails(self):
+        with self.assertRaises(AssertionError):
+            self.assertMaxQueries(reverse('posts:index'), budget=0)
+
+
+class ViewMetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.flush()
+
+    def test_middleware_records_histograms(self):
+        """Метрики запросов копятся в кэше под именем представления"""
+        user = User.objects.create_user(username='Author')
+        Post.objects.create(author=user, text='Текст')
+        for _ in range(3):
+            self.client.get(reverse('posts:index'))
+        self.client.get('/missing/')
+        metrics.flush()
+        found = metrics.histograms(['posts:index', 'unresolved'], 1)
+        index = found['posts:index']
+        self.assertEqual(sum(index['queries'].values()), 3)
+        self.assertLessEqual(
+            int(metrics.percentile('queries', index['queries'], 1)),
+            settings.VIEW_QUERY_BUDGETS['posts:index'])
+        self.assertIsNotNone(
+            metrics.percentile('template_ms', index['template_ms'], 0.5))
+        self.assertEqual(sum(found['unresolved']['size_kb'].values()), 1)
+
+    def test_flush_adds_to_stored_counts(self):
+        """Сброс прибавляет счётчики к сохранённым и удаляет старые окна"""
+        now = 10_000 * metrics.WINDOW
+        metrics.record('posts:index', {'queries': 1}, now=now)
+        metrics.flush(now=now)
+        metrics.record('posts:index', {'queries': 1}, now=now)
+        metrics.record('posts:index', {'queries': 1}, now=now)
+        metrics.flush(now=now)
+        found = metrics.histograms(['posts:index'], 1, now=now)
+        self.assertEqual(found['posts:index']['queries'], {'1': 3})
+        later = now + metrics.WINDOW * metrics.WINDOWS
+        metrics.record('posts:index', {'queries': 1}, now=later)
+        metrics.flush(now=later)
+        self.assertEqual(
+            ViewMetric.objects.filter(window=metrics.window(now)).count(), 0)
+
+    def test_buckets(self):
+        self.assertEqual(metrics.bucket('queries', 0), '0')
+        self.assertEqual(metrics.bucket('queries', 4), '5')
+        self.assertEqual(metrics.bucket('queries', 1000), metrics.OVERFLOW)
+        self.assertEqual(
+            metrics.percentile('queries', {'1': 9, '5': 1}, 0.5), '1')
+        self.assertEqual(
+            metrics.percentile('queries', {'1': 9, '5': 1}, 0.95), '5')
+
+    def test_command(self):
+        self.client.get(reverse('posts:index'))
+        out = StringIO()
+        call_command(
+            'view_metrics', '--view', 'posts:index', '--histogram',
+            stdout=out)
+        self.assertIn('posts:index: 1 запросов', out.getvalue())
+        self.assertIn('queries: p50 ≤', out.getvalue())
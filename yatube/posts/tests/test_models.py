@@ -1,8 +1,10 @@
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import AuthorStats, Follow, Group, GroupStats, Post
 from posts.constants import N_SYMBOLS_TO_SHOW
+from posts.stats import recount_groups
 
 User = get_user_model()
 
@@ -34,3 +36,103 @@ class PostModelTest(TestCase):
         for obj_attribute, exp_attribute in expected_objects.items():
             with self.subTest(obj_attribute=obj_attribute):
                 self.assertEqual(obj_attribute, exp_attribute)
+
+
+class AuthorStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.follower = User.objects.create_user(username='follower')
+
+    def test_counters_follow_posts_and_follows(self):
+        """Счётчики автора меняются вместе с постами и подписками."""
+        post = Post.objects.create(author=self.user, text='Тестовый пост')
+        Follow.objects.create(user=self.follower, author=self.user)
+        stats = AuthorStats.objects.get(author=self.user)
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(stats.followers_count, 1)
+        self.assertEqual(
+            AuthorStats.objects.get(author=self.follower).following_count, 1)
+
+        post.delete()
+        Follow.objects.all().delete()
+        stats.refresh_from_db()
+        self.assertEqual(stats.posts_count, 0)
+        self.assertEqual(stats.followers_count, 0)
+
+    def test_drifted_counters_do_not_block_deletes(self):
+        """Разошедшийся счётчик не уходит ниже нуля и не срывает удаление."""
+        Post.objects.create(author=self.user, text='Тестовый пост')
+        Follow.objects.create(user=self.follower, author=self.user)
+        AuthorStats.objects.update(
+            posts_count=0, followers_count=0, following_count=0)
+        Post.objects.filter(author=self.user).delete()
+        Follow.objects.all().delete()
+        self.assertFalse(Post.objects.exists())
+        stats = AuthorStats.objects.get(author=self.user)
+        self.assertEqual((stats.posts_count, stats.followers_count), (0, 0))
+
+
+class FollowConstraintsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='author')
+
+    def test_follow_constraints(self):
+        """База не даёт подписаться дважды или на самого себя."""
+        Follow.objects.create(user=self.user, author=self.author)
+        for author in (self.author, self.user):
+            with self.subTest(author=author):
+                with self.assertRaises(IntegrityError):
+                    with transaction.atomic():
+                        Follow.objects.create(user=self.user, author=author)
+
+
+class GroupStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(title='Первая', slug='first')
+        cls.other = Group.objects.create(title='Вторая', slug='second')
+
+    def stats(self, group):
+        return GroupStats.objects.values_list(
+            'posts_count', 'last_post_date').get(group=group)
+
+    def test_summary_follows_posts(self):
+        """Сводка группы меняется вместе с постами и их переносом."""
+        self.assertEqual(self.stats(self.group), (0, None))
+        first = Post.objects.create(
+            author=self.user, group=self.group, text='Первый')
+        second = Post.objects.create(
+            author=self.user, group=self.group, text='Второй')
+        self.assertEqual(self.stats(self.group), (2, second.pub_date))
+
+        second.group = self.other
+        second.save()
+        self.assertEqual(self.stats(self.group), (1, first.pub_date))
+        self.assertEqual(self.stats(self.other), (1, second.pub_date))
+
+        first.delete()
+        self.assertEqual(self.stats(self.group), (0, None))
+
+    def test_drifted_summary_does_not_block_deletes(self):
+        """Разошедшийся счётчик группы не срывает удаление постов."""
+        Post.objects.create(author=self.user, group=self.group, text='Пост')
+        GroupStats.objects.update(posts_count=0)
+        Post.objects.filter(group=self.group).delete()
+        self.assertFalse(Post.objects.exists())
+        self.assertEqual(self.stats(self.group), (0, None))
+
+    def test_recount(self):
+        """Пересчёт восстанавливает разошедшуюся сводку."""
+        post = Post.objects.create(
+            author=self.user, group=self.group, text='Пост')
+        GroupStats.objects.all().delete()
+        self.assertEqual(recount_groups(), 2)
+        self.assertEqual(self.stats(self.group), (1, post.pub_date))
+        self.assertEqual(self.stats(self.other), (0, None))
@@ -0,0 +1,136 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import notifications
+from posts.constants import NOTIFICATION_CLAIM_TIMEOUT
+from posts.models import (
+    Follow, Notification, NotificationEvent, Post, UnreadCounter)
+
+User = get_user_model()
+
+
+class NotificationsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.follower = User.objects.create_user(username='Follower')
+        cls.stranger = User.objects.create_user(username='Stranger')
+        Follow.objects.create(user=cls.follower, author=cls.author)
+
+    def setUp(self):
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+
+    def unread(self):
+        response = self.follower_client.get(
+            reverse('posts:unread_notifications'))
+        return response.json()['unread']
+
+    def test_new_post_goes_to_outbox(self):
+        """Новый пост ставит событие, правка — нет"""
+        post = Post.objects.create(author=self.author, text='Текст')
+        post.text = 'Правка'
+        post.save()
+        self.assertEqual(
+            list(NotificationEvent.objects.values_list('post', 'status')),
+            [(post.pk, NotificationEvent.PENDING)])
+        self.assertFalse(Notification.objects.exists())
+
+    def test_drain_delivers_to_followers(self):
+        """Уведомления получают только подписчики, счётчик растёт"""
+        posts = [
+            Post.objects.create(author=self.author, text=f'Пост {index}')
+            for index in range(3)
+        ]
+        self.assertEqual(notifications.drain(limit=2), 3)
+        self.assertEqual(
+            set(Notification.objects.values_list('user', 'post')),
+            {(self.follower.pk, post.pk) for post in posts})
+        self.assertFalse(NotificationEvent.objects.exclude(
+            status=NotificationEvent.DONE).exists())
+        self.assertEqual(self.unread(), 3)
+        self.assertEqual(notifications.drain(), 0)
+
+    def test_redelivery_keeps_counter(self):
+        """Повторная раскладка не увеличивает счётчик непрочитанного"""
+        post = Post.objects.create(author=self.author, text='Текст')
+        for returning in (True, False):
+            with self.subTest(returning=returning), mock.patch(
+                    'posts.notifications.supports_returning',
+                    return_value=returning):
+                self.assertEqual(notifications.deliver(post), 1)
+                self.assertEqual(notifications.deliver(post), 0)
+                self.assertEqual(self.unread(), 1)
+                Notification.objects.all().delete()
+                UnreadCounter.objects.all().delete()
+
+    def test_inbox_marks_read(self):
+        """Страница уведомлений показывает новые и обнуляет счётчик"""
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        notifications.drain()
+        response = self.follower_client.get(reverse('posts:notifications'))
+        page = list(response.context['page_obj'])
+        self.assertEqual([item.post for item in page], [post])
+        self.assertFalse(page[0].is_read)
+        self.assertEqual(self.unread(), 0)
+        self.assertTrue(Notification.objects.get().is_read)
+
+    def test_unread_count_uses_counter(self):
+        """Счётчик читается одним запросом без ленты"""
+        UnreadCounter.objects.create(user=self.follower, count=5)
+        with self.assertNumQueries(1):
+            self.assertEqual(notifications.unread_count(self.follower), 5)
+        self.assertEqual(notifications.unread_count(self.stranger), 0)
+
+    def test_guest_redirected(self):
+        response = self.client.get(reverse('posts:notifications'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_retry_failed_recounts(self):
+        """Команда повторяет упавшие события и сверяет счётчики"""
+        post = Post.objects.create(author=self.author, text='Текст')
+        notifications.drain()
+        NotificationEvent.objects.filter(post=post).update(
+            status=NotificationEvent.FAILED)
+        call_command(
+            'send_notifications', '--retry-failed', stdout=StringIO())
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertEqual(self.unread(), 1)
+
+    def test_stale_running_events_reclaimed(self):
+        """Событие, зависшее у упавшего воркера, обрабатывается заново"""
+        post = Post.objects.create(author=self.author, text='Текст')
+        NotificationEvent.objects.filter(post=post).update(
+            status=NotificationEvent.RUNNING, worker='dead',
+            claimed=timezone.now() - timedelta(
+                seconds=NOTIFICATION_CLAIM_TIMEOUT + 1))
+        fresh = Post.objects.create(author=self.author, text='Свежий')
+        NotificationEvent.objects.filter(post=fresh).update(
+            status=NotificationEvent.RUNNING, worker='alive',
+            claimed=timezone.now())
+        call_command('send_notifications', stdout=StringIO())
+        self.assertEqual(
+            NotificationEvent.objects.get(post=post).status,
+            NotificationEvent.DONE)
+        self.assertEqual(
+            NotificationEvent.objects.get(post=fresh).status,
+            NotificationEvent.RUNNING)
+        self.assertEqual(self.unread(), 1)
+
+    def test_event_committed_with_post(self):
+        """Пост без события не сохраняется"""
+        with mock.patch.object(
+                NotificationEvent.objects, 'create',
+                side_effect=DatabaseError('outbox недоступен')):
+            with self.assertRaises(DatabaseError):
+                Post.objects.create(author=self.author, text='Текст')
+        self.assertFalse(Post.objects.filter(text='Текст').exists())
@@ -0,0 +1,117 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import constants
+from posts.models import Comment, Post
+from posts.search import (
+    SearchBackend, SearchPaginator, get_backend, search_terms)
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Searcher')
+        cls.rare = Post.objects.create(
+            author=cls.user, text='Кот спит на подоконнике')
+        cls.common = Post.objects.create(
+            author=cls.user, text='Кот кот кот: всё про котов')
+        cls.other = Post.objects.create(
+            author=cls.user, text='Собака гуляет во дворе')
+
+    def found(self, query):
+        response = self.client.get(
+            reverse('posts:post_search'), {'q': query})
+        return list(response.context['page_obj'])
+
+    def test_backend_matches_database(self):
+        """Для SQLite и PostgreSQL используется индекс"""
+        if connection.vendor in ('sqlite', 'postgresql'):
+            self.assertIsNot(type(get_backend()), SearchBackend)
+
+    def test_results_are_ranked(self):
+        """Чаще встречающееся слово поднимает пост выше"""
+        self.assertEqual(self.found('кот'), [self.common, self.rare])
+
+    def test_prefix_and_case(self):
+        """Поиск не зависит от регистра и находит по началу слова"""
+        self.assertEqual(self.found('СОБ'), [self.other])
+
+    def test_query_syntax_is_ignored(self):
+        """Операторы движка в запросе не ломают поиск"""
+        self.assertEqual(search_terms('"кот" OR* (собака)'),
+                         ['кот', 'or', 'собака'])
+        self.assertEqual(self.found('"собака'), [self.other])
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при правке поста, комментариях и удалении"""
+        other = Post.objects.get(pk=self.other.pk)
+        other.text = 'Попугай сидит в клетке'
+        other.save()
+        self.assertEqual(self.found('собака'), [])
+        self.assertEqual(self.found('попугай'), [other])
+        comment = Comment.objects.create(
+            post=self.rare, author=self.user, text='Ёжик в тумане')
+        self.assertEqual(self.found('ёжик'), [self.rare])
+        comment.delete()
+        self.assertEqual(self.found('ёжик'), [])
+        Post.objects.filter(pk=self.rare.pk).delete()
+        self.assertEqual(self.found('подоконнике'), [])
+
+    def test_comment_indexed_alone(self):
+        """Комментарий индексируется отдельно, документ поста не трогается"""
+        for index in range(3):
+            Comment.objects.create(
+                post=self.rare, author=self.user, text=f'Ответ {index}')
+        post_document = f'INTO {constants.SEARCH_TABLE} '
+        with CaptureQueriesContext(connection) as queries:
+            Comment.objects.create(
+                post=self.rare, author=self.user, text='Ёжик в тумане')
+            Comment.objects.create(
+                post=self.other, author=self.user, text='Ёжик у реки')
+        self.assertFalse(
+            [query for query in queries
+             if post_document in query['sql']])
+        self.assertEqual(
+            set(self.found('ёжик')), {self.rare, self.other})
+        self.assertEqual(self.found('ответ'), [self.rare])
+
+    def test_keyset_pagination(self):
+        """Страницы результатов листаются по курсору в обе стороны"""
+        for index in range(5):
+            Post.objects.create(author=self.user, text=f'Кот номер {index}')
+        paginator = SearchPaginator(['кот'], 3)
+        first = paginator.get_cursor_page()
+        second = paginator.get_cursor_page(after=first.next_cursor)
+        third = paginator.get_cursor_page(after=second.next_cursor)
+        seen = list(first) + list(second) + list(third)
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(len(set(seen)), 7)
+        self.assertFalse(third.has_next())
+        back = paginator.get_cursor_page(before=second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_empty_query(self):
+        response = self.client.get(reverse('posts:post_search'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['page_obj']), [])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            get_backend().uninstall(cursor)
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.found('подоконнике'), [self.rare])
+
+    def test_page_size(self):
+        for index in range(constants.MAX_POSTS_ON_PAGE):
+            Post.objects.create(author=self.user, text=f'Кот {index}')
+        page = self.found('кот')
+        self.assertEqual(len(page), constants.MAX_POSTS_ON_PAGE)
@@ -0,0 +1,151 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.files.storage import default_storage
+from django.template import Context, Template
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.images import ImageFile
+
+from posts.constants import (
+    POST_IMAGE_WIDTHS, POST_THUMBNAIL_GEOMETRY, POST_THUMBNAIL_OPTIONS)
+from posts.images import output_formats, variant_name, variant_urls
+from posts.models import Post, ThumbnailJob
+from posts.thumbnails import process_job
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_image(name='image.png'):
+    buffer = BytesIO()
+    Image.new('RGB', (40, 20), 'red').save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/png')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailJobTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='TestUser')
+
+    def test_job_queued_for_new_image(self):
+        """Задача ставится только при появлении новой картинки"""
+        post = Post.objects.create(
+            text='Пост с картинкой', author=self.user, image=make_image())
+        self.assertEqual(post.thumbnail_jobs.count(), 1)
+        post.text = 'Изменённый текст'
+        post.save()
+        self.assertEqual(post.thumbnail_jobs.count(), 1)
+        Post.objects.create(text='Пост без картинки', author=self.user)
+        self.assertEqual(ThumbnailJob.objects.count(), 1)
+
+    def test_process_job(self):
+        """Задача готовит миниатюру и выполняется один раз"""
+        post = Post.objects.create(
+            text='Пост с картинкой', author=self.user, image=make_image())
+        job = post.thumbnail_jobs.get()
+        self.assertTrue(process_job(job.pk))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ThumbnailJob.DONE)
+        self.assertFalse(process_job(job.pk))
+
+    def test_source_decoded_once(self):
+        """Задача открывает исходную картинку один раз"""
+        post = Post.objects.create(
+            text='Пост с картинкой', author=self.user, image=make_image())
+        with mock.patch('PIL.Image.open', wraps=Image.open) as image_open:
+            process_job(post.thumbnail_jobs.get().pk)
+        self.assertEqual(image_open.call_count, 1)
+        # Варианты и миниатюра sorl готовы из этого единственного открытия.
+        self.assertIsNotNone(variant_urls(post.image.name))
+        thumbnail = ImageFile(post.image)
+        self.assertTrue(default.kvstore.get(thumbnail))
+
+    def test_fallback_built_on_demand(self):
+        """До выполнения задачи тег сам строит миниатюру sorl"""
+        post = Post.objects.create(
+            text='Пост с картинкой', author=self.user, image=make_image())
+        tag = Template(
+            '{% load responsive_images %}{% responsive_image post.image %}')
+        html = tag.render(Context({'post': post}))
+        thumbnail = get_thumbnail(
+            post.image, POST_THUMBNAIL_GEOMETRY, **POST_THUMBNAIL_OPTIONS)
+        self.assertIn(f'src="{thumbnail.url}"', html)
+        self.assertTrue(thumbnail.exists())
+
+    def test_sorl_thumbnail_generated(self):
+        """Задача заранее готовит запасную миниатюру sorl"""
+        post = Post.objects.create(
+            text='Пост с картинкой', author=self.user, image=make_image())
+        process_job(post.thumbnail_jobs.get().pk)
+        with mock.patch('PIL.Image.open') as image_open:
+            thumbnail = get_thumbnail(
+                post.image, POST_THUMBNAIL_GEOMETRY,
+                **POST_THUMBNAIL_OPTIONS)
+        image_open.assert_not_called()
+        self.assertIsNotNone(default.kvstore.get(thumbnail))
+        self.assertEqual(
+            f'{thumbnail.width}x{thumbnail.height}', POST_THUMBNAIL_GEOMETRY)
+
+    def test_variants_generated(self):
+        """Для картинки готовятся варианты всех ширин и форматов"""
+        post = Post.objects.create(
+            text='Пост с картинкой', author=self.user, image=make_image())
+        process_job(post.thumbnail_jobs.get().pk)
+        for width in POST_IMAGE_WIDTHS:
+            for image_format in output_formats():
+                name = variant_name(post.image.name, width, image_format)
+                with self.subTest(name=name):
+                    self.assertTrue(default_storage.exists(name))
+                    with default_storage.open(name) as variant:
+                        self.assertEqual(Image.open(variant).width, width)
+
+    def test_responsive_image_tag(self):
+        """Тег выводит srcset после подготовки вариантов"""
+        post = Post.objects.create(
+            text='Пост с картинкой', author=self.user, image=make_image())
+        tag = Template(
+            '{% load responsive_images %}{% responsive_image post.image %}')
+        html = tag.render(Context({'post': post}))
+        thumbnail = get_thumbnail(
+            post.image, POST_THUMBNAIL_GEOMETRY, **POST_THUMBNAIL_OPTIONS)
+        self.assertEqual(
+            f'{thumbnail.width}x{thumbnail.height}', POST_THUMBNAIL_GEOMETRY)
+        self.assertIn(f'src="{thumbnail.url}"', html)
+        self.assertNotIn('srcset', html)
+        with self.assertNumQueries(0):
+            self.assertEqual(tag.render(Context({'post': post})), html)
+
+        process_job(post.thumbnail_jobs.get().pk)
+        html = tag.render(Context({'post': post}))
+        self.assertIn('<picture>', html)
+        self.assertIn('image/webp', html)
+        self.assertIn(f'{max(POST_IMAGE_WIDTHS)}w', html)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class WarmThumbnailsTests(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_warm_thumbnails(self):
+        """Команда готовит миниатюры существующих постов"""
+        user = User.objects.create_user(username='TestUser')
+        Post.objects.create(text='Пост', author=user, image=make_image())
+        ThumbnailJob.objects.all().delete()
+        call_command('warm_thumbnails', workers=2, stdout=StringIO())
+        self.assertEqual(
+            ThumbnailJob.objects.filter(status=ThumbnailJob.DONE).count(), 1)
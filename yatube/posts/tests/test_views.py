@@ -1,11 +1,21 @@
+import warnings
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase, Client
+from django.template import Context, Template
+from django.db import connection
+from django.test import RequestFactory, TestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django import forms
 from django.core.cache import cache
+from django.core.paginator import UnorderedObjectListWarning
 
-from posts.models import Post, Group, Follow
-from posts.constants import MAX_POSTS_ON_PAGE
+from posts.models import (
+    AuthorStats, Comment, Post, Group, Follow, TimelineEntry)
+from posts.constants import MAX_COMMENTS_ON_PAGE, MAX_POSTS_ON_PAGE
+from posts.relations import following_ids
+from posts.utils import CursorPaginator, elided_page_range, encode_cursor
 
 User = get_user_model()
 
@@ -138,6 +148,98 @@ class PostsContextTests(TestCase):
         self.assertEqual(len(response.context['page_obj']),
                          self.EXTRA_POSTS)
 
+    def test_index_cursor_paginator_working(self):
+        """Проверка курсорной пагинации index"""
+        cache.clear()
+        response = self.client.get(reverse('posts:index'))
+        next_cursor = response.context['page_obj'].next_cursor
+
+        response = self.client.get(
+            reverse('posts:index') + f'?after={next_cursor}')
+        page_obj = response.context['page_obj']
+        self.assertTrue(page_obj.is_cursor)
+        self.assertEqual(len(page_obj), self.EXTRA_POSTS)
+        self.assertFalse(page_obj.has_next())
+        self.assertTrue(page_obj.has_previous())
+
+        response = self.client.get(
+            reverse('posts:index') + f'?{page_obj.previous_query}')
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), MAX_POSTS_ON_PAGE)
+        self.assertEqual(page_obj[0], self.last_post)
+        self.assertFalse(page_obj.has_previous())
+
+    def test_index_broken_cursor_shows_first_page(self):
+        """Испорченный курсор открывает первую страницу"""
+        response = self.client.get(reverse('posts:index') + '?after=broken')
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj[0], self.last_post)
+        self.assertFalse(page_obj.has_previous())
+
+    def test_tampered_cursor_shows_first_page(self):
+        """Курсор с неподходящими значениями не ломает запросы"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:post_comments', kwargs={'post_id': 1}),
+            reverse('posts:api_index'),
+            reverse('posts:post_search') + '?q=текст&',
+        )
+        for values in (['x', 'y'], [1, 2], [None, None], [[1], {}]):
+            cursor = encode_cursor(values)
+            for url in urls:
+                separator = '' if url.endswith('&') else '?'
+                with self.subTest(url=url, values=values):
+                    response = self.client.get(
+                        f'{url}{separator}after={cursor}')
+                    self.assertEqual(response.status_code, 200)
+
+    def test_deep_cursor_uses_index_range(self):
+        """Страница за курсором читает индекс с курсора, а не с начала"""
+        middle = Post.objects.order_by('-pub_date', '-id')[5]
+        cursor = encode_cursor([middle.pub_date, middle.pk])
+        paginator = CursorPaginator(Post.objects.all(), MAX_POSTS_ON_PAGE)
+        for direction, bound in (('after', '<='), ('before', '>=')):
+            with self.subTest(direction=direction):
+                with CaptureQueriesContext(connection) as queries:
+                    paginator.get_cursor_page(**{direction: cursor})
+                sql = queries[-1]['sql']
+                self.assertIn(f'"posts_post"."pub_date" {bound}', sql)
+                if connection.vendor != 'sqlite':
+                    continue
+                with connection.cursor() as db_cursor:
+                    db_cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                    plan = ' '.join(row[-1] for row in db_cursor.fetchall())
+                self.assertIn('SEARCH posts_post USING INDEX', plan)
+                self.assertNotIn('SCAN posts_post', plan)
+
+    def test_empty_cursor_page(self):
+        """Курсор за краем списка даёт пустую страницу без ссылок"""
+        cache.clear()
+        oldest = Post.objects.order_by('pub_date', 'id').first()
+        newest = Post.objects.order_by('-pub_date', '-id').first()
+        cases = {
+            'after': encode_cursor([oldest.pub_date, oldest.pk]),
+            'before': encode_cursor([newest.pub_date, newest.pk]),
+        }
+        for param, cursor in cases.items():
+            with self.subTest(param=param):
+                response = self.client.get(
+                    reverse('posts:index') + f'?{param}={cursor}')
+                page_obj = response.context['page_obj']
+                self.assertEqual(len(page_obj), 0)
+                self.assertFalse(page_obj.has_next())
+                self.assertFalse(page_obj.has_previous())
+                self.assertIsNone(page_obj.next_cursor)
+                self.assertIsNone(page_obj.previous_cursor)
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': newest.pk})
+            + f'?after={encode_cursor([newest.pub_date, 0])}')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            reverse('posts:post_search')
+            + f'?q=zzz&after={encode_cursor([1.0, 1])}')
+        self.assertEqual(response.status_code, 200)
+
     def test_group_list_have_correct_context(self):
         """Шаблон group_list сформирован с правильным контекстом."""
         response = self.client.get(
@@ -192,22 +294,215 @@ class PostsContextTests(TestCase):
 
     def test_work_of_cache(self):
         """Проверка работы кэширования.
-        При удалении поста, он не пропадает со страницы
-        до обновления кэша"""
+        Фрагмент поста берётся из кэша, пока не изменится версия поста,
+        а новые и удалённые посты видны сразу"""
         cache.clear()
         test_post = Post.objects.create(text='Тестовый текст для кэша',
                                         author=self.user,
                                         group=self.test_group)
         response = self.client.get(reverse('posts:index'))
         self.assertContains(response, test_post.text)
-        test_post.delete()
+
+        Post.objects.filter(pk=test_post.pk).update(text='Скрытая правка')
         response = self.client.get(reverse('posts:index'))
         self.assertContains(response, test_post.text)
-        cache.clear()
+
+        test_post.text = 'Изменённый текст для кэша'
+        test_post.save()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, test_post.text)
+
+        test_post.delete()
         response = self.client.get(reverse('posts:index'))
         self.assertNotContains(response, test_post.text)
 
 
+class CommentsPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.post = Post.objects.create(text='Тестовый текст',
+                                       author=cls.user)
+        cls.EXTRA_COMMENTS = 3
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {i}')
+            for i in range(MAX_COMMENTS_ON_PAGE + cls.EXTRA_COMMENTS)
+        )
+
+    def test_post_detail_comments_paginated(self):
+        """На странице поста выводится одна страница комментариев"""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        response = self.client.get(url)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), MAX_COMMENTS_ON_PAGE)
+        self.assertTrue(comments.has_next())
+
+        response = self.client.get(f'{url}?{comments.next_query}')
+        self.assertEqual(len(response.context['comments']),
+                         self.EXTRA_COMMENTS)
+
+    def test_comments_json_pages(self):
+        """JSON с комментариями отдаётся страницами по курсору"""
+        url = reverse('posts:post_comments',
+                      kwargs={'post_id': self.post.pk})
+        first = self.client.get(url).json()
+        self.assertEqual(len(first['comments']), MAX_COMMENTS_ON_PAGE)
+        self.assertEqual(first['comments'][0]['author'],
+                         self.user.username)
+
+        second = self.client.get(f'{url}?after={first["next"]}').json()
+        self.assertEqual(len(second['comments']), self.EXTRA_COMMENTS)
+        self.assertIsNone(second['next'])
+        ids = {comment['id'] for comment in first['comments']}
+        self.assertFalse(
+            ids & {comment['id'] for comment in second['comments']})
+
+    def test_comments_json_unknown_post(self):
+        """Для несуществующего поста возвращается 404"""
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 0}))
+        self.assertEqual(response.status_code, 404)
+
+
+class GroupIndexTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.group = Group.objects.create(title='Б группа', slug='b')
+        cls.empty = Group.objects.create(title='А группа', slug='a')
+        Post.objects.create(text='Текст', author=cls.user, group=cls.group)
+
+    def test_group_index(self):
+        """Каталог групп берёт сводку без GROUP BY по постам"""
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('posts:group_index'))
+        groups = list(response.context['page_obj'])
+        self.assertEqual(groups, [self.empty, self.group])
+        self.assertEqual(groups[1].stats.posts_count, 1)
+        self.assertContains(response, 'Записей: 1')
+
+
+class PageRangeTests(TestCase):
+    def test_elided_page_range(self):
+        """Список номеров страниц не растёт вместе с их числом"""
+        self.assertEqual(elided_page_range(1, 5), [1, 2, 3, 4, 5])
+        self.assertEqual(
+            elided_page_range(500, 10000),
+            [1, None, 498, 499, 500, 501, 502, None, 10000])
+        self.assertEqual(
+            elided_page_range(2, 10000), [1, 2, 3, 4, None, 10000])
+        self.assertEqual(
+            elided_page_range(9999, 10000),
+            [1, None, 9997, 9998, 9999, 10000])
+
+    def test_index_count_cached(self):
+        """Главная не считает посты повторно, пока они не менялись"""
+        cache.clear()
+        user = User.objects.create_user(username='TestUser')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=user) for i in range(30))
+        self.client.get(reverse('posts:index'))
+        with mock.patch('posts.stats.Post.objects.count') as count:
+            response = self.client.get(reverse('posts:index'))
+        count.assert_not_called()
+        self.assertEqual(response.context['page_obj'].paginator.count, 30)
+        self.assertContains(response, '?page=3')
+
+        Post.objects.create(text='Новый пост', author=user)
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.context['page_obj'].paginator.count, 31)
+
+
+class CountedPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='TestUser')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.user) for i in range(25))
+        AuthorStats.objects.update_or_create(
+            author=cls.user, defaults={'posts_count': 25})
+
+    def profile_page(self, posts_count, page):
+        AuthorStats.objects.filter(author=self.user).update(
+            posts_count=posts_count)
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'TestUser'})
+            + f'?page={page}')
+        self.assertEqual(response.status_code, 200)
+        return response.context['page_obj']
+
+    def test_overestimated_count(self):
+        """Завышенный счётчик не даёт пустых страниц и ошибок"""
+        page_obj = self.profile_page(100, 4)
+        self.assertEqual(page_obj.number, 3)
+        self.assertEqual(len(page_obj), 5)
+        self.assertFalse(page_obj.has_next())
+        page_obj = self.profile_page(100, 3)
+        self.assertFalse(page_obj.has_next())
+        self.assertEqual(page_obj.paginator.num_pages, 3)
+
+    def test_underestimated_count(self):
+        """Заниженный счётчик не обрезает страницу и не прячет следующую"""
+        page_obj = self.profile_page(5, 1)
+        self.assertEqual(len(page_obj), MAX_POSTS_ON_PAGE)
+        self.assertTrue(page_obj.has_next())
+
+
+class ConditionalViewsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test_group')
+        cls.post = Post.objects.create(
+            text='Тестовый текст', author=cls.user, group=cls.group)
+
+    def urls(self):
+        return (
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+
+    def test_unchanged_pages_not_modified(self):
+        """Неизменившиеся страницы отдаются 304 без шаблонов"""
+        for url in self.urls():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertTrue(response.has_header('Last-Modified'))
+                cached = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(cached.status_code, 304)
+                self.assertEqual(cached.templates, [])
+
+    def test_changes_reset_etag(self):
+        """Новый комментарий, правка поста и подписка меняют ETag"""
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls()}
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Новый текст'
+        post.save()
+        Follow.objects.create(user=self.reader, author=self.user)
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_etag_depends_on_user(self):
+        """Страница гостя не отдаётся авторизованному пользователю"""
+        client = Client()
+        client.force_login(self.reader)
+        for url in self.urls():
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                self.assertNotEqual(client.get(url)['ETag'], etag)
+
+
 class PostsNewPostTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -346,3 +641,164 @@ class FollowTests(TestCase):
         )
         self.assertNotContains(
             response, Post.objects.get(author=self.author_2).text)
+
+    def test_new_post_pushed_to_followers_timeline(self):
+        """Новый пост автора попадает в ленту подписчика"""
+        post = Post.objects.create(text='Новый пост', author=self.author_1)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=post).exists())
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.author_2, post=post).exists())
+
+    def test_unfollow_clears_timeline(self):
+        """После отписки посты автора убираются из ленты"""
+        Follow.objects.filter(user=self.user, author=self.author_1).delete()
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.user, post__author=self.author_1).exists())
+
+    def test_repeated_follow_keeps_counters(self):
+        """Повторная подписка не меняет счётчики и ленту"""
+        url = reverse('posts:profile_follow',
+                      kwargs={'username': self.author_2.username})
+        self.authorized_client.get(url)
+        self.authorized_client.get(url)
+        self.assertEqual(AuthorStats.objects.get(
+            author=self.author_2).followers_count, 1)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post__author=self.author_2).exists())
+
+    @mock.patch('posts.constants.TIMELINE_BACKFILL_LIMIT', 2)
+    def test_follow_copies_recent_posts(self):
+        """При подписке в ленту попадают только последние посты автора"""
+        for index in range(3):
+            Post.objects.create(author=self.author_2, text=f'Пост {index}')
+        recent = list(Post.objects.filter(author=self.author_2).order_by(
+            '-pub_date', '-id').values_list('id', flat=True)[:2])
+        self.authorized_client.get(reverse(
+            'posts:profile_follow',
+            kwargs={'username': self.author_2.username}))
+        self.assertCountEqual(
+            TimelineEntry.objects.filter(
+                user=self.user, post__author=self.author_2,
+            ).values_list('post_id', flat=True),
+            recent)
+
+    def test_unknown_author_not_followed(self):
+        """Подписка на несуществующего автора ничего не создаёт"""
+        follows_count = Follow.objects.count()
+        response = self.authorized_client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'nobody'}))
+        self.assertEqual(Follow.objects.count(), follows_count)
+        self.assertRedirects(
+            response, reverse('posts:profile', kwargs={'username': 'nobody'}),
+            target_status_code=404)
+
+    def test_follow_batch(self):
+        """Пакетная подписка и отписка списком имён"""
+        response = self.authorized_client.post(
+            reverse('posts:follow_batch'),
+            {
+                'follow': [
+                    f'{self.author_2.username}, {self.user.username}',
+                    'nobody',
+                ],
+                'unfollow': self.author_1.username,
+            },
+        )
+        self.assertEqual(response.json(), {'followed': 1, 'unfollowed': 1})
+        self.assertEqual(
+            list(Follow.objects.filter(user=self.user).values_list(
+                'author', flat=True)),
+            [self.author_2.pk])
+        self.assertEqual(AuthorStats.objects.get(
+            author=self.user).following_count, 1)
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.user, post__author=self.author_1).exists())
+
+    @mock.patch('posts.constants.MAX_FOLLOW_BATCH', 1)
+    def test_follow_batch_limit(self):
+        """Слишком длинный список имён отклоняется"""
+        response = self.authorized_client.post(
+            reverse('posts:follow_batch'), {'follow': 'a b'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_following_ids_memo(self):
+        """Подписки на список авторов проверяются одним запросом"""
+        request = RequestFactory().get('/')
+        authors = [self.author_1.pk, self.author_2.pk]
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                following_ids(self.user, authors, request),
+                {self.author_1.pk})
+            self.assertEqual(
+                following_ids(self.user, [self.author_2.pk], request), set())
+
+    def test_follow_button_list(self):
+        """Кнопки подписки для списка авторов не множат запросы"""
+        request = RequestFactory().get('/')
+        request.user = self.user
+        template = Template(
+            '{% load follow_tags %}{% prefetch_following authors %}'
+            '{% for author in authors %}{% follow_button author %}'
+            '{% endfor %}')
+        with self.assertNumQueries(1):
+            html = template.render(Context({
+                'request': request,
+                'authors': [self.author_1, self.author_2, self.user],
+            }))
+        self.assertEqual(html.count('Отписаться'), 1)
+        self.assertEqual(html.count('Подписаться'), 1)
+
+    def test_followers_and_following_pages(self):
+        """Страницы подписчиков и подписок показывают пользователей"""
+        response = self.authorized_client.get(reverse(
+            'posts:profile_followers',
+            kwargs={'username': self.author_1.username}))
+        self.assertEqual(response.context['users'], [self.user])
+        self.assertEqual(response.context['stats'].followers_count, 1)
+        response = self.authorized_client.get(reverse(
+            'posts:profile_following',
+            kwargs={'username': self.user.username}))
+        self.assertEqual(response.context['users'], [self.author_1])
+        self.assertContains(response, 'Отписаться')
+
+    def test_cursor_pages_without_ordering_warning(self):
+        """Курсорные страницы не предупреждают о неупорядоченном queryset"""
+        urls = (
+            reverse('posts:profile_followers',
+                    kwargs={'username': self.author_1.username}),
+            reverse('posts:profile_following',
+                    kwargs={'username': self.user.username}),
+            reverse('posts:notifications'),
+        )
+        for url in urls:
+            with self.subTest(url=url), warnings.catch_warnings(
+                    record=True) as caught:
+                warnings.simplefilter('always')
+                self.authorized_client.get(url)
+                self.assertFalse([
+                    warning for warning in caught
+                    if issubclass(warning.category,
+                                  UnorderedObjectListWarning)])
+
+    @mock.patch('posts.constants.MAX_FOLLOWS_ON_PAGE', 1)
+    def test_followers_keyset_pagination(self):
+        """Подписчики листаются курсором по id подписки"""
+        Follow.objects.create(user=self.author_2, author=self.author_1)
+        url = reverse('posts:profile_followers',
+                      kwargs={'username': self.author_1.username})
+        response = self.client.get(url)
+        self.assertEqual(response.context['users'], [self.author_2])
+        page = response.context['page_obj']
+        response = self.client.get(f'{url}?{page.next_query}')
+        self.assertEqual(response.context['users'], [self.user])
+        self.assertFalse(response.context['page_obj'].has_next())
+
+    @mock.patch('posts.constants.TIMELINE_FANOUT_LIMIT', 0)
+    def test_popular_author_posts_read_on_request(self):
+        """Посты популярного автора подмешиваются в ленту при чтении"""
+        post = Post.objects.create(text='Пост популярного автора',
+                                   author=self.author_1)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertContains(response, post.text)
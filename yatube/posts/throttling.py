@@ -0,0 +1,30 @@
+"""Ограничение частоты действий пользователя «ведром токенов».
+
+Ведро хранится в общем кэше как пара (токены, время), поэтому лимит
+действует во всех воркерах. В ведре не больше capacity токенов, один
+токен возвращается каждые refill_seconds секунд, каждое действие
+забирает один токен. Чтение и запись ведра не атомарны: одновременные
+запросы одного пользователя могут пройти сверх лимита на единицы, что
+для защиты от шквала комментариев допустимо.
+"""
+import time
+
+from core.cache import shared_cache
+
+THROTTLE_KEY = 'throttle:{}:{}'
+
+
+def consume(scope, ident, capacity, refill_seconds):
+    """Забирает токен; возвращает 0 или сколько секунд ждать следующего."""
+    key = THROTTLE_KEY.format(scope, ident)
+    now = time.time()
+    tokens, updated = shared_cache().get(key, (capacity, now))
+    tokens = min(capacity, tokens + (now - updated) / refill_seconds)
+    wait = 0
+    if tokens >= 1:
+        tokens -= 1
+    else:
+        wait = (1 - tokens) * refill_seconds
+    # За это время ведро наполнится целиком, дальше запись не нужна.
+    shared_cache().set(key, (tokens, now), capacity * refill_seconds)
+    return wait
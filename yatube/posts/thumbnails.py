@@ -0,0 +1,75 @@
+"""Подготовка миниатюр картинок постов вне запроса.
+
+При сохранении поста с новой картинкой в таблицу ThumbnailJob ставится
+задача, которую после фиксации транзакции выполняет пул потоков. Первый
+просмотр страницы получает уже готовые варианты картинки. Задача готовит
+и запасную миниатюру sorl, которую шаблон показывает до появления
+вариантов; её строит тот же декодированный исходник, что и варианты.
+"""
+from django.db.models import F
+from sorl.thumbnail import get_thumbnail
+
+from . import constants, tasks
+from .cache import invalidate_tags
+from .images import decoded, generate_variants
+from .models import Post, ThumbnailJob
+
+
+def generate(post):
+    """Готовит адаптивные варианты и запасную миниатюру sorl."""
+    with decoded(post.image) as source:
+        generate_variants(post.image, source)
+        get_thumbnail(
+            post.image,
+            constants.POST_THUMBNAIL_GEOMETRY,
+            **constants.POST_THUMBNAIL_OPTIONS,
+        )
+    # Закэшированные фрагменты ещё ссылаются на запасную миниатюру.
+    invalidate_tags(f'post:{post.pk}')
+
+
+def enqueue(post):
+    """Ставит задачу для поста и запускает её после фиксации."""
+    job = ThumbnailJob.objects.create(post=post)
+    tasks.submit_on_commit(process_job, job.pk)
+    return job
+
+
+def process_job(job_id):
+    """Выполняет задачу, если её ещё не взял другой поток."""
+    claimed = ThumbnailJob.objects.filter(
+        pk=job_id, status=ThumbnailJob.PENDING,
+    ).update(status=ThumbnailJob.RUNNING, attempts=F('attempts') + 1)
+    if not claimed:
+        return False
+    job = ThumbnailJob.objects.select_related('post').get(pk=job_id)
+    try:
+        generate(job.post)
+    except Exception as error:
+        job.status = ThumbnailJob.FAILED
+        job.error = str(error)
+    else:
+        job.status = ThumbnailJob.DONE
+        job.error = ''
+    job.save(update_fields=('status', 'error', 'updated'))
+    return job.status == ThumbnailJob.DONE
+
+
+def enqueue_missing(force=False):
+    """Ставит задачи для постов с картинками, у которых нет миниатюр."""
+    posts = Post.objects.exclude(image='')
+    if not force:
+        posts = posts.exclude(thumbnail_jobs__status__in=(
+            ThumbnailJob.PENDING, ThumbnailJob.DONE))
+    jobs = ThumbnailJob.objects.bulk_create(
+        ThumbnailJob(post_id=post_id)
+        for post_id in posts.values_list('pk', flat=True).distinct()
+    )
+    return len(jobs)
+
+
+def process_pending(workers=constants.BACKGROUND_WORKERS):
+    """Выполняет все задачи из очереди параллельно."""
+    job_ids = list(ThumbnailJob.objects.filter(
+        status=ThumbnailJob.PENDING).values_list('pk', flat=True))
+    return tasks.run_parallel(process_job, job_ids, workers)
@@ -0,0 +1,101 @@
+"""Заранее собранные ленты подписок (fan-out-on-write).
+
+Новый пост сразу раскладывается по лентам подписчиков автора, и страница
+подписок читает только свою ленту. Посты авторов, у которых больше
+TIMELINE_FANOUT_LIMIT подписчиков, не раскладываются, а подмешиваются
+при чтении (fan-out-on-read). При подписке в ленту копируются только
+TIMELINE_BACKFILL_LIMIT последних постов автора: пакетная подписка на
+сотни авторов не должна переписывать их историю целиком.
+"""
+from itertools import islice
+
+from django.db.models import Q
+
+from . import constants
+from .models import AuthorStats, Follow, Post, TimelineEntry
+
+
+def _bulk_add(entries):
+    """Пакетная вставка записей без загрузки всего набора в память."""
+    entries = iter(entries)
+    created = 0
+    while True:
+        batch = list(islice(entries, constants.TIMELINE_BATCH_SIZE))
+        if not batch:
+            return created
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        created += len(batch)
+
+
+def popular_authors():
+    """Авторы, посты которых читаются без раскладки по лентам."""
+    return AuthorStats.objects.filter(
+        followers_count__gt=constants.TIMELINE_FANOUT_LIMIT).values('author')
+
+
+def is_popular(author_id):
+    return popular_authors().filter(author_id=author_id).exists()
+
+
+def fan_out_post(post):
+    """Добавляет новый пост в ленты всех подписчиков автора."""
+    if is_popular(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    _bulk_add(
+        TimelineEntry(user_id=user_id, post_id=post.pk)
+        for user_id in followers.iterator()
+    )
+
+
+def add_author(user_id, author_id):
+    """Дописывает в ленту пользователя последние посты нового автора."""
+    if is_popular(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id').values_list('id', flat=True)
+    _bulk_add(
+        TimelineEntry(user_id=user_id, post_id=post_id)
+        for post_id in posts[:constants.TIMELINE_BACKFILL_LIMIT]
+    )
+
+
+def remove_author(user_id, author_id):
+    """Убирает из ленты пользователя посты автора, от которого он отписался."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+def timeline_posts(user):
+    """Посты ленты подписок пользователя."""
+    popular = popular_authors().filter(
+        author__in=user.follower.values('author'))
+    if not popular.exists():
+        return Post.objects.filter(timeline_entries__user=user)
+    return Post.objects.filter(
+        Q(pk__in=user.timeline.values('post'))
+        | Q(author__in=popular.values('author'))
+    )
+
+
+def rebuild_timelines():
+    """Пересобирает все ленты из таблиц Follow и Post."""
+    TimelineEntry.objects.all().delete()
+    popular = set(popular_authors().values_list('author', flat=True))
+    authors = (
+        Follow.objects.exclude(author__in=popular)
+        .values_list('author', flat=True).distinct()
+    )
+    created = 0
+    for author_id in authors.iterator():
+        followers = list(Follow.objects.filter(
+            author_id=author_id).values_list('user_id', flat=True))
+        posts = Post.objects.filter(
+            author_id=author_id).values_list('id', flat=True)
+        created += _bulk_add(
+            TimelineEntry(user_id=user_id, post_id=post_id)
+            for post_id in posts.iterator()
+            for user_id in followers
+        )
+    return created
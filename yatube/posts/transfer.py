@@ -0,0 +1,207 @@
+"""Потоковые выгрузка и загрузка контента в JSON Lines.
+
+Каждая модель пишется в свой файл <name>.jsonl по строке на объект, поэтому
+ни выгрузка, ни загрузка не держат весь набор в памяти. Загрузка идёт
+пакетами bulk_create с отложенной проверкой внешних ключей; модели одной
+ступени (без зависимостей друг от друга) могут загружаться параллельно.
+Сигналы при bulk_create не срабатывают, поэтому после загрузки
+пересчитываются счётчики, ленты и поисковый индекс.
+"""
+import json
+import os
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, connections, transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
+
+from . import search, stats, timeline
+from .cache import invalidate_tags
+from .models import Comment, Follow, Group, Post, User
+from .tasks import run_inline
+
+BATCH_SIZE = 2_000
+# Две переменные запроса на строку: SQLite до 3.32 принимает не больше 999.
+UPDATE_BATCH_SIZE = 400
+
+# Ступени загрузки: модели ступени ссылаются только на предыдущие.
+STAGES = (
+    (
+        ('users', User, (
+            'id', 'username', 'password', 'first_name', 'last_name',
+            'email', 'is_staff', 'is_active', 'is_superuser',
+            'last_login', 'date_joined')),
+        ('groups', Group, ('id', 'title', 'slug', 'description')),
+    ),
+    (
+        ('posts', Post, (
+            'id', 'text', 'pub_date', 'author_id', 'group_id', 'image')),
+        ('follows', Follow, ('id', 'user_id', 'author_id')),
+    ),
+    (
+        ('comments', Comment, (
+            'id', 'post_id', 'author_id', 'text', 'created')),
+    ),
+)
+MODELS = [model for stage in STAGES for model in stage]
+
+
+def _in_thread(func, item):
+    try:
+        return func(item)
+    finally:
+        connections.close_all()
+
+
+def run_stage(func, items, workers):
+    """Обрабатывает модели ступени, при workers > 1 — в отдельных потоках.
+
+    В отличие от tasks.run_parallel ошибки не глушатся: загрузка должна
+    остановиться на первой же проблеме.
+    """
+    if workers <= 1 or run_inline():
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda item: _in_thread(func, item), items))
+
+
+def file_path(directory, name):
+    return os.path.join(directory, f'{name}.jsonl')
+
+
+class ContentEncoder(DjangoJSONEncoder):
+    """Даты с микросекундами: по ним листаются ленты, обрезать их нельзя."""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def export_model(directory, name, model, fields):
+    """Выгружает модель построчно, читая базу порциями."""
+    exported = 0
+    rows = model.objects.order_by('pk').values(*fields).iterator(
+        chunk_size=BATCH_SIZE)
+    with open(file_path(directory, name), 'w', encoding='utf-8') as file:
+        for row in rows:
+            file.write(json.dumps(
+                row, cls=ContentEncoder, ensure_ascii=False))
+            file.write('\n')
+            exported += 1
+    return exported
+
+
+def export_content(directory, workers=1):
+    """Выгружает все модели в directory; возвращает {имя: количество}."""
+    os.makedirs(directory, exist_ok=True)
+    counts = run_stage(
+        lambda item: export_model(directory, *item), MODELS, workers)
+    return dict(zip((name for name, *_ in MODELS), counts))
+
+
+def restore_auto_now(model, dates, inserted_after):
+    """Возвращает датам auto_now_add значения из файла.
+
+    bulk_create подставляет в такие поля текущее время. Флаг auto_now_add
+    живёт в общем для всех потоков _meta, поэтому он не отключается, а
+    даты после вставки переписываются одним UPDATE на порцию строк.
+    dates — {attname: {pk: дата}}. Строки с датой раньше inserted_after
+    уже были в базе (ignore_conflicts) и не трогаются.
+    """
+    for attname, values in dates.items():
+        field = model._meta.get_field(attname)
+        pks = list(values)
+        for start in range(0, len(pks), UPDATE_BATCH_SIZE):
+            chunk = pks[start:start + UPDATE_BATCH_SIZE]
+            model.objects.filter(**{
+                'pk__in': chunk, f'{attname}__gte': inserted_after,
+            }).update(**{attname: Case(
+                *(When(pk=pk, then=Value(values[pk])) for pk in chunk),
+                output_field=field,
+            )})
+
+
+def read_objects(path, model):
+    fields = {field.attname: field for field in model._meta.concrete_fields}
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            yield model(**{
+                name: fields[name].to_python(value)
+                for name, value in row.items()
+            })
+
+
+def import_model(directory, name, model, fields, ignore_conflicts=False):
+    """Загружает модель пакетами в одной транзакции."""
+    path = file_path(directory, name)
+    if not os.path.exists(path):
+        return 0
+    objects = read_objects(path, model)
+    auto_now = [
+        field.attname for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    imported = 0
+    with transaction.atomic():
+        with connection.constraint_checks_disabled():
+            while True:
+                batch = list(islice(objects, BATCH_SIZE))
+                if not batch:
+                    break
+                # Даты из файла запоминаются до того, как bulk_create
+                # заменит их текущим временем.
+                dates = {
+                    attname: {obj.pk: getattr(obj, attname) for obj in batch}
+                    for attname in auto_now
+                }
+                inserted_after = timezone.now()
+                model.objects.bulk_create(
+                    batch, ignore_conflicts=ignore_conflicts)
+                restore_auto_now(model, dates, inserted_after)
+                imported += len(batch)
+        # Ключи проверяются одним запросом на таблицу, а не на строку.
+        connection.check_constraints(table_names=[model._meta.db_table])
+    reset_sequences(model)
+    return imported
+
+
+def reset_sequences(model):
+    """После вставки явных id счётчики первичных ключей сдвигаются дальше."""
+    statements = connection.ops.sequence_reset_sql(no_style(), [model])
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def rebuild_derived():
+    """Пересчитывает то, что при обычном сохранении ведут сигналы."""
+    stats.recount()
+    stats.recount_groups()
+    stats.recount_comments()
+    timeline.rebuild_timelines()
+    search.rebuild()
+    invalidate_tags('posts')
+
+
+def import_content(directory, workers=1, ignore_conflicts=False,
+                   derived=True):
+    """Загружает модели по ступеням; возвращает {имя: количество}."""
+    counts = {}
+    for stage in STAGES:
+        imported = run_stage(
+            lambda item: import_model(
+                directory, *item, ignore_conflicts=ignore_conflicts),
+            stage, workers)
+        counts.update(zip((name for name, *_ in stage), imported))
+    if derived:
+        rebuild_derived()
+    return counts
@@ -0,0 +1,112 @@
+"""Потоковая загрузка картинок постов.
+
+Обработчик пишет файл частями сразу во временный файл, а по первым
+килобайтам разбирает заголовок картинки. Файл неподходящего формата,
+размера или разрешения дальше не пишется, и форма получает ошибку, не
+дожидаясь, пока Pillow откроет файл целиком.
+
+Обработчик подключается только к представлениям с формой поста
+декоратором image_uploads, остальные загрузки сайта идут через
+стандартные обработчики Django.
+"""
+from functools import wraps
+
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image, ImageFile
+
+from . import constants
+
+
+def image_header_error(image_format, width, height):
+    """Текст ошибки для заголовка картинки или None, если он подходит."""
+    if image_format not in constants.ALLOWED_IMAGE_FORMATS:
+        return 'Поддерживаются только картинки JPEG, PNG, GIF и WebP.'
+    if (max(width, height) > constants.MAX_IMAGE_SIDE
+            or width * height > constants.MAX_IMAGE_PIXELS):
+        return (
+            'Слишком большое разрешение картинки: '
+            f'{width}x{height} пикселей.'
+        )
+    return None
+
+
+def image_pixels_error():
+    return 'Слишком большое разрешение картинки.'
+
+
+def image_size_error():
+    return (
+        'Картинка не должна быть больше '
+        f'{filesizeformat(constants.MAX_IMAGE_UPLOAD_SIZE)}.'
+    )
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку во временный файл и проверяет её заголовок."""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.parser = ImageFile.Parser()
+        self.header_checked = False
+        self.received = 0
+        self.error = None
+
+    def check_header(self, raw_data):
+        try:
+            self.parser.feed(raw_data)
+        except Image.DecompressionBombError:
+            # Pillow отказывается открывать заголовок с огромным числом
+            # пикселей раньше нашей проверки разрешения.
+            self.error = image_pixels_error()
+            return
+        except Exception:
+            self.error = 'Загруженный файл не является картинкой.'
+            return
+        image = self.parser.image
+        if image is None:
+            if self.received > constants.IMAGE_HEADER_SNIFF_SIZE:
+                self.error = 'Загруженный файл не является картинкой.'
+            return
+        self.error = image_header_error(image.format, *image.size)
+        self.header_checked = True
+        self.parser = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.error:
+            return None
+        self.received += len(raw_data)
+        if self.received > constants.MAX_IMAGE_UPLOAD_SIZE:
+            self.error = image_size_error()
+            return None
+        if not self.header_checked:
+            self.check_header(raw_data)
+            if self.error:
+                return None
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(self.file.tell())
+        uploaded.upload_error = self.error
+        self.parser = None
+        return uploaded
+
+
+def image_uploads(view):
+    """Загрузки представления идут через ImageUploadHandler.
+
+    CsrfViewMiddleware читает request.POST до вызова представления, после
+    чего обработчики загрузки уже не подменить. Поэтому проверка CSRF
+    выполняется внутри обёртки, после подмены обработчиков.
+    """
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [ImageUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+
+    return wrapper
@@ -1,12 +1,291 @@
-from django.core.paginator import Paginator
+import base64
+import json
+from datetime import datetime
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.http import QueryDict
 
 from . import constants
 
 
-def paginate(request, model):
-    """Разбивка вывода экземпляров модели на страницы"""
-    paginator = Paginator(model, constants.MAX_POSTS_ON_PAGE)
+def encode_cursor(values):
+    """Упаковка значений ключа сортировки в непрозрачный курсор."""
+    values = [
+        value.isoformat() if isinstance(value, datetime) else value
+        for value in values
+    ]
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Распаковка курсора; для испорченного курсора возвращает None."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw.decode())
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(values, list):
+        return None
+    return values
+
+
+def elided_page_range(number, num_pages,
+                      on_each_side=constants.PAGE_RANGE_ON_EACH_SIDE,
+                      on_ends=constants.PAGE_RANGE_ON_ENDS):
+    """Номера страниц для навигации: края и окно вокруг текущей.
+
+    Пропущенные участки обозначаются None, поэтому длина списка не
+    зависит от числа страниц.
+    """
+    if num_pages <= (on_each_side + on_ends) * 2 + 1:
+        return list(range(1, num_pages + 1))
+    pages = []
+    if number > on_each_side + on_ends + 1:
+        pages.extend(range(1, on_ends + 1))
+        pages.append(None)
+        pages.extend(range(number - on_each_side, number + 1))
+    else:
+        pages.extend(range(1, number + 1))
+    if number < num_pages - on_each_side - on_ends:
+        pages.extend(range(number + 1, number + on_each_side + 1))
+        pages.append(None)
+        pages.extend(range(num_pages - on_ends + 1, num_pages + 1))
+    else:
+        pages.extend(range(number + 1, num_pages + 1))
+    return pages
+
+
+class CursorPage(Page):
+    """Страница курсорной пагинации.
+
+    Повторяет интерфейс Page, но не знает ни номера страницы, ни общего
+    количества объектов, поэтому шаблон выводит только ссылки
+    «вперёд» и «назад».
+    """
+
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous,
+                 query=None):
+        super().__init__(object_list, None, paginator)
+        # Пустая страница (строки удалили или курсор указывал на край)
+        # не даёт курсоров, поэтому и ссылок «вперёд» и «назад» на ней нет.
+        self._has_next = has_next and bool(object_list)
+        self._has_previous = has_previous and bool(object_list)
+        self._query = query
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        return self.paginator.cursor_for(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        return self.paginator.cursor_for(self.object_list[0])
+
+    def _query_with(self, param=None, cursor=None):
+        query = (self._query or QueryDict()).copy()
+        for key in ('page', 'after', 'before'):
+            query.pop(key, None)
+        if param:
+            query[param] = cursor
+        return query.urlencode()
+
+    @property
+    def first_query(self):
+        return self._query_with()
+
+    @property
+    def next_query(self):
+        return self._query_with('after', self.next_cursor)
+
+    @property
+    def previous_query(self):
+        return self._query_with('before', self.previous_cursor)
+
+
+class CursorPaginator(Paginator):
+    """Пагинация по ключу сортировки без COUNT и OFFSET.
+
+    Страница выбирается условием на ключ (по умолчанию ``(pub_date, id)``)
+    относительно курсора, поэтому стоимость запроса не зависит от того,
+    насколько далеко листает пользователь.
+    """
+
+    def __init__(self, object_list, per_page,
+                 ordering=constants.CURSOR_ORDERING):
+        super().__init__(object_list, per_page)
+        self.ordering = tuple(ordering)
+
+    def _check_object_list_is_ordered(self):
+        # Страница всегда читается с order_by по self.ordering, порядок
+        # исходного queryset не важен.
+        pass
+
+    def ordering_fields(self):
+        """Поля модели для значений ключа сортировки."""
+        opts = self.object_list.model._meta
+        fields = []
+        for field in self.ordering:
+            name = field.lstrip('-')
+            try:
+                fields.append(opts.get_field(name))
+            except FieldDoesNotExist:
+                fields.append(
+                    self.object_list.query.annotations[name].output_field)
+        return fields
+
+    def decode(self, cursor):
+        """Значения курсора, приведённые к типам полей сортировки.
+
+        Испорченный или подделанный курсор даёт None, то есть первую
+        страницу, а не ошибку в запросе.
+        """
+        values = decode_cursor(cursor) if cursor else None
+        if values is None or len(values) != len(self.ordering):
+            return None
+        cleaned = []
+        for field, value in zip(self.ordering_fields(), values):
+            if value is None or isinstance(value, (list, dict)):
+                return None
+            try:
+                cleaned.append(field.to_python(value))
+            except (ValidationError, TypeError, ValueError):
+                return None
+        return cleaned
+
+    def cursor_for(self, obj):
+        names = [field.lstrip('-') for field in self.ordering]
+        if isinstance(obj, dict):
+            return encode_cursor([obj[name] for name in names])
+        return encode_cursor([getattr(obj, name) for name in names])
+
+    def _keyset_filter(self, values, backwards):
+        """Условие «после курсора» для ключа из нескольких полей.
+
+        Дизъюнкция (a < x) OR (a = x AND b < y) индексом не ограничивается,
+        поэтому к ней добавляется граница a <= x по первому полю: с ней СУБД
+        начинает чтение индекса с курсора, а не с начала.
+        """
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != backwards
+            lookup = f'{name}__lt' if descending else f'{name}__gt'
+            step = Q(**{lookup: values[index]})
+            for prev_field, prev_value in zip(self.ordering[:index],
+                                              values[:index]):
+                step &= Q(**{prev_field.lstrip('-'): prev_value})
+            condition |= step
+        if len(self.ordering) > 1:
+            first = self.ordering[0]
+            descending = first.startswith('-') != backwards
+            lookup = 'lte' if descending else 'gte'
+            condition = Q(**{f'{first.lstrip("-")}__{lookup}': values[0]}) & (
+                condition)
+        return condition
+
+    def _reversed_ordering(self):
+        return [
+            field[1:] if field.startswith('-') else f'-{field}'
+            for field in self.ordering
+        ]
+
+    def get_cursor_page(self, after=None, before=None, query=None):
+        """Возвращает страницу после курсора after или перед before."""
+        limit = self.per_page + 1
+        after = self.decode(after)
+        before = self.decode(before)
+
+        if before is not None:
+            rows = list(
+                self.object_list.filter(self._keyset_filter(before, True))
+                .order_by(*self._reversed_ordering())[:limit])
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            return CursorPage(rows, self, True, has_previous, query)
+
+        queryset = self.object_list.order_by(*self.ordering)
+        if after is not None:
+            queryset = queryset.filter(self._keyset_filter(after, False))
+        rows = list(queryset[:limit])
+        return CursorPage(
+            rows[:self.per_page], self, len(rows) > self.per_page,
+            after is not None, query)
+
+
+class CountedPaginator(Paginator):
+    """Нумерованные страницы при известном заранее количестве объектов.
+
+    Количество берётся из счётчиков или оценки СУБД и может разойтись с
+    настоящим. Страница читается с одной лишней строкой: по ней видно,
+    есть ли следующая, и количество поправляется. Если оценка завышена и
+    страница оказалась пустой, количество считается точно.
+    """
+
+    def __init__(self, object_list, per_page, count):
+        super().__init__(object_list, per_page)
+        self._set_count(count)
+
+    def _set_count(self, count):
+        self.count = count
+        self.__dict__.pop('num_pages', None)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            self._set_count(self.object_list.count())
+            return self.page(min(number, self.num_pages))
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            self._set_count(max(self.count, bottom + self.per_page + 1))
+        else:
+            self._set_count(bottom + len(rows))
+        return self._get_page(rows, number, self)
+
+
+def paginate(request, model, cursor=False, count=None,
+             per_page=constants.MAX_POSTS_ON_PAGE,
+             ordering=constants.CURSOR_ORDERING):
+    """Разбивка вывода экземпляров модели на страницы
+
+    При cursor=True или при наличии в запросе параметров after/before
+    используется курсорная пагинация без подсчёта объектов по ключу
+    ordering. Известное заранее количество объектов передаётся в count,
+    чтобы не считать его запросом; оно может быть приблизительным.
+    """
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    if cursor or after or before:
+        paginator = CursorPaginator(model, per_page, ordering)
+        return paginator.get_cursor_page(after, before, request.GET)
+
+    if count is None:
+        paginator = Paginator(model, per_page)
+    else:
+        paginator = CountedPaginator(model, per_page, count)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    if page_obj.has_next() and len(page_obj):
+        cursor_paginator = CursorPaginator(model, per_page, ordering)
+        page_obj.next_cursor = cursor_paginator.cursor_for(
+            page_obj[len(page_obj) - 1])
 
     return page_obj
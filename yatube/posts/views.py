@@ -1,18 +1,29 @@
+import re
+from math import ceil
+
+from django.http import Http404, JsonResponse
 from django.shortcuts import redirect, render, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.cache import cache_page
-
-from posts.models import Group, Post, User, Follow
+from django.views.decorators.http import require_POST
+
+from posts import (
+    constants, follows, graph, notifications, relations, search, throttling,
+    timeline)
+from posts.comments import create_comment
+from posts.conditions import (
+    conditional_page, group_page_state, post_page_state, profile_page_state)
+from posts.stats import get_group_stats, get_stats, total_posts
+from posts.models import Comment, Follow, Group, Post, User
 from posts.forms import CommentForm, PostForm
-from posts.utils import paginate
+from posts.uploadhandlers import image_uploads
+from posts.utils import CursorPaginator, paginate
 
 
-@cache_page(20, key_prefix='index_page')
 def index(request):
     """Главная страница сайта."""
     template = 'posts/index.html'
     post_list = Post.objects.select_related('group', 'author')
-    page_obj = paginate(request, post_list)
+    page_obj = paginate(request, post_list, count=total_posts())
     context = {
         'page_obj': page_obj,
     }
@@ -20,12 +31,43 @@ def index(request):
     return render(request, template, context)
 
 
+def post_search(request):
+    """Поиск по текстам постов и комментариев."""
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    page_obj = search.search_page(
+        query, request.GET.get('after'), request.GET.get('before'),
+        request.GET)
+    context = {
+        'page_obj': page_obj,
+        'query': query,
+    }
+
+    return render(request, template, context)
+
+
+def group_index(request):
+    """Каталог групп с числом постов и датой последнего из них."""
+    template = 'posts/groups.html'
+    groups = Group.objects.select_related('stats').order_by('title', 'pk')
+    page_obj = paginate(request, groups, ordering=('title', 'id'))
+    context = {
+        'page_obj': page_obj,
+    }
+
+    return render(request, template, context)
+
+
+@conditional_page(group_page_state)
 def group_posts(request, slug):
     """Шаблон странницы с постами группы."""
     template = 'posts/group_list.html'
-    group = get_object_or_404(Group, slug=slug)
+    if request.page_state is None:
+        raise Http404
+    group = request.page_state.group
     post_list = group.posts.select_related('author')
-    page_obj = paginate(request, post_list)
+    page_obj = paginate(request, post_list,
+                        count=get_group_stats(group).posts_count)
     context = {
         'page_obj': page_obj,
         'group': group,
@@ -34,53 +76,146 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@conditional_page(profile_page_state)
 def profile(request, username):
     """Шаблон страницы пользователя"""
     template = 'posts/profile.html'
-    author = get_object_or_404(User, username=username)
-    page_obj = paginate(request, author.posts.select_related('group').all())
+    if request.page_state is None:
+        raise Http404
+    author = request.page_state.author
+    stats = get_stats(author)
+    page_obj = paginate(request, author.posts.select_related('group').all(),
+                        count=stats.posts_count)
     following = False
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(
-            user=request.user, author=author).exists()
+    follows_you = False
+    if request.user.is_authenticated and request.user.pk != author.pk:
+        following = relations.is_following(
+            request.user, author.pk, request)
+        follows_you = graph.get_graph().follows(author.pk, request.user.pk)
     context = {
         'page_obj': page_obj,
         'author': author,
+        'stats': stats,
         'following': following,
+        'follows_you': follows_you,
+        'suggestions': graph.suggested_authors(
+            request.user, seed=author, request=request),
+    }
+
+    return render(request, template, context)
+
+
+def _follow_list(request, username, related, filter_field, title):
+    template = 'posts/follow_list.html'
+    author = get_object_or_404(User, username=username)
+    stats = get_stats(author)
+    follows = Follow.objects.filter(**{filter_field: author}).select_related(
+        related).only(
+            'id', f'{related}__username', f'{related}__first_name',
+            f'{related}__last_name')
+    page_obj = paginate(
+        request,
+        follows,
+        cursor=True,
+        per_page=constants.MAX_FOLLOWS_ON_PAGE,
+        ordering=('-id',),
+    )
+    context = {
+        'page_obj': page_obj,
+        'users': [getattr(follow, related) for follow in page_obj],
+        'author': author,
+        'stats': stats,
+        'title': title,
     }
 
     return render(request, template, context)
 
 
+def profile_followers(request, username):
+    """Подписчики пользователя"""
+    return _follow_list(request, username, 'user', 'author', 'Подписчики')
+
+
+def profile_following(request, username):
+    """Авторы, на которых подписан пользователь"""
+    return _follow_list(request, username, 'author', 'user', 'Подписки')
+
+
+@conditional_page(post_page_state)
 def post_detail(request, post_id):
     """Шаблон страницы поста"""
     template = 'posts/post_detail.html'
     post = get_object_or_404(Post.objects.select_related(
         'group', 'author'), pk=post_id)
+    comments = paginate(
+        request,
+        post.comments.select_related('author'),
+        cursor=True,
+        per_page=constants.MAX_COMMENTS_ON_PAGE,
+        ordering=constants.COMMENT_ORDERING,
+    )
     context = {
         'post': post,
+        'author_stats': get_stats(post.author),
         'form': CommentForm(request.POST or None),
-        'comments': post.comments.select_related('author').all(),
+        'comments': comments,
     }
 
     return render(request, template, context)
 
 
+def post_comments(request, post_id):
+    """Страница комментариев поста в JSON для подгрузки"""
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    comments = Comment.objects.filter(post_id=post_id).values(
+        'id', 'text', 'created', 'author__username')
+    paginator = CursorPaginator(
+        comments,
+        constants.MAX_COMMENTS_ON_PAGE,
+        constants.COMMENT_ORDERING,
+    )
+    page = paginator.get_cursor_page(request.GET.get('after'))
+    return JsonResponse({
+        'comments': [
+            {
+                'id': comment['id'],
+                'author': comment['author__username'],
+                'text': comment['text'],
+                'created': comment['created'],
+            }
+            for comment in page
+        ],
+        'next': page.next_cursor,
+    })
+
+
 @login_required
 def add_comment(request, post_id):
     """Шаблон коментирования"""
-    post = get_object_or_404(Post.objects, pk=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
-        comment = form.save(commit=False)
-        comment.author = request.user
-        comment.post = post
-        comment.save()
+        # Запрос к несуществующему посту не должен тратить токен.
+        if not Post.objects.filter(pk=post_id).exists():
+            raise Http404
+        wait = throttling.consume(
+            'comment', request.user.pk,
+            constants.COMMENT_BURST, constants.COMMENT_REFILL_SECONDS)
+        if wait:
+            response = render(
+                request, 'core/429.html', {'retry_after': ceil(wait)},
+                status=429)
+            response['Retry-After'] = ceil(wait)
+            return response
+        if create_comment(
+                post_id, request.user, form.cleaned_data['text']) is None:
+            raise Http404
 
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
+@image_uploads
 def post_create(request):
     """Шаблон для  страницы создания поста"""
     template = 'posts/create_post.html'
@@ -96,6 +231,7 @@ def post_create(request):
 
 
 @login_required
+@image_uploads
 def post_edit(request, post_id):
     """Шаблон страницы для редактирования поста"""
     template = 'posts/create_post.html'
@@ -126,40 +262,80 @@ def post_edit(request, post_id):
 def follow_index(request):
     """Шаблон страницы подписок на авторов"""
     template = 'posts/follow.html'
-    authors = request.user.follower.values_list('author', flat=True)
-    following_posts = Post.objects.filter(
-        author__in=authors).select_related('author', 'group').all()
+    following_posts = timeline.timeline_posts(
+        request.user).select_related('author', 'group')
     page_obj = paginate(request, following_posts)
     context = {
         'page_obj': page_obj,
+        'suggestions': graph.suggested_authors(request.user, request=request),
     }
 
     return render(request, template, context)
 
 
+@login_required
+def notifications_index(request):
+    """Уведомления о новых постах авторов из подписок"""
+    template = 'posts/notifications.html'
+    page_obj = paginate(
+        request,
+        request.user.notifications.select_related(
+            'post__author', 'post__group'),
+        cursor=True,
+        per_page=constants.MAX_NOTIFICATIONS_ON_PAGE,
+        ordering=('-id',),
+    )
+    # Страница уже прочитана из базы, новые уведомления на ней выделены.
+    notifications.mark_read(request.user)
+    context = {
+        'page_obj': page_obj,
+    }
+
+    return render(request, template, context)
+
+
+@login_required
+def unread_notifications(request):
+    """Число непрочитанных уведомлений для шапки сайта"""
+    return JsonResponse({
+        'unread': notifications.unread_count(request.user),
+    })
+
+
 @login_required
 def profile_follow(request, username):
     """Шаблон подписывания на автора"""
-    current_author = get_object_or_404(User, username=username)
-    if request.user != current_author and not Follow.objects.filter(
-            user=request.user, author=current_author).exists():
-        Follow(
-            user=request.user,
-            author=current_author
-        ).save()
-
-        return redirect('posts:profile', username=username)
+    follows.follow(request.user, [username])
 
-    return redirect('posts:index')
+    return redirect('posts:profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
     """Шаблон отписывания от автора"""
-    current_author = get_object_or_404(User, username=username)
-    Follow.objects.filter(
-        user=request.user,
-        author=current_author
-    ).delete()
+    follows.unfollow(request.user, [username])
 
     return redirect('posts:profile', username=username)
+
+
+def _usernames(request, field):
+    names = []
+    for value in request.POST.getlist(field):
+        names.extend(name for name in re.split(r'[\s,]+', value) if name)
+    return names
+
+
+@login_required
+@require_POST
+def follow_batch(request):
+    """Подписка и отписка списком имён, например при импорте подписок"""
+    to_follow = _usernames(request, 'follow')
+    to_unfollow = _usernames(request, 'unfollow')
+    if len(to_follow) + len(to_unfollow) > constants.MAX_FOLLOW_BATCH:
+        return JsonResponse(
+            {'error': f'Не больше {constants.MAX_FOLLOW_BATCH} имён'},
+            status=400)
+    return JsonResponse({
+        'followed': len(follows.follow(request.user, to_follow)),
+        'unfollowed': len(follows.unfollow(request.user, to_unfollow)),
+    })
@@ -56,6 +56,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ViewMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -69,13 +70,27 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Миниатюры sorl строятся из уже декодированной картинки (posts.images).
+THUMBNAIL_ENGINE = 'posts.images.Engine'
+
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+# В рабочем режиме скомпилированные шаблоны живут в памяти процесса,
+# wsgi.py прогревает их при старте (core.warmup). При DEBUG шаблоны
+# перечитываются с диска, чтобы правки были видны без перезапуска.
+if not DEBUG:
+    TEMPLATE_LOADERS = [
+        ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+    ]
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -89,14 +104,59 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# Наибольшее число запросов к БД на представление для пользователя с
+# сессией и пустым кэшем. Граф подписок загружается фоновой задачей и в
+# бюджет не входит. Middleware пишет превышение в лог, тесты с
+# core.testing.QueryBudgetMixin падают.
+VIEW_QUERY_BUDGETS = {
+    'posts:index': 4,
+    'posts:group_list': 5,
+    'posts:group_index': 4,
+    'posts:profile': 7,
+    'posts:post_detail': 7,
+    'posts:follow_index': 6,
+    'posts:profile_followers': 6,
+    'posts:profile_following': 6,
+    'posts:post_search': 4,
+    'posts:post_comments': 2,
+    'posts:api_index': 2,
+    'posts:api_group': 3,
+    'posts:api_profile': 3,
+}
+
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 # LOGOUT_REDIRECT_URL = 'posts:index'
 
+# Кэш по умолчанию живёт в памяти процесса: в нём фрагменты постов,
+# счётчики и состояния страниц, ключи которых содержат версии тегов,
+# поэтому вытеснение записи даёт лишь промах. CULL_FREQUENCY=10 при
+# переполнении удаляет десятую часть записей, а не треть.
+# Кэш «shared» общий для всех воркеров: в нём версии тегов и вёдра
+# ограничения комментариев. SharedFileBasedCache не вытесняет живые
+# записи и удаляет просроченные не чаще раза в SWEEP_INTERVAL секунд;
+# вместо него подойдёт и memcached или Redis. Счётчики метрик
+# представлений хранятся в таблице core.ViewMetric.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'yatube'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 20_000)),
+            'CULL_FREQUENCY': int(os.getenv('CACHE_CULL_FREQUENCY', 10)),
+        },
+    },
+    'shared': {
+        'BACKEND': os.getenv(
+            'SHARED_CACHE_BACKEND', 'core.cache.SharedFileBasedCache'),
+        'LOCATION': os.getenv(
+            'SHARED_CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')),
+        'OPTIONS': {
+            'SWEEP_INTERVAL': int(os.getenv('SHARED_CACHE_SWEEP', 300)),
+        },
+    },
 }
 
 # Database